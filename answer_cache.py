@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Semantic cache of answers to first follow-up questions, per video
+
+Users watching the same video ask near-identical follow-ups ("what's the
+conclusion?", "summarize the conclusion"). Questions are embedded and
+compared with the earlier first follow-ups of the same video; above the
+similarity threshold the earlier answer is served instead of a Bedrock call.
+Only first-level follow-ups (right after the summary) are cached, since later
+questions depend on the conversation before them.
+
+Usage (hit rate and latency saved so far):
+    python3 answer_cache.py [<youtube_url> ...]
+"""
+
+import os
+import sys
+import time
+import base64
+import hashlib
+import logging
+import threading
+
+import numpy as np
+
+import bedrock
+import cache
+import state
+
+logger = logging.getLogger()
+
+# cosine similarity from which a question counts as asked before
+THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+# questions kept per video, the least used are dropped first
+MAX_ENTRIES = 200
+
+answer_store = cache.open_cache("answers")
+
+
+class VideoAnswers:
+    """Earlier first follow-ups of one video, their answers and embeddings
+
+    embeddings is one normalized row per question, so the similarity to all
+    of them is a single matrix-vector product. Hit counts are not part of
+    it, they are counters next to the entry (see lookup()).
+    """
+
+    def __init__(self, dimensions=bedrock.EMBEDDING_DIMENSIONS):
+        self.questions = []
+        self.answers = []
+        # seconds the answer took from Bedrock, i.e. what a hit saves
+        self.latencies = []
+        self.embeddings = np.zeros((0, dimensions), dtype=np.float32)
+
+    def nearest(self, vector):
+        """(index, similarity) of the most similar question, (None, 0.0) if empty"""
+        if not self.questions:
+            return None, 0.0
+        similarities = self.embeddings @ vector
+        index = int(np.argmax(similarities))
+        return index, float(similarities[index])
+
+    def add(self, question, answer, latency, vector, counters):
+        """Add an answer; when full, the question with the fewest hits in
+        counters is dropped"""
+        if len(self.questions) >= MAX_ENTRIES:
+            drop = min(range(len(self.questions)), key=lambda i: counters.get(hits_counter(self.questions[i]), 0))
+            for column in (self.questions, self.answers, self.latencies):
+                del column[drop]
+            self.embeddings = np.delete(self.embeddings, drop, axis=0)
+        self.questions.append(question)
+        self.answers.append(answer)
+        self.latencies.append(latency)
+        self.embeddings = np.vstack([self.embeddings, vector[np.newaxis, :]])
+
+    def to_dict(self):
+        return {
+            "questions": self.questions,
+            "answers": self.answers,
+            "latencies": self.latencies,
+            "embeddings": base64.b64encode(self.embeddings.astype(np.float32).tobytes()).decode(),
+            "dimensions": self.embeddings.shape[1],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        videos = cls(data["dimensions"])
+        videos.questions = data["questions"]
+        videos.answers = data["answers"]
+        videos.latencies = data["latencies"]
+        embeddings = np.frombuffer(base64.b64decode(data["embeddings"]), dtype=np.float32)
+        videos.embeddings = embeddings.reshape(-1, data["dimensions"]).copy()
+        return videos
+
+
+def hits_counter(question):
+    """Counter of the hits on one cached question; questions move when one is
+    dropped, so it is named by a hash of the text, not the position"""
+    return "hits:" + hashlib.sha1(question.encode()).hexdigest()[:12]
+
+
+# loaded entries with the time they were written, re-read when another
+# process or replica has written a newer one
+_loaded = {}
+_lock = threading.Lock()
+
+
+def _load(key):
+    mtime = answer_store.written(key)
+    with _lock:
+        loaded = _loaded.get(key)
+    if loaded is None or loaded[0] != mtime:
+        data = answer_store.get(key)
+        loaded = (mtime, VideoAnswers.from_dict(data) if data else VideoAnswers())
+        with _lock:
+            _loaded[key] = loaded
+    return loaded[1]
+
+
+def lookup(video_id, question, threshold=THRESHOLD):
+    """Earlier answer to a near-identical first follow-up of this video
+
+    Returns (match, vector): match is {"question", "answer", "similarity"}
+    or None, vector the question's embedding to pass on to store(). Only
+    the small counters entry is written, the answers are left alone.
+    """
+    start = time.perf_counter()
+    try:
+        vector = np.asarray(bedrock.embed(question), dtype=np.float32)
+    except Exception as e:
+        logger.warning(f"Could not embed follow-up question: {e}")
+        return None, None
+
+    key = cache.summary_key(video_id, bedrock.PROMPT_VERSION)
+    videos = _load(key)
+    index, similarity = videos.nearest(vector)
+    match = None
+    counts = {"lookups": 1}
+    if index is not None and similarity >= threshold:
+        match = {"question": videos.questions[index], "answer": videos.answers[index], "similarity": similarity}
+        counts["hits"] = 1
+        counts[hits_counter(videos.questions[index])] = 1
+        counts["saved"] = max(0.0, videos.latencies[index] - (time.perf_counter() - start))
+    answer_store.increment(key, counts)
+    logger.info(f"Semantic answer cache {'hit' if match else 'miss'} for {video_id} "
+                f"(similarity {similarity:.3f}, {time.perf_counter() - start:.2f}s)")
+    return match, vector
+
+
+def store(video_id, question, answer, latency, vector):
+    """Remember the answer to a first follow-up; vector comes from lookup()"""
+    if vector is None:
+        return
+    key = cache.summary_key(video_id, bedrock.PROMPT_VERSION)
+    # read-modify-write of the whole entry, so one writer across replicas
+    with state.lock(f"answers:{key}"):
+        videos = _load(key)
+        videos.add(question, answer, latency, vector, answer_store.counters(key))
+        answer_store.set(key, videos.to_dict())
+        with _lock:
+            _loaded[key] = (answer_store.written(key), videos)
+
+
+def report(video_ids):
+    """{video_id: hit rate and latency saved} for videos with cached answers"""
+    rows = {}
+    for video_id in video_ids:
+        key = cache.summary_key(video_id, bedrock.PROMPT_VERSION)
+        data = answer_store.get(key)
+        if not data:
+            continue
+        counters = answer_store.counters(key)
+        lookups, hits = counters.get("lookups", 0), counters.get("hits", 0)
+        rows[video_id] = {
+            "questions": len(data["questions"]),
+            "lookups": lookups,
+            "hits": hits,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "saved": counters.get("saved", 0.0),
+        }
+    return rows
+
+
+def main():
+    import utility
+
+    if len(sys.argv) > 1:
+        video_ids = [utility.validate_url(url)[0] for url in sys.argv[1:]]
+    else:
+        suffix = f"-v{bedrock.PROMPT_VERSION}"
+        video_ids = [key[:-len(suffix)] for key in answer_store.keys() if key.endswith(suffix)]
+
+    rows = report(video_ids)
+    if not rows:
+        print("No cached answers yet")
+        return
+    print(f"{'video':<13} {'questions':>9} {'lookups':>8} {'hits':>6} {'hit rate':>9} {'saved':>9}")
+    for video_id, row in rows.items():
+        print(f"{video_id:<13} {row['questions']:>9} {row['lookups']:>8} {row['hits']:>6} "
+              f"{row['hit_rate']:>8.0%} {row['saved']:>8.1f}s")
+    lookups = sum(row["lookups"] for row in rows.values())
+    hits = sum(row["hits"] for row in rows.values())
+    print(f"\n📊 Hit rate {hits / lookups if lookups else 0:.0%} over {lookups} first follow-ups, "
+          f"{sum(row['saved'] for row in rows.values()):.1f}s of Bedrock latency saved")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,22 @@
+import time
 import uuid
+import hashlib
+import functools
+from concurrent import futures
+import answer_cache
 import bedrock
+import cache
+import documents
+import followups
+import subtitles
+import inflight
+import ingest
+import library
+import playlist
+import profiling
+import rolling
+import segments
+import state
 import utility
 import streamlit as st
 
@@ -14,8 +31,28 @@ st.set_page_config(page_title="yt bedrock chat")
 if "user_id" in st.session_state:
     user_id = st.session_state["user_id"]
 else:
-    user_id = str(uuid.uuid4())
+    # with shared state (see state.py) the session id is kept in the URL, so a
+    # reload - served by any replica - continues the conversation. Whoever has
+    # that URL can read and continue it, so summaries are shared through their
+    # permalink, which carries no session id
+    user_id = (state.enabled() and st.query_params.get("session")) or str(uuid.uuid4())
+    if state.enabled():
+        st.query_params["session"] = user_id
     st.session_state["user_id"] = user_id
+    st.session_state.update(state.load_session(user_id) or {})
+    # a shared summary permalink (?v=<video id>&pv=<prompt version>) opens
+    # as the first answer of the conversation, read from the summary store
+    # without asking YouTube or Bedrock
+    shared_video = st.query_params.get("v")
+    if shared_video and not st.session_state.get("questions"):
+        prompt_version = st.query_params.get("pv", bedrock.PROMPT_VERSION)
+        summary = cache.summary_cache.get(cache.summary_key(shared_video, prompt_version))
+        if summary:
+            st.session_state["video_id"] = shared_video
+            st.session_state.questions = [{"question": f"https://youtu.be/{shared_video}", "id": 0}]
+            st.session_state.answers = [{"answer": {"response": summary, "permalink": {"v": shared_video, "pv": prompt_version}}, "id": 1}]
+        else:
+            st.warning("This summary is not available anymore, submit the video URL to summarize it again.")
 
 if "llm_chain" not in st.session_state:
     st.session_state["llm_app"] = bedrock
@@ -23,7 +60,7 @@ if "llm_chain" not in st.session_state:
 
 if "questions" not in st.session_state:
     st.session_state.questions = []
-    input_label = "Enter a Youtube Video URL, other content URL or \"S3\"  to Summarize "
+    input_label = "Enter a Youtube Video, Playlist or Channel URL, other content URL or \"S3\"  to Summarize "
     
 else:
     input_label = "❗Ask Me Here If You Need More Details.❗" 
@@ -51,41 +88,419 @@ def write_top_bar():
     return clear
 
 
+def save_session():
+    """Share what is shown of the conversation with the other replicas"""
+    state.save_session(st.session_state["user_id"], {
+        "questions": st.session_state.questions,
+        "answers": st.session_state.answers,
+        "video_id": st.session_state.get("video_id"),
+    })
+
+
+def discard_followups():
+    """Drop the suggestions of the current summary; unused answers are wasted"""
+    pending = st.session_state.pop("followups", None)
+    if pending is not None:
+        pending.add_done_callback(lambda future: future.result().close())
+
+
+def profiled(handler):
+    """Profile the handler when this session asked for it (see profiling.py)"""
+    @functools.wraps(handler)
+    def run(*args, **kwargs):
+        with profiling.profiled(handler.__name__, enabled=st.session_state.get("profiling")) as profile:
+            result = handler(*args, **kwargs)
+        if profile is not None:
+            st.session_state["last_profile"] = profile.summary()
+        return result
+    return run
+
+
 clear = write_top_bar()
 
+# questions about every indexed video instead of the current one (see library.py)
+if st.toggle("📚 Ask across all summarized videos", key="library_mode"):
+    input_label = "Ask a question about all summarized videos"
+
+# stage timings, stack samples and allocations of this session's requests
+st.sidebar.toggle("🔬 Profile my requests", key="profiling", value=profiling.ENABLED)
+
 if clear:
     st.session_state.questions = []
     st.session_state.answers = []
     st.session_state.input = ""
+    st.session_state.pop("video_id", None)
+    # a reload should not bring back a summary opened from a permalink
+    st.query_params.pop("v", None)
+    st.query_params.pop("pv", None)
+    discard_followups()
+    save_session()
     input_label = "Enter the Youtube url to summarize"
     bedrock.clear_memory(st.session_state["llm_chain"])
 
 
-def handle_input():
-    input = st.session_state.input
+def summarize_playlist(source_id, content_type):
+    """Summarize a playlist or channel, streaming per-video progress into the UI"""
+    llm_chain = st.session_state["llm_chain"]
+    chain = st.session_state["llm_app"]
+
+    progress_bar = st.progress(0.0, text="Listing videos ...")
+
+    def progress(done, total, video):
+        if video["cached"]:
+            status = "from cache"
+        elif video["error"]:
+            status = f"skipped ({video['error']})"
+        else:
+            status = "summarized"
+        progress_bar.progress(done / total, text=f"{done}/{total} videos - {video['video_id']} {status}")
+
+    try:
+        result = playlist.summarize_playlist(
+            source_id, content_type, progress=progress, user=st.session_state["user_id"]
+        )
+    except Exception as e:
+        st.error(f"Could not summarize the playlist: {str(e)}")
+        return None
+    progress_bar.empty()
+
+    if not result["summary"]:
+        st.error("None of the videos provided has an English, French, Spanish or German transcript. Sorry I can't help here.")
+        return None
+
+    # make the per-video summaries available to follow-up questions
+    prompt = "Summarize the following playlist:\n"
+    listing = ""
+    for video in result["videos"]:
+        url = f"https://youtu.be/{video['video_id']}"
+        if video["summary"]:
+            prompt += f"\n--- {url} ---\n{segments.strip_time_markers(video['summary'])}\n"
+            listing += f"\n- {url}"
+        else:
+            listing += f"\n- {url} (skipped: {video['error']})"
+    chain.add_exchange(llm_chain, prompt, result["summary"])
+
+    return {"response": f"{result['summary']}\n\nVideos:{listing}"}
+
+
+def answer_input(input):
+    """Answer a submission: summary of a new URL, library question or
+    follow-up; None when there is nothing to add to the conversation"""
     llm_chain = st.session_state["llm_chain"]
     chain = st.session_state["llm_app"]
 
     question = input
     content_type = ""
 
-    if len(st.session_state.questions)==0:
+    if st.session_state.get("library_mode"):
+        result = answer_library(question)
+
+    elif len(st.session_state.questions)==0:
+        upload = st.session_state.get("upload")
+        if upload is not None and input == upload_submission(upload):
+            if subtitles.is_subtitle_file(upload.name):
+                return summarize_subtitles(upload)
+            return summarize_document(upload.getvalue(), upload.name, upload.type)
+
         video_id, content_type = utility.validate_url(input)
 
-        if content_type == "youtube":
-            transcript = utility.get_content(video_id, "youtube")
-            if not transcript:
-                st.error("The video provided has no English, French, Spanish or German transcript. Sorry I can't help here.")
-                st.session_state.input = ""
+        if content_type in ("youtube_playlist", "youtube_channel"):
+            result = summarize_playlist(video_id, content_type)
+            if result is None:
                 return None
 
+        elif content_type == "s3":
+            try:
+                document = read_s3_document(video_id)
+            except Exception as e:
+                st.error(f"Could not read {video_id}: {str(e)}")
+                return None
+            return summarize_document(*document)
+
+        else:
+            if content_type == "youtube":
+                # transcript and title/duration/chapters are fetched concurrently
+                video = ingest.ingest(video_id)
+                if inflight.cancelled():
+                    # the summary is never requested
+                    raise inflight.Cancelled(chain.tokens_saved("summary", video.prompt() if video.transcript else None))
+                if not video.transcript:
+                    st.error("The video provided has no English, French, Spanish or German transcript. Sorry I can't help here.")
+                    return None
+
+
+            # Generate prompt from transcript
+            input = video.prompt()
+            # answers cite [t=...] markers, linked to this video when rendered
+            st.session_state["video_id"] = video_id
+
+            summary_key = cache.summary_key(video_id, chain.PROMPT_VERSION)
+            # users submitting the same video at once (on any replica) wait
+            # for the first one's summary instead of asking Bedrock again
+            with state.lock(f"summary:{summary_key}"):
+                summary = cache.summary_cache.get(summary_key)
+                if summary:
+                    chain.add_exchange(llm_chain, input, summary)
+                    result = {"response": summary}
+                else:
+                    result = chain.run_chain(llm_chain, input, kind="summary")
+                    if not result["response"].startswith("Error:"):
+                        cache.summary_cache.set(summary_key, result["response"])
+
+            if not result["response"].startswith("Error:"):
+                result["permalink"] = {"v": video_id, "pv": chain.PROMPT_VERSION}
+                # suggested follow-ups, answered in the background while the summary is read
+                st.session_state["followups"] = followups.prepare(input, result["response"], chain.bedrock_model(),
+                                                                   user=st.session_state["user_id"])
+                library.index_video_async(video_id, video.transcript, result["response"], video.metadata)
+
+    else:
+        discard_followups()
+        restore_video_context()
+        result = answer_followup(input)
+    return result
+
+
+def restore_video_context():
+    """A conversation opened from a permalink has the summary but not the
+    transcript it was made from; put both in the chat history so follow-ups
+    have the same context as in the conversation that made the summary"""
+    llm_chain = st.session_state["llm_chain"]
+    chain = st.session_state["llm_app"]
 
-        # Generate prompt from transcript
-        input = utility.generate_prompt_from_transcript(transcript)
-        
-        
-    result = chain.run_chain(llm_chain, input)
+    video_id = st.session_state.get("video_id")
+    if not video_id or llm_chain._message_history_manager.get_session_history().messages:
+        return
+    video = ingest.ingest(video_id)
+    if video.transcript:
+        chain.add_exchange(llm_chain, video.prompt(), st.session_state.answers[0]["answer"]["response"])
 
+
+def read_s3_document(uri):
+    """Bytes, file name and content type of a document in S3"""
+    bucket, _, key = uri[len("s3://"):].partition("/")
+    response = bedrock.aws_session().client("s3").get_object(Bucket=bucket, Key=key)
+    return response["Body"].read(), key.rsplit("/", 1)[-1], response.get("ContentType")
+
+
+def summarize_document(data, name, content_type=None):
+    """Summarize a PDF, DOCX or HTML document; its text is extracted page by
+    page in the document process pool (see documents.py), off this thread"""
+    chain = st.session_state["llm_app"]
+
+    kind = documents.document_kind(name, content_type)
+    if kind is None:
+        st.error("Only PDF, DOCX and HTML documents are supported. Sorry I can't help here.")
+        return None
+
+    status = st.empty()
+
+    def progress(pages):
+        status.caption(f"📄 {pages} page(s) of {name} read ...")
+        if inflight.cancelled():
+            raise inflight.Cancelled(chain.tokens_saved("summary"))
+
+    try:
+        with profiling.stage("document"):
+            pages = documents.extract_text(data, kind, progress=progress)
+    except documents.DocumentError as e:
+        st.error(f"Could not read {name}: {str(e)}")
+        return None
+    finally:
+        status.empty()
+    if not any(page.strip() for page in pages):
+        st.error("The document provided has no text. Sorry I can't help here.")
+        return None
+
+    input = utility.generate_prompt_from_transcript("\n\n".join(pages), {"title": name}, kind="document")
+    # documents are identified by their content, wherever they come from
+    return summarize_prompt(input, f"document-{hashlib.sha256(data).hexdigest()[:32]}")
+
+
+def summarize_subtitles(upload):
+    """Summarize an uploaded .srt/.vtt caption file like a YouTube transcript"""
+    # the file's hash names the summary, computed in the parsing pass
+    digest = hashlib.sha256()
+    try:
+        with profiling.stage("transcript"):
+            upload.seek(0)
+            transcript = subtitles.read_subtitles(upload, digest)
+    except subtitles.SubtitleError as e:
+        st.error(f"Could not read {upload.name}: {str(e)}")
+        return None
+    if not len(transcript):
+        st.error("The captions provided have no text. Sorry I can't help here.")
+        return None
+
+    input = utility.generate_prompt_from_transcript(transcript, {"title": upload.name})
+    return summarize_prompt(input, f"subtitles-{digest.hexdigest()[:32]}")
+
+
+def summarize_prompt(input, content_id):
+    """Summary of uploaded or S3 content through the summary cache; users
+    submitting the same content at once get the first one's summary"""
+    llm_chain = st.session_state["llm_chain"]
+    chain = st.session_state["llm_app"]
+
+    summary_key = cache.summary_key(content_id, chain.PROMPT_VERSION)
+    with state.lock(f"summary:{summary_key}"):
+        summary = cache.summary_cache.get(summary_key)
+        if summary:
+            chain.add_exchange(llm_chain, input, summary)
+            return {"response": summary}
+        result = chain.run_chain(llm_chain, input, kind="summary")
+        if not result["response"].startswith("Error:"):
+            cache.summary_cache.set(summary_key, result["response"])
+    return result
+
+
+def upload_submission(upload):
+    """Text standing for an uploaded file in the conversation"""
+    return f"📄 {upload.name}"
+
+
+def queue_upload():
+    """on_change of the uploader: submitted like a typed URL (see queue_input)"""
+    if st.session_state.get("upload") is not None:
+        st.session_state["submission"] = upload_submission(st.session_state["upload"])
+
+
+def queue_input():
+    """on_change of the input: the submission is handled in the script run
+    itself (see handle_input), where it can wait for a request in flight"""
+    st.session_state["submission"] = st.session_state.input
+    st.session_state.input = ""
+
+
+def wait_for(future):
+    """Wait for a request with a Cancel button; clicking it reruns the
+    script, which interrupts this wait and cancels in handle_input"""
+    cancel = st.empty()
+    cancel.button("✋ Cancel", key="cancel_request")
+    progress = st.empty()
+    start = time.monotonic()
+    try:
+        while not futures.wait([future], timeout=0.5).done:
+            # every st.* call is a point where a rerun can interrupt the script
+            progress.caption(f"⏳ Working on it ... {time.monotonic() - start:.0f}s")
+        return future.result()
+    finally:
+        cancel.empty()
+        progress.empty()
+
+
+@profiled
+def handle_input(input):
+    session_id = st.session_state["user_id"]
+    position = len(st.session_state.questions)
+
+    # the text just answered once more: a double Enter or a reconnect
+    # resending the widget value, not a new question
+    if position and st.session_state.questions[-1]["question"] == input and \
+            inflight.requests.finished_recently(inflight.request_key(session_id, position - 1, input)):
+        st.session_state.pop("submission", None)
+        return None
+
+    key = inflight.request_key(session_id, position, input)
+    if st.session_state.get("cancel_request"):
+        # stops Bedrock and the transcript fetch; an answer that was done
+        # already is still added below, the history has it
+        inflight.requests.cancel(key)
+    # a repeated submission while this one runs (e.g. from a reconnected
+    # browser, or a rerun that interrupted the wait) waits for it and gets
+    # its answer instead of calling Bedrock again
+    try:
+        result, _ = wait_for(inflight.requests.submit(key, lambda: answer_input(input)))
+    except inflight.Cancelled as e:
+        st.info(f"✋ Cancelled, about {e.tokens_saved} Bedrock tokens saved.")
+        result = None
+    except Exception as e:
+        # dropped below, or every later rerun would run the failing request again
+        st.error(f"Could not answer: {str(e)}")
+        result = None
+    # kept until now (Streamlit's rerun and stop are not Exceptions), so a
+    # rerun interrupting the wait picks the request up again
+    st.session_state.pop("submission", None)
+    if result is None:
+        return None
+    add_to_conversation(input, result)
+    save_session()
+
+
+def answer_followup(question):
+    """Answer a follow-up, reusing an earlier answer to the same first
+    follow-up of this video when there is one"""
+    llm_chain = st.session_state["llm_chain"]
+    chain = st.session_state["llm_app"]
+
+    video_id = st.session_state.get("video_id")
+    # later questions depend on the conversation so far, only the first is reusable
+    if not video_id or len(st.session_state.questions) != 1:
+        return chain.run_chain(llm_chain, question)
+
+    match, vector = answer_cache.lookup(video_id, question)
+    if match:
+        chain.add_exchange(llm_chain, question, match["answer"])
+        return {"response": match["answer"], "cached_question": match["question"]}
+
+    start = time.perf_counter()
+    result = chain.run_chain(llm_chain, question)
+    if not result["response"].startswith("Error:"):
+        answer_cache.store(video_id, question, result["response"], time.perf_counter() - start, vector)
+    return result
+
+
+@profiled
+def handle_update_summary():
+    """Fold the captions added since the last summary (e.g. of a live stream)
+    into it; False if there was nothing new"""
+    llm_chain = st.session_state["llm_chain"]
+    chain = st.session_state["llm_app"]
+
+    try:
+        video = rolling.update(st.session_state["video_id"], chain.bedrock_model(), user=st.session_state["user_id"])
+    except Exception as e:
+        st.error(f"Could not update the summary: {str(e)}")
+        return False
+    if video is None or not video["updates"][-1]["new_segments"]:
+        st.info("No new captions since the last summary.")
+        return False
+
+    discard_followups()
+    chain.add_exchange(llm_chain, "Update the summary with the part of the video added since.", video["summary"])
+    add_to_conversation(f"🔄 Update summary (captions up to {segments.format_timestamp(video['seconds'])})",
+                        {"response": video["summary"]})
+    save_session()
+    return True
+
+
+def answer_library(question):
+    """Answer from the best matching parts of all indexed videos"""
+    try:
+        return library.ask(question, user=st.session_state["user_id"])
+    except Exception as e:
+        st.error(f"Could not search the library: {str(e)}")
+        return {"response": f"Error: {str(e)}"}
+
+
+@profiled
+def handle_suggestion(question):
+    """Answer a suggested follow-up, from its precomputed answer if there is one"""
+    llm_chain = st.session_state["llm_chain"]
+    chain = st.session_state["llm_app"]
+
+    pending = st.session_state.pop("followups")
+    answer = pending.result().take(question, wait=followups.TAKE_WAIT)
+    if answer is not None:
+        chain.add_exchange(llm_chain, question, answer)
+        result = {"response": answer}
+    else:
+        result = answer_followup(question)
+    add_to_conversation(question, result)
+    save_session()
+
+
+def add_to_conversation(question, result):
     question_with_id = {
         "question": question,
         "id": len(st.session_state.questions)
@@ -95,7 +510,6 @@ def handle_input():
     st.session_state.answers.append(
         {"answer": result, "id": len(st.session_state.questions)}
     )
-    st.session_state.input = ""
 
 
 def write_user_message(md):
@@ -112,7 +526,23 @@ def render_answer(answer):
     with col1:
         st.image(AI_ICON, use_column_width=True)
     with col2:
-        st.info(answer["response"])
+        response = answer["response"]
+        if st.session_state.get("video_id") and "sources" not in answer:
+            response = segments.link_timestamps(response, st.session_state["video_id"])
+        st.info(response)
+        if answer.get("sources"):
+            st.caption("  \n".join(
+                f"[{source['number']}] [{source['title']}](https://youtu.be/{source['video_id']}?t={int(source['start'])})"
+                + ("" if source["kind"] == "summary" else f" at {segments.format_timestamp(source['start'])}")
+                for source in answer["sources"]
+            ))
+        if answer.get("cached_question"):
+            st.caption(f"♻️ Reused answer to an earlier, similar question: \"{answer['cached_question']}\"")
+        if answer.get("permalink"):
+            link = answer["permalink"]
+            st.caption(f"🔗 [Permalink to this summary]({st.context.url or ''}?v={link['v']}&pv={link['pv']}) "
+                       "- opens it from the summary store, ready for follow-up questions. Share this link, "
+                       "not the address bar: that one can continue your conversation")
 
 
 def write_chat_message(md):
@@ -123,18 +553,73 @@ def write_chat_message(md):
 
 
 
+submission = st.session_state.get("submission")
+if submission:
+    handle_input(submission)
+
 with st.container():
     for q, a in zip(st.session_state.questions, st.session_state.answers):
         write_user_message(q)
         write_chat_message(a)
 
 
+# growing transcripts (live streams, webinars) are summarized incrementally
+if st.session_state.get("video_id") and not st.session_state.get("library_mode"):
+    if st.button("🔄 Update summary", key="update_summary", help="Add what was said since the last summary"):
+        if handle_update_summary():
+            st.rerun()
+
+
+def render_profile(profile):
+    with st.expander(f"🔬 Profile of {profile['name']}: {profile['wall']:.2f}s wall, {profile['cpu']:.2f}s process CPU"):
+        st.table([
+            {"stage": name, "calls": totals["calls"], "wall (s)": round(totals["wall"], 3),
+             "self (s)": round(totals["self_wall"], 3), "CPU (s)": round(totals["cpu"], 3)}
+            for name, totals in profile["stages"].items()
+        ])
+        if profile["allocations"]:
+            st.caption("Top allocations")
+            st.table([
+                {"KB": round(allocation["size_kb"], 1), "count": allocation["count"], "site": allocation["site"]}
+                for allocation in profile["allocations"]
+            ])
+        st.download_button("Download flame graph stacks", profile["collapsed"],
+                           file_name=f"{profile['name']}.collapsed", key="profile_download",
+                           help="Collapsed stacks for flamegraph.pl or speedscope.app")
+
+
+if st.session_state.get("profiling") and st.session_state.get("last_profile"):
+    render_profile(st.session_state["last_profile"])
+
+
+def render_suggestions():
+    pending = st.session_state.get("followups")
+    if pending is None:
+        return
+    if not pending.done():
+        st.caption("Preparing suggested questions ...")
+        return
+    for i, question in enumerate(pending.result().questions):
+        if st.button(question, key=f"suggestion_{i}"):
+            handle_suggestion(question)
+            st.rerun()
+
+
+# re-run only this part every second until the suggestions are ready
+pending = st.session_state.get("followups")
+st.fragment(render_suggestions, run_every=1 if pending and not pending.done() else None)()
+
+
 st.markdown("---")
 
 input = st.text_input(
-    input_label, key="input", on_change=handle_input
+    input_label, key="input", on_change=queue_input
 )
 
+if not st.session_state.questions:
+    st.file_uploader("... or upload a document or a subtitle file", type=["pdf", "docx", "html", "htm", "srt", "vtt"],
+                     key="upload", on_change=queue_upload)
+
 st.markdown(
     """
     <style>
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Bulk summarization with Bedrock batch inference
+Turns a list of YouTube URLs into a batch inference job (same system prompt
+and model settings as the app), waits for it and stores the summaries in
+the summary cache, where the app and the playlist mode pick them up
+
+Usage:
+    python3 batch_inference.py --urls <file_with_urls> --bucket <bucket> --role-arn <role>
+    python3 batch_inference.py --collect <job_arn> --bucket <bucket>
+    python3 batch_inference.py --urls <file_with_urls> --local
+
+Examples:
+    python3 batch_inference.py --urls sample_test_urls.txt --bucket my-batch-bucket \\
+        --role-arn arn:aws:iam::123456789012:role/BedrockBatchRole
+    python3 batch_inference.py --urls sample_test_urls.txt --local
+    python3 batch_inference.py --urls sample_test_urls.txt --local --profile
+
+Notes:
+    Bedrock rejects jobs below its minimum record count (100 for most
+    models), and the role must be able to read/write the bucket.
+"""
+
+import sys
+import json
+import time
+import argparse
+import tempfile
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import bedrock
+import cache
+import ingest
+import playlist
+import profiling
+
+MIN_RECORDS = 100
+INGEST_WORKERS = 4
+TERMINAL_STATUSES = ("Completed", "PartiallyCompleted", "Failed", "Stopped", "Expired")
+
+
+def build_records(video_ids, workers=INGEST_WORKERS, summaries=cache.summary_cache):
+    """Batch inference records for the videos without a summary in summaries
+
+    Returns (records, skipped) where skipped maps video id to the reason.
+    """
+    skipped = {}
+    todo = []
+    for video_id in video_ids:
+        if cache.summary_key(video_id, bedrock.PROMPT_VERSION) in summaries:
+            skipped[video_id] = "cached"
+        else:
+            todo.append(video_id)
+
+    records = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for video_id, video in zip(todo, executor.map(ingest.ingest, todo)):
+            if not video.transcript:
+                skipped[video_id] = "no transcript"
+                continue
+            records.append({
+                "recordId": video_id,
+                "modelInput": bedrock.anthropic_request_body(video.prompt()),
+            })
+    return records, skipped
+
+
+def submit_job(s3, control, records, bucket, prefix, role_arn, model_id=bedrock.MODEL_ID):
+    job_name = f"video-summaries-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    input_key = f"{prefix}/input/{job_name}.jsonl"
+    s3.put_object(
+        Bucket=bucket,
+        Key=input_key,
+        Body="\n".join(json.dumps(record) for record in records).encode(),
+    )
+    response = control.create_model_invocation_job(
+        jobName=job_name,
+        roleArn=role_arn,
+        modelId=model_id,
+        inputDataConfig={"s3InputDataConfig": {"s3Uri": f"s3://{bucket}/{input_key}"}},
+        outputDataConfig={"s3OutputDataConfig": {"s3Uri": f"s3://{bucket}/{prefix}/output/"}},
+    )
+    return response["jobArn"]
+
+
+def wait_for_job(control, job_arn, poll_interval):
+    while True:
+        job = control.get_model_invocation_job(jobIdentifier=job_arn)
+        print(f"   ⏳ {datetime.now().strftime('%H:%M:%S')} {job['status']}")
+        if job["status"] in TERMINAL_STATUSES:
+            return job
+        time.sleep(poll_interval)
+
+
+def collect_results(s3, job, summaries=cache.summary_cache):
+    """Store the job's summaries in the summaries cache, keyed by video id
+
+    Returns {video_id: None on success or the error message}.
+    """
+    output_uri = job["outputDataConfig"]["s3OutputDataConfig"]["s3Uri"]
+    bucket, _, prefix = output_uri[len("s3://"):].partition("/")
+    job_id = job["jobArn"].rsplit("/", 1)[-1]
+    listing = s3.list_objects_v2(Bucket=bucket, Prefix=f"{prefix.rstrip('/')}/{job_id}/")
+
+    results = {}
+    for entry in listing.get("Contents", []):
+        if not entry["Key"].endswith(".jsonl.out"):
+            continue
+        body = s3.get_object(Bucket=bucket, Key=entry["Key"])["Body"].read().decode()
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            video_id = record["recordId"]
+            if record.get("error"):
+                results[video_id] = record["error"].get("errorMessage", str(record["error"]))
+                continue
+            content = record["modelOutput"].get("content", [])
+            summary = "".join(block["text"] for block in content if block.get("type") == "text")
+            summaries.set(cache.summary_key(video_id, bedrock.PROMPT_VERSION), summary)
+            results[video_id] = None
+    return results
+
+
+def aws_clients(local):
+    if local:
+        from standins import FakeS3, FakeBedrockControl
+        s3 = FakeS3()
+        return s3, FakeBedrockControl(s3)
+    session = bedrock.aws_session()
+    return session.client("s3"), session.client("bedrock", config=bedrock.retry_config)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Summarize many videos with a Bedrock batch inference job",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument("--urls", help="file with YouTube video/playlist URLs, one per line")
+    parser.add_argument("--collect", metavar="JOB_ARN", help="collect the results of an existing job")
+    parser.add_argument("--bucket", help="S3 bucket for job input and output")
+    parser.add_argument("--prefix", default="video-chat-batch", help="S3 key prefix")
+    parser.add_argument("--role-arn", help="IAM role Bedrock uses to access the bucket")
+    parser.add_argument("--poll-interval", type=float, default=60, help="seconds between status checks")
+    parser.add_argument("--local", action="store_true", help="use local S3 and Bedrock stand-ins")
+    profiling.add_argument(parser)
+    args = parser.parse_args()
+    profiling.profile_process("batch_inference", args.profile)
+
+    if args.local and args.collect:
+        # stand-in jobs only live as long as the process that submitted them
+        parser.error("--collect needs a real job; --local jobs are collected by the run that submits them")
+    if args.local:
+        args.bucket = args.bucket or "local-bucket"
+        args.role_arn = args.role_arn or "arn:aws:iam::000000000000:role/local"
+        args.poll_interval = 0
+    if not (args.urls or args.collect) or not args.bucket or (args.urls and not args.role_arn):
+        parser.print_help()
+        sys.exit(1)
+
+    s3, control = aws_clients(args.local)
+    summaries = cache.summary_cache
+    if args.local:
+        # stand-in summaries must not reach the cache the app serves from
+        summaries = cache.FileCache("summaries", tempfile.mkdtemp(prefix="batch-local-"))
+        print(f"🧪 Local run, summaries go to {summaries.directory}")
+
+    if args.collect:
+        job = control.get_model_invocation_job(jobIdentifier=args.collect)
+        if job["status"] not in TERMINAL_STATUSES:
+            job = wait_for_job(control, args.collect, args.poll_interval)
+    else:
+        print(f"📁 Reading URLs from: {args.urls}")
+        video_ids = playlist.read_video_ids(args.urls)
+        print(f"🎯 Found {len(video_ids)} video(s)")
+
+        records, skipped = build_records(video_ids, summaries=summaries)
+        for video_id, reason in skipped.items():
+            print(f"   ⏭️  {video_id}: {reason}")
+        if not records:
+            print("✅ Nothing to do")
+            return
+        if len(records) < MIN_RECORDS and not args.local:
+            print(f"⚠️  Only {len(records)} record(s); Bedrock may reject jobs below {MIN_RECORDS}")
+
+        job_arn = submit_job(s3, control, records, args.bucket, args.prefix, args.role_arn)
+        print(f"🚀 Submitted {len(records)} record(s): {job_arn}")
+        job = wait_for_job(control, job_arn, args.poll_interval)
+
+    if job["status"] not in ("Completed", "PartiallyCompleted"):
+        print(f"❌ Job ended with status {job['status']}: {job.get('message', '')}")
+        sys.exit(1)
+
+    results = collect_results(s3, job, summaries)
+    failed = {video_id: error for video_id, error in results.items() if error}
+
+    print(f"\n{'='*60}")
+    print("📊 BATCH INFERENCE SUMMARY")
+    print(f"{'='*60}")
+    print(f"✅ Summaries stored: {len(results) - len(failed)}")
+    print(f"❌ Failed: {len(failed)}")
+    for video_id, error in failed.items():
+        print(f"   • {video_id}: {error}")
+
+
+if __name__ == "__main__":
+    main()
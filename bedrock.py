@@ -2,67 +2,135 @@ import boto3
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_core.chat_history import BaseChatMessageHistory
-from langchain_community.chat_message_histories import ChatMessageHistory
+from langchain_core.messages import HumanMessage, AIMessage
 from langchain_aws import ChatBedrock
 import streamlit as st
 from typing import Dict
 
 
+import os
+import json
+import inflight
+import recorder
+import profiling
+import regions
+import scheduler
+import state
+import throttle
+
 from botocore.config import Config
+# keep botocore retries short: throttling is handled by regions (failover) and
+# throttle.controller, which backs off for all sessions together instead of
+# each call retrying alone. region_name is only the default, bedrock-runtime
+# clients are created per region of regions.REGIONS
 retry_config = Config(
         region_name = 'us-east-1',
         retries = {
-            'max_attempts': 10,
+            'max_attempts': 2,
             'mode': 'standard'
         }
 )
+# follow-ups shorter than this may be hedged (sent twice if the first is slow)
+HEDGE_FOLLOWUPS = os.environ.get("BEDROCK_HEDGE_FOLLOWUPS", "") == "1"
+HEDGE_MAX_PROMPT_CHARS = 500
+# typical answer length in tokens per scheduler class, for estimating what a
+# cancelled request saved; follows the answers seen by this process
+OUTPUT_TOKENS = {"summary": 1000, "followup": 300}
 
 
 class SessionChatMessageHistory:
-    """Chat message history that stores messages in Streamlit session state"""
+    """Chat message history that stores messages in Streamlit session state,
+    or in Redis when replicas share state (see state.py)"""
     
     def __init__(self, session_id: str):
         self.session_id = session_id
         if f"chat_history_{session_id}" not in st.session_state:
-            st.session_state[f"chat_history_{session_id}"] = ChatMessageHistory()
+            st.session_state[f"chat_history_{session_id}"] = state.chat_history(session_id)
     
     def get_session_history(self) -> BaseChatMessageHistory:
         return st.session_state[f"chat_history_{self.session_id}"]
     
     def clear(self):
         """Clear the chat history"""
-        st.session_state[f"chat_history_{self.session_id}"] = ChatMessageHistory()
+        self.get_session_history().clear()
 
 
-def bedrock_chain():
-    """Create a modern LangChain conversation chain using RunnableWithMessageHistory"""
+# bedrock model ids: https://docs.aws.amazon.com/bedrock/latest/userguide/model-ids.html   
+MODEL_ID = "anthropic.claude-3-5-sonnet-20240620-v1:0"
+MODEL_KWARGS = { 
+    "max_tokens": 4096,  
+    "temperature": 0.0,
+    "top_k": 250,
+    "top_p": 1,
+    "stop_sequences": ["\n\nHuman"],
+}
+SYSTEM_PROMPT = "I want you to provide a comprehensive summary of this text provided, and then list the key points. Finally, write a short conclusion about what the video is about. The transcript contains [t=SECONDS] time markers: when a key point or an answer refers to a specific part of the video, cite the nearest preceding marker exactly as written, e.g. [t=120]."
+PLAYLIST_SYSTEM_PROMPT = "You are given summaries of several videos from the same playlist or channel. Provide an overall summary of what the collection covers, list the recurring key points and themes, and mention which videos stand out."
+LIBRARY_SYSTEM_PROMPT = "You are given a question and numbered excerpts from the summaries and transcripts of several videos. Answer the question from the excerpts only, name the videos the answer comes from, and cite the excerpts you use by their number, e.g. [2]. If the excerpts do not answer the question, say so."
+# follow-up questions are embedded to find near-identical earlier questions
+EMBEDDING_MODEL_ID = "amazon.titan-embed-text-v2:0"
+EMBEDDING_DIMENSIONS = 256
+# bump whenever SYSTEM_PROMPT or the prompt built from a transcript changes,
+# so cached summaries from an older prompt are not reused
+PROMPT_VERSION = "3"
+
+
+def aws_session():
+    """boto3 session from the Streamlit secrets (also read by the CLI tools)"""
     ACCESS_KEY = st.secrets["ACCESS_KEY"]
     SECRET_KEY = st.secrets["SECRET_KEY"]
-    session = boto3.Session(
+    return boto3.Session(
         aws_access_key_id=ACCESS_KEY,
         aws_secret_access_key=SECRET_KEY
     )
-    
-    bedrock_runtime = session.client("bedrock-runtime", config=retry_config)
-    # bedrock model ids: https://docs.aws.amazon.com/bedrock/latest/userguide/model-ids.html   
-    model_id = "anthropic.claude-3-5-sonnet-20240620-v1:0"
-    model_kwargs = { 
-        "max_tokens": 4096,  
-        "temperature": 0.0,
-        "top_k": 250,
-        "top_p": 1,
-        "stop_sequences": ["\n\nHuman"],
-    }
-    
-    model = ChatBedrock(
-        client=bedrock_runtime,
-        model_id=model_id,
-        model_kwargs=model_kwargs,
+
+
+def bedrock_runtime_client():
+    """Create the bedrock-runtime client from the Streamlit secrets
+
+    Calls are spread over the BEDROCK_REGIONS pool. With a recorder cassette
+    active, they are recorded or replayed.
+    """
+    client = recorder.runtime_client(lambda: regions.shared_pool(
+        lambda region: aws_session().client("bedrock-runtime", region_name=region, config=retry_config),
+        MODEL_ID,
+    ))
+    return throttle.ControlledClient(client, throttle.controller)
+
+
+def bedrock_model(client=None):
+    """Create the chat model shared by the conversation chain and summarize()"""
+    if client is None:
+        client = bedrock_runtime_client()
+    return ChatBedrock(
+        client=client,
+        model_id=MODEL_ID,
+        model_kwargs=MODEL_KWARGS,
     )
+
+
+def anthropic_request_body(prompt, system_prompt=SYSTEM_PROMPT, model_kwargs=MODEL_KWARGS):
+    """invoke_model body equivalent to what ChatBedrock sends for one prompt
+
+    Used where we talk to Bedrock without LangChain (batch inference jobs,
+    benchmarks), so results stay comparable with the app's.
+    """
+    body = {
+        "anthropic_version": "bedrock-2023-05-31",
+        "system": system_prompt,
+        "messages": [{"role": "user", "content": [{"type": "text", "text": prompt}]}],
+    }
+    body.update(model_kwargs)
+    return body
+
+
+def bedrock_chain():
+    """Create a modern LangChain conversation chain using RunnableWithMessageHistory"""
+    model = bedrock_model()
     
     # Create a modern chat prompt template
     prompt = ChatPromptTemplate.from_messages([
-        ("system", "I want you to provide a comprehensive summary of this text provided, and then list the key points. Finally, write a short conclusion about what the video is about."),
+        ("system", SYSTEM_PROMPT),
         MessagesPlaceholder(variable_name="history"),
         ("human", "{input}")
     ])
@@ -88,27 +156,140 @@ def bedrock_chain():
     return conversation_chain
 
 
-def run_chain(chain, prompt):
-    """Run the chain with the given prompt using the modern invoke method"""
+def run_chain(chain, prompt, kind="followup"):
+    """Run the chain with the given prompt using the modern invoke method
+
+    kind is the scheduler class: "summary" for the first prompt of a
+    conversation, "followup" for questions after it. Raises
+    inflight.Cancelled if the user cancels the request meanwhile; the chat
+    history is then left as it was before.
+    """
+    status = st.empty()
+
+    def on_wait(position):
+        status.info(f"⏳ Bedrock is busy, you are number {position} in the queue ...")
+
+    history = chain._message_history_manager.get_session_history()
+    recorded = len(history.messages)
+    sent = False
+    generated = []
     try:
         # Get the session ID for message history
         session_id = st.session_state.get("user_id", "default")
         
+        hedge = HEDGE_FOLLOWUPS and len(prompt) <= HEDGE_MAX_PROMPT_CHARS
+        config = {"configurable": {"session_id": session_id}}
         # Use the modern invoke method instead of the deprecated __call__
-        result = chain.invoke(
-            {"input": prompt},
-            config={"configurable": {"session_id": session_id}}
-        )
+        with throttle.request_budget(hedge=hedge):
+            # waits for this session's fair share of Bedrock capacity
+            with scheduler.scheduler.slot(session_id, kind, scheduler.estimate_cost(prompt), on_wait):
+                status.empty()
+                sent = True
+                with profiling.stage("langchain"):
+                    if hedge:
+                        # short, and possibly sent twice: not worth streaming
+                        result = chain.invoke({"input": prompt}, config=config)
+                    else:
+                        result = _stream(chain, {"input": prompt}, config, generated)
+        inflight.check()
         
         # Extract the content from the AIMessage response
         if hasattr(result, 'content'):
+            _observe_answer(kind, result.content)
             return {"response": result.content}
         else:
             return {"response": str(result)}
             
     except Exception as e:
-        st.error(f"Error running chain: {str(e)}")
+        if inflight.cancelled():
+            # the chain may have recorded a partial exchange
+            if len(history.messages) > recorded:
+                messages = history.messages[:recorded]
+                history.clear()
+                history.add_messages(messages)
+            raise inflight.Cancelled(tokens_saved(kind, None if sent else prompt, "".join(generated))) from None
+        if isinstance(e, throttle.BedrockUnavailable):
+            st.warning(str(e))
+        else:
+            st.error(f"Error running chain: {str(e)}")
         return {"response": f"Error: {str(e)}"}
+    finally:
+        status.empty()
+
+
+def _stream(chain, inputs, config, generated):
+    """chain.stream() collected into one message; a cancelled request
+    closes the Bedrock stream, which ends this early"""
+    stream = chain.stream(inputs, config=config)
+    result = None
+    try:
+        for chunk in stream:
+            result = chunk if result is None else result + chunk
+            generated.append(str(chunk.content))
+            if inflight.cancelled():
+                break
+    finally:
+        stream.close()
+    return result
+
+
+def _observe_answer(kind, answer):
+    if kind in OUTPUT_TOKENS:
+        OUTPUT_TOKENS[kind] += 0.2 * (scheduler.estimate_cost(answer) - OUTPUT_TOKENS[kind])
+
+
+def tokens_saved(kind, prompt=None, generated=""):
+    """Estimated tokens a cancelled request did not spend: the rest of a
+    typical answer, and the prompt if it was never sent"""
+    saved = max(0, int(OUTPUT_TOKENS.get(kind, 0)) - len(generated) // 4)
+    if prompt:
+        saved += scheduler.estimate_cost(prompt)
+    return saved
+
+
+def summarize(prompt, model=None, system_prompt=SYSTEM_PROMPT, user="batch", kind="summary"):
+    """Summarize a prompt without touching the session chat history
+
+    Used for bulk work (playlists, channels) where every video is an
+    independent request. Errors are raised to the caller instead of being
+    shown in the UI, since this may run outside the Streamlit script thread.
+    user and kind place the request in the scheduler's fair queue.
+    """
+    if model is None:
+        model = bedrock_model()
+    with throttle.request_budget():
+        with scheduler.scheduler.slot(user, kind, scheduler.estimate_cost(prompt)):
+            with profiling.stage("langchain"):
+                result = model.invoke([("system", system_prompt), ("human", prompt)])
+    if hasattr(result, 'content'):
+        return result.content
+    return str(result)
+
+
+def embed(text, client=None):
+    """Normalized Titan embedding of a short text, as a list of floats"""
+    if client is None:
+        client = bedrock_runtime_client()
+    with throttle.request_budget():
+        response = client.invoke_model(
+            modelId=EMBEDDING_MODEL_ID,
+            body=json.dumps({"inputText": text, "dimensions": EMBEDDING_DIMENSIONS, "normalize": True}),
+            accept="application/json",
+            contentType="application/json",
+        )
+    return json.loads(response["body"].read())["embedding"]
+
+
+def add_exchange(chain, question, answer):
+    """Record a question/answer pair in the chat history without calling Bedrock
+
+    Lets cached answers (e.g. a summary computed earlier) take part in
+    follow-up questions exactly as if the model had just produced them.
+    """
+    chain._message_history_manager.get_session_history().add_messages([
+        HumanMessage(content=question),
+        AIMessage(content=answer),
+    ])
 
 
 def clear_memory(chain):
@@ -121,7 +302,7 @@ def clear_memory(chain):
             # Fallback: clear from session state directly
             session_id = st.session_state.get("user_id", "default")
             if f"chat_history_{session_id}" in st.session_state:
-                st.session_state[f"chat_history_{session_id}"] = ChatMessageHistory()
+                st.session_state[f"chat_history_{session_id}"].clear()
             return True
     except Exception as e:
         st.error(f"Error clearing memory: {str(e)}")
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Benchmark matrix of summarization models and parameters
+Summarizes a fixed set of transcripts with every combination of model id
+and parameter setting (same system prompt and prompt as the app), streaming
+each answer to measure time to first token, total latency, input/output
+tokens and cost per video. Results are appended to a JSON-lines file and
+rendered as a comparison table per transcript length class, so defaults can
+be picked per class.
+
+Usage:
+    python3 benchmark_models.py --urls <file_with_urls> [--models id1,id2] [--param max_tokens=1024,4096]
+    python3 benchmark_models.py --local
+    python3 benchmark_models.py --render [--results benchmarks/models.jsonl] [--run RUN_ID]
+
+Examples:
+    python3 benchmark_models.py --urls sample_test_urls.txt \\
+        --models anthropic.claude-3-5-sonnet-20240620-v1:0,anthropic.claude-3-haiku-20240307-v1:0 \\
+        --param max_tokens=1024,4096 --param top_k=50,250 --repeat 2
+    python3 benchmark_models.py --urls sample_test_urls.txt --replay fixtures/sample.jsonl.gz
+
+Notes:
+    Transcripts come from the transcript cache (or BEDROCK_CHAT_CORPUS) when
+    present, so reruns use the same corpus. Prices are on-demand USD per
+    1000 tokens; check them against the Bedrock pricing page and pass
+    --prices prices.json ({"model_id": [input, output]}) for other models.
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import itertools
+from datetime import datetime
+
+import bedrock
+import ingest
+import playlist
+import recorder
+import scheduler
+import utility
+from stats import percentile
+
+RESULTS_FILE = os.path.join("benchmarks", "models.jsonl")
+# USD per 1000 input and output tokens, on-demand in us-east-1
+PRICES = {
+    "anthropic.claude-3-5-sonnet-20240620-v1:0": (0.003, 0.015),
+    "anthropic.claude-3-5-sonnet-20241022-v2:0": (0.003, 0.015),
+    "anthropic.claude-3-7-sonnet-20250219-v1:0": (0.003, 0.015),
+    "anthropic.claude-3-5-haiku-20241022-v1:0": (0.0008, 0.004),
+    "anthropic.claude-3-haiku-20240307-v1:0": (0.00025, 0.00125),
+    "anthropic.claude-3-opus-20240229-v1:0": (0.015, 0.075),
+}
+# transcript length classes by prompt tokens (upper bounds)
+LENGTH_CLASSES = [("short", 5000), ("medium", 20000), ("long", 60000), ("very long", float("inf"))]
+# synthetic transcripts of --local runs, in minutes
+LOCAL_MINUTES = [5, 20, 60, 180]
+
+
+def length_class(tokens):
+    return next(name for name, bound in LENGTH_CLASSES if tokens <= bound)
+
+
+def parse_value(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def parameter_matrix(params):
+    """MODEL_KWARGS variants for every combination of "name=v1,v2" settings"""
+    names, values = [], []
+    for param in params:
+        name, _, options = param.partition("=")
+        names.append(name)
+        values.append([parse_value(option) for option in options.split(",")])
+    return [dict(zip(names, combination)) for combination in itertools.product(*values)]
+
+
+def load_corpus(args):
+    """[(video_id, prompt)] of the benchmark"""
+    if args.local:
+        from rolling import growing_transcript
+        return [(f"synthetic-{minutes}min", utility.generate_prompt_from_transcript(growing_transcript(minutes, seed=minutes)))
+                for minutes in LOCAL_MINUTES]
+    corpus = []
+    for video_id in playlist.read_video_ids(args.urls):
+        video = ingest.ingest(video_id)
+        if not video.transcript:
+            print(f"⚠️  {video_id}: no transcript, skipped")
+            continue
+        corpus.append((video_id, video.prompt()))
+    return corpus
+
+
+def measure(client, model_id, prompt, model_kwargs):
+    """Stream one summary; time to first token, latency, tokens and text"""
+    body = bedrock.anthropic_request_body(prompt, bedrock.SYSTEM_PROMPT, model_kwargs)
+    start = time.perf_counter()
+    first_token = None
+    usage = {"input_tokens": 0, "output_tokens": 0}
+    text = []
+    response = client.invoke_model_with_response_stream(modelId=model_id, body=json.dumps(body))
+    for event in response["body"]:
+        if "chunk" not in event:
+            continue
+        chunk = json.loads(event["chunk"]["bytes"])
+        if chunk["type"] == "message_start":
+            usage["input_tokens"] = chunk["message"]["usage"]["input_tokens"]
+        elif chunk["type"] == "content_block_delta":
+            if first_token is None:
+                first_token = time.perf_counter() - start
+            text.append(chunk["delta"].get("text", ""))
+        elif chunk["type"] == "message_delta":
+            usage["output_tokens"] = chunk["usage"]["output_tokens"]
+    text = "".join(text)
+    return {
+        "ttft": first_token if first_token is not None else time.perf_counter() - start,
+        "latency": time.perf_counter() - start,
+        **usage,
+        "output_chars": len(text),
+        # the system prompt asks for [t=...] citations; a cheap check that they are there
+        "citations": text.count("[t="),
+    }
+
+
+def cost(model_id, input_tokens, output_tokens, prices):
+    if model_id not in prices:
+        return None
+    price_in, price_out = prices[model_id]
+    return input_tokens / 1000 * price_in + output_tokens / 1000 * price_out
+
+
+def run_benchmark(args, prices):
+    models = args.models.split(",")
+    variants = [dict(bedrock.MODEL_KWARGS, **overrides) for overrides in parameter_matrix(args.param)]
+    corpus = load_corpus(args)
+    if not corpus:
+        print("❌ No transcripts to benchmark")
+        sys.exit(1)
+    if args.local:
+        import throttle
+        from standins import FakeBedrockRuntime
+        runtime = FakeBedrockRuntime(latency=args.latency, input_latency=0.1, seed=1,
+                                     response_text="A key point of the video [t=0]. " * 60)
+        client = throttle.ControlledClient(runtime, throttle.controller)
+    else:
+        client = bedrock.bedrock_runtime_client()
+
+    run_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    total = len(models) * len(variants) * len(corpus) * args.repeat
+    print(f"🏁 Run {run_id}: {len(models)} model(s) x {len(variants)} setting(s) x {len(corpus)} video(s) x {args.repeat}")
+    os.makedirs(os.path.dirname(args.results) or ".", exist_ok=True)
+    done = 0
+    with open(args.results, "a") as results:
+        for model_id, model_kwargs, (video_id, prompt), _ in itertools.product(models, variants, corpus, range(args.repeat)):
+            done += 1
+            record = {
+                "run": run_id, "time": time.time(), "model_id": model_id, "model_kwargs": model_kwargs,
+                "video_id": video_id, "prompt_tokens": scheduler.estimate_cost(prompt),
+            }
+            record["length_class"] = length_class(record["prompt_tokens"])
+            try:
+                record.update(measure(client, model_id, prompt, model_kwargs))
+                record["cost"] = cost(model_id, record["input_tokens"], record["output_tokens"], prices)
+                print(f"  [{done}/{total}] {model_id} {overrides_label(model_kwargs)} {video_id}: "
+                      f"TTFT {record['ttft']:.2f}s, {record['latency']:.2f}s, {record['output_tokens']} tokens out")
+            except Exception as e:
+                record["error"] = str(e)
+                print(f"  [{done}/{total}] {model_id} {overrides_label(model_kwargs)} {video_id}: ❌ {e}")
+            results.write(json.dumps(record) + "\n")
+    print(f"\n📄 Results appended to {args.results}")
+    return run_id
+
+
+def overrides_label(model_kwargs):
+    """The settings that differ from the app's MODEL_KWARGS"""
+    changed = [f"{k}={v}" for k, v in model_kwargs.items() if bedrock.MODEL_KWARGS.get(k) != v]
+    return ",".join(changed) or "defaults"
+
+
+def render(path, run_id=None):
+    """Comparison table of stored results: one row per model, setting and
+    length class; the last run when run_id is None"""
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if not records:
+        print(f"❌ No results in {path}")
+        return
+    run_id = run_id or records[-1]["run"]
+    records = [r for r in records if r["run"] == run_id]
+    groups = {}
+    for record in records:
+        key = (record["length_class"], record["model_id"], overrides_label(record["model_kwargs"]))
+        groups.setdefault(key, []).append(record)
+
+    order = {name: i for i, (name, _) in enumerate(LENGTH_CLASSES)}
+    print(f"\n{'='*118}")
+    print(f"📊 MODEL BENCHMARK {run_id}")
+    print(f"{'='*118}")
+    print(f"{'class':<10} {'model':<44} {'settings':<22} {'n':>3} {'TTFT p50':>9} {'p50':>7} {'p95':>7} "
+          f"{'out tok':>8} {'$/video':>9} {'cites':>6}")
+    best = {}
+    for key in sorted(groups, key=lambda k: (order[k[0]], k[1], k[2])):
+        ok = [r for r in groups[key] if "error" not in r]
+        errors = len(groups[key]) - len(ok)
+        costs = [r["cost"] for r in ok if r["cost"] is not None]
+        row = {
+            "ttft": percentile([r["ttft"] for r in ok], 50),
+            "p50": percentile([r["latency"] for r in ok], 50),
+            "p95": percentile([r["latency"] for r in ok], 95),
+            "output_tokens": sum(r["output_tokens"] for r in ok) / max(1, len(ok)),
+            "cost": sum(costs) / len(costs) if costs else None,
+            "citations": sum(r["citations"] for r in ok) / max(1, len(ok)),
+        }
+        cost_text = f"{row['cost']:.4f}" if row["cost"] is not None else "?"
+        print(f"{key[0]:<10} {key[1][:44]:<44} {key[2][:22]:<22} {len(ok):>3} {row['ttft']:>8.2f}s {row['p50']:>6.2f}s "
+              f"{row['p95']:>6.2f}s {row['output_tokens']:>8.0f} {cost_text:>9} {row['citations']:>6.1f}"
+              f"{f'  ❌ {errors} failed' if errors else ''}")
+        if ok:
+            fastest, cheapest = best.setdefault(key[0], [None, None])
+            if fastest is None or row["p50"] < fastest[1]["p50"]:
+                best[key[0]][0] = (key, row)
+            if row["cost"] is not None and (cheapest is None or row["cost"] < cheapest[1]["cost"]):
+                best[key[0]][1] = (key, row)
+
+    print()
+    for length, (fastest, cheapest) in sorted(best.items(), key=lambda item: order[item[0]]):
+        line = f"🏆 {length}: fastest {fastest[0][1]} ({fastest[0][2]}, {fastest[1]['p50']:.2f}s)"
+        if cheapest:
+            line += f", cheapest {cheapest[0][1]} ({cheapest[0][2]}, ${cheapest[1]['cost']:.4f})"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark summarization latency and cost across models and parameters",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument("--urls", help="file with YouTube video/playlist URLs, one per line")
+    parser.add_argument("--models", default=bedrock.MODEL_ID, help="model ids, comma separated")
+    parser.add_argument("--param", action="append", default=[], metavar="NAME=V1,V2",
+                        help="model_kwargs values to try, repeatable (e.g. max_tokens=1024,4096)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per combination and video")
+    parser.add_argument("--results", default=RESULTS_FILE, help="JSON-lines file results are appended to")
+    parser.add_argument("--prices", help="JSON file with {model_id: [USD per 1000 input, output tokens]}")
+    parser.add_argument("--render", action="store_true", help="only render stored results")
+    parser.add_argument("--run", help="run id to render (default: the last run)")
+    parser.add_argument("--local", action="store_true", help="synthetic transcripts and a local Bedrock stand-in")
+    parser.add_argument("--latency", type=float, default=0.5, help="stand-in latency per call (--local)")
+    parser.add_argument("--record", metavar="FIXTURE", help="record YouTube and Bedrock traffic to a fixture file")
+    parser.add_argument("--replay", metavar="FIXTURE", help="replay YouTube and Bedrock traffic from a fixture file")
+    args = parser.parse_args()
+
+    if args.render:
+        render(args.results, args.run)
+        return
+    if not (args.urls or args.local):
+        parser.print_help()
+        sys.exit(1)
+    if args.record:
+        recorder.install(args.record, "record")
+    elif args.replay:
+        recorder.install(args.replay, "replay")
+
+    prices = dict(PRICES)
+    if args.prices:
+        with open(args.prices) as f:
+            prices.update({model_id: tuple(price) for model_id, price in json.load(f).items()})
+    try:
+        run_id = run_benchmark(args, prices)
+    except KeyboardInterrupt:
+        print("\n👋 Interrupted")
+        sys.exit(1)
+    render(args.results, run_id)
+
+
+if __name__ == "__main__":
+    main()
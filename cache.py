@@ -0,0 +1,182 @@
+import os
+import json
+import time
+import logging
+import threading
+
+import state
+
+logger = logging.getLogger()
+
+# Transcripts and summaries are cached on disk (or in Redis shared by all
+# replicas, see state.py) so that a video (or a playlist re-run) only goes to
+# YouTube and Bedrock once.
+CACHE_DIR = os.environ.get("BEDROCK_CHAT_CACHE_DIR", ".cache")
+
+# counter files are read, updated and replaced as a whole
+_counters_lock = threading.Lock()
+
+
+class FileCache:
+    """Simple JSON file cache, one file per key inside a namespace directory"""
+
+    def __init__(self, namespace, cache_dir=CACHE_DIR):
+        self.namespace = namespace
+        self.directory = os.path.join(cache_dir, namespace)
+
+    def path(self, key):
+        safe_key = "".join(c if c.isalnum() or c in "-_." else "_" for c in str(key))
+        return os.path.join(self.directory, f"{safe_key}.json")
+
+    def written(self, key):
+        """Time the entry was written, or None if it does not exist"""
+        try:
+            return os.path.getmtime(self.path(key))
+        except OSError:
+            return None
+
+    def age(self, key):
+        """Seconds since the entry was written, or None if it does not exist"""
+        written = self.written(key)
+        return None if written is None else time.time() - written
+
+    def get(self, key, max_age=None):
+        age = self.age(key)
+        if age is None or (max_age is not None and age > max_age):
+            return None
+        try:
+            with open(self.path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable {self.namespace} cache entry {key}: {e}")
+            return None
+
+    def set(self, key, value):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(key)
+        # write to a temp file first so readers never see a half written entry;
+        # named per thread, playlists and the cache warmer write from pools
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+    def _counters_path(self, key):
+        return self.path(key)[:-len(".json")] + ".counters"
+
+    def counters(self, key):
+        """Counters kept next to an entry by increment(); {} if there are none"""
+        try:
+            with open(self._counters_path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def increment(self, key, amounts):
+        """Add {name: amount} to the counters of an entry, without rewriting
+        the entry itself"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._counters_path(key)
+        with _counters_lock:
+            counters = self.counters(key)
+            for name, amount in amounts.items():
+                counters[name] = counters.get(name, 0) + amount
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(counters, f)
+            os.replace(tmp_path, path)
+
+    def __contains__(self, key):
+        return self.age(key) is not None
+
+    def keys(self):
+        # keys are stored with unsafe characters replaced, good enough for listing
+        if not os.path.isdir(self.directory):
+            return []
+        return [name[:-len(".json")] for name in os.listdir(self.directory) if name.endswith(".json")]
+
+
+class RedisCache:
+    """FileCache interface on top of Redis, shared by all app replicas
+
+    Every entry is a hash with the JSON value and the time it was written.
+    """
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+
+    def _key(self, key):
+        return state.key("cache", self.namespace, key)
+
+    def written(self, key):
+        written = state.redis_client().hget(self._key(key), "written")
+        return float(written) if written is not None else None
+
+    def age(self, key):
+        written = self.written(key)
+        return None if written is None else time.time() - written
+
+    def get(self, key, max_age=None):
+        value, written = state.redis_client().hmget(self._key(key), "value", "written")
+        if value is None or (max_age is not None and time.time() - float(written) > max_age):
+            return None
+        try:
+            return json.loads(value)
+        except ValueError as e:
+            logger.warning(f"Ignoring unreadable {self.namespace} cache entry {key}: {e}")
+            return None
+
+    def set(self, key, value):
+        state.redis_client().hset(self._key(key), mapping={
+            "value": json.dumps(value, ensure_ascii=False),
+            "written": time.time(),
+        })
+
+    def delete(self, key):
+        state.redis_client().delete(self._key(key))
+
+    def _counters_key(self, key):
+        return state.key("counters", self.namespace, key)
+
+    def counters(self, key):
+        values = state.redis_client().hgetall(self._counters_key(key))
+        return {name.decode(): float(value) if b"." in value else int(value) for name, value in values.items()}
+
+    def increment(self, key, amounts):
+        # HINCRBY is atomic, so replicas never lose each other's counts
+        pipeline = state.redis_client().pipeline(transaction=False)
+        for name, amount in amounts.items():
+            if isinstance(amount, int):
+                pipeline.hincrby(self._counters_key(key), name, amount)
+            else:
+                pipeline.hincrbyfloat(self._counters_key(key), name, amount)
+        pipeline.execute()
+
+    def __contains__(self, key):
+        return bool(state.redis_client().exists(self._key(key)))
+
+    def keys(self):
+        prefix = self._key("")
+        return [k.decode()[len(prefix):] for k in state.redis_client().scan_iter(match=prefix + "*")]
+
+
+def open_cache(namespace):
+    """Cache for a namespace: in Redis when configured, else in CACHE_DIR"""
+    if state.enabled():
+        return RedisCache(namespace)
+    return FileCache(namespace)
+
+
+transcript_cache = open_cache("transcripts")
+summary_cache = open_cache("summaries")
+
+
+def summary_key(video_id, prompt_version):
+    """Summaries are only reusable for the prompt version that produced them"""
+    return f"{video_id}-v{prompt_version}"
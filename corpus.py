@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+"""
+Compact read-only corpus of transcripts for bulk jobs
+
+One file holds many transcripts: each text compressed with zlib against a
+dictionary trained on the corpus, the segment offset/start/duration arrays
+stored raw, and a sorted index of video ids. The file is opened with mmap,
+so opening costs nothing per transcript, the arrays and the index are read
+in place without copies, and only the text of the transcript asked for is
+decompressed. Set BEDROCK_CHAT_CORPUS to a corpus file and transcripts in
+it are served from there before the transcript cache.
+
+Layout (little endian):
+    header   magic, version, count, dictionary offset/length, index offset
+    dict     zlib preset dictionary (at most 32 KB), padded to 4 bytes
+    blocks   per transcript: compressed text, padded to 4 bytes, then the
+             offsets, starts and durations arrays, 4-byte aligned in the file
+    index    count fixed-size records sorted by video id
+
+Usage:
+    python3 corpus.py build <corpus_file> [--merge <old_corpus>]
+    python3 corpus.py info <corpus_file> [<video_id> ...]
+    python3 corpus.py bench [--videos 5000] [--accesses 2000]
+
+Examples:
+    python3 corpus.py build .cache/transcripts.corpus
+    python3 corpus.py build new.corpus --merge .cache/transcripts.corpus
+    python3 corpus.py info .cache/transcripts.corpus DgpYiysQjeI
+"""
+
+import os
+import sys
+import json
+import mmap
+import time
+import zlib
+import random
+import struct
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+import subprocess
+from bisect import bisect_left
+from collections import Counter
+
+import cache
+import segments
+from segments import TranscriptSegments
+
+logger = logging.getLogger()
+
+CORPUS_PATH = os.environ.get("BEDROCK_CHAT_CORPUS")
+
+MAGIC = b"BCCORPUS"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQIQ")
+# video id, text offset, compressed/raw text bytes, arrays offset, segments, written
+INDEX_RECORD = struct.Struct("<32sQIIQId")
+KEY_SIZE = 32
+# zlib only looks back 32 KB, a longer dictionary would be wasted
+DICTIONARY_SIZE = 32 * 1024
+# transcripts the dictionary is trained on
+TRAINING_SAMPLE = 500
+COMPRESSION_LEVEL = 9
+ALIGNMENT = 4
+
+
+def _pad(offset):
+    """Zero bytes that bring a file offset to the next ALIGNMENT boundary"""
+    return b"\0" * (-offset % ALIGNMENT)
+
+
+def _key(video_id):
+    key = video_id.encode()
+    if len(key) > KEY_SIZE:
+        raise ValueError(f"Video id longer than {KEY_SIZE} bytes: {video_id}")
+    return key.ljust(KEY_SIZE, b"\0")
+
+
+def train_dictionary(texts, size=DICTIONARY_SIZE):
+    """zlib preset dictionary from the most common words and word pairs
+
+    Strings are scored by occurrences times length (the bytes a match could
+    save) and the best ones are packed into size bytes, most valuable last,
+    since zlib reaches the end of the dictionary with the shortest distances.
+    """
+    counts = Counter()
+    for text in texts:
+        words = text.split()
+        counts.update(words)
+        counts.update(" ".join(pair) for pair in zip(words, words[1:]))
+    scored = sorted(
+        ((count * len(string), string) for string, count in counts.items() if count > 1 and len(string) > 3),
+        reverse=True,
+    )
+    picked = []
+    used = 0
+    for _, string in scored:
+        entry = (string + " ").encode()
+        if used + len(entry) > size:
+            continue
+        picked.append(entry)
+        used += len(entry)
+    return b"".join(reversed(picked))
+
+
+class CorpusWriter:
+    """Writes a corpus file; transcripts can be added in any order
+
+    The file is written under a temporary name and renamed on close(), so
+    readers never see a half written corpus.
+    """
+
+    def __init__(self, path, dictionary):
+        self.path = path
+        self.dictionary = dictionary
+        self._tmp_path = f"{path}.{os.getpid()}.tmp"
+        self._file = open(self._tmp_path, "wb")
+        self._file.write(HEADER.pack(MAGIC, VERSION, 0, 0, 0, 0))
+        self._dictionary_offset = self._file.tell()
+        self._file.write(dictionary)
+        self._file.write(_pad(self._file.tell()))
+        self._records = {}
+
+    def add(self, video_id, transcript, written=None):
+        compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, -15, zdict=self.dictionary)
+        raw = transcript.text.encode()
+        data = compressor.compress(raw) + compressor.flush()
+        text_offset = self._file.tell()
+        self._file.write(data)
+        self._file.write(_pad(self._file.tell()))
+        arrays_offset = self._file.tell()
+        for column in (transcript.offsets, transcript.starts, transcript.durations):
+            self._file.write(column.tobytes())
+        self._records[video_id] = INDEX_RECORD.pack(
+            _key(video_id), text_offset, len(data), len(raw), arrays_offset,
+            len(transcript), written if written is not None else time.time(),
+        )
+
+    def close(self):
+        index_offset = self._file.tell()
+        for video_id in sorted(self._records, key=_key):
+            self._file.write(self._records[video_id])
+        self._file.seek(0)
+        self._file.write(HEADER.pack(
+            MAGIC, VERSION, len(self._records), self._dictionary_offset, len(self.dictionary), index_offset
+        ))
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+
+class _Keys:
+    """Sorted video id keys of the index, for bisect"""
+
+    def __init__(self, index, count):
+        self.index = index
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        start = i * INDEX_RECORD.size
+        return self.index[start:start + KEY_SIZE].tobytes()
+
+
+class Corpus:
+    """Memory-mapped corpus file, safe to share between threads
+
+    get() returns TranscriptSegments whose offsets/starts/durations are
+    memoryviews into the mapping, so keep the corpus open while they are used.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        magic, version, count, dictionary_offset, dictionary_length, index_offset = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} transcript corpus")
+        self.count = count
+        self._dictionary = self._mmap[dictionary_offset:dictionary_offset + dictionary_length]
+        self._index = self._view[index_offset:index_offset + count * INDEX_RECORD.size]
+        self._keys = _Keys(self._index, count)
+
+    def __len__(self):
+        return self.count
+
+    def _record(self, video_id):
+        try:
+            key = _key(video_id)
+        except ValueError:
+            return None
+        i = bisect_left(self._keys, key)
+        if i == self.count or self._keys[i] != key:
+            return None
+        return INDEX_RECORD.unpack_from(self._index, i * INDEX_RECORD.size)
+
+    def __contains__(self, video_id):
+        return self._record(video_id) is not None
+
+    def video_ids(self):
+        for i in range(self.count):
+            yield self._keys[i].rstrip(b"\0").decode()
+
+    def written(self, video_id):
+        """Time the transcript was cached before going into the corpus"""
+        record = self._record(video_id)
+        return record[6] if record else None
+
+    def get(self, video_id):
+        """TranscriptSegments of a video, or None if it is not in the corpus"""
+        record = self._record(video_id)
+        if record is None:
+            return None
+        _, text_offset, compressed, raw, arrays_offset, count, _ = record
+        decompressor = zlib.decompressobj(-15, zdict=self._dictionary)
+        text = decompressor.decompress(self._view[text_offset:text_offset + compressed]).decode()
+        columns = []
+        offset = arrays_offset
+        for typecode in (segments.OFFSET_TYPECODE, segments.TIME_TYPECODE, segments.TIME_TYPECODE):
+            columns.append(self._view[offset:offset + 4 * count].cast(typecode))
+            offset += 4 * count
+        return TranscriptSegments(text, *columns)
+
+    def timestamps(self, video_id):
+        """(starts, durations) of a video without decompressing its text"""
+        record = self._record(video_id)
+        if record is None:
+            return None
+        arrays_offset, count = record[4], record[5]
+        starts = arrays_offset + 4 * count
+        return (self._view[starts:starts + 4 * count].cast(segments.TIME_TYPECODE),
+                self._view[starts + 4 * count:starts + 8 * count].cast(segments.TIME_TYPECODE))
+
+    def stats(self):
+        raw = compressed = 0
+        for i in range(self.count):
+            record = INDEX_RECORD.unpack_from(self._index, i * INDEX_RECORD.size)
+            compressed += record[2]
+            raw += record[3]
+        return {
+            "transcripts": self.count,
+            "file_bytes": len(self._mmap),
+            "dictionary_bytes": len(self._dictionary),
+            "text_bytes": raw,
+            "compressed_text_bytes": compressed,
+            "compression_ratio": raw / compressed if compressed else 0.0,
+        }
+
+
+def build(path, transcripts, sample=TRAINING_SAMPLE):
+    """Write a corpus from (video_id, TranscriptSegments, written) items
+
+    The items are read twice, once for a sample to train the dictionary, so
+    pass a list or another re-iterable.
+    """
+    training = [transcript.text for _, transcript, _ in transcripts[:sample]]
+    writer = CorpusWriter(path, train_dictionary(training))
+    for video_id, transcript, written in transcripts:
+        writer.add(video_id, transcript, written)
+    writer.close()
+    return len(transcripts)
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared():
+    """The corpus at BEDROCK_CHAT_CORPUS, opened once per process; None if unset"""
+    global _shared
+    if not CORPUS_PATH:
+        return None
+    with _shared_lock:
+        if _shared is None:
+            try:
+                _shared = Corpus(CORPUS_PATH)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Not using transcript corpus {CORPUS_PATH}: {e}")
+                _shared = False
+    return _shared or None
+
+
+def cached_transcripts():
+    """(video_id, TranscriptSegments, written) of the transcript cache"""
+    items = []
+    for video_id in cache.transcript_cache.keys():
+        data = cache.transcript_cache.get(video_id)
+        # entries from before segments were cached are plain strings
+        if isinstance(data, dict):
+            items.append((video_id, TranscriptSegments.from_dict(data), cache.transcript_cache.written(video_id)))
+    return items
+
+
+def memory_bytes():
+    """(private, file-backed) resident memory of this process
+
+    Pages of a memory-mapped file are page cache the kernel can drop and
+    share with other processes, so they are counted apart from private memory.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            fields = dict(line.split(":", 1) for line in f)
+        return int(fields["RssAnon"].split()[0]) * 1024, int(fields["RssFile"].split()[0]) * 1024
+    except (OSError, KeyError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024, 0
+
+
+def synthetic_transcripts(count, segments_per_video, seed=1):
+    """Random transcripts with a Zipf-like vocabulary, like spoken text"""
+    rng = random.Random(seed)
+    vocabulary = ["".join(rng.choice("etaoinshrdlucmfwypvbgk") for _ in range(rng.randint(2, 9)))
+                  for _ in range(5000)]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    for n in range(count):
+        builder = segments.SegmentBuilder()
+        start = 0.0
+        for _ in range(segments_per_video):
+            words = rng.choices(vocabulary, weights, k=rng.randint(5, 12))
+            duration = rng.uniform(2.0, 6.0)
+            builder.add(" ".join(words), start, duration)
+            start += duration
+        yield f"v{n:010d}", builder.build()
+
+
+def bench_worker(kind, path, accesses, seed):
+    """One benchmark run in a fresh process: open, random reads, memory"""
+    private_before, file_before = memory_bytes()
+    start = time.perf_counter()
+    if kind == "corpus":
+        store = Corpus(path)
+        video_ids = list(store.video_ids())
+        read = store.get
+        read_timestamps = store.timestamps
+    else:
+        store = cache.FileCache(os.path.basename(path), os.path.dirname(path))
+        video_ids = store.keys()
+
+        def read(video_id):
+            return TranscriptSegments.from_dict(store.get(video_id))
+
+        def read_timestamps(video_id):
+            transcript = read(video_id)
+            return transcript.starts, transcript.durations
+    opened = time.perf_counter() - start
+
+    rng = random.Random(seed)
+    latencies = []
+    for _ in range(accesses):
+        video_id = rng.choice(video_ids)
+        start = time.perf_counter()
+        transcript = read(video_id)
+        # touch the arrays, a lazy mapping must not look faster than it is
+        transcript.starts[len(transcript) - 1]
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    private_after, file_after = memory_bytes()
+
+    # a pass over the whole collection keeping every timestamp array, like a
+    # job building a time index
+    start = time.perf_counter()
+    kept = [read_timestamps(video_id) for video_id in video_ids]
+    hours = sum(starts[-1] + durations[-1] for starts, durations in kept if len(starts)) / 3600
+    scanned = time.perf_counter() - start
+    private_scan, _ = memory_bytes()
+    return {
+        "open_seconds": opened,
+        "access_p50_ms": latencies[len(latencies) // 2] * 1000,
+        "access_p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        "private_growth_mb": (private_after - private_before) / 1e6,
+        "file_pages_mb": (file_after - file_before) / 1e6,
+        "scan_seconds": scanned,
+        "scan_private_growth_mb": (private_scan - private_after) / 1e6,
+        "scan_hours": hours,
+    }
+
+
+def run_bench(args):
+    directory = tempfile.mkdtemp(prefix="corpus-bench-")
+    try:
+        print(f"🧪 Generating {args.videos} transcripts of {args.segments} segments")
+        json_cache = cache.FileCache("transcripts", directory)
+        items = []
+        for video_id, transcript in synthetic_transcripts(args.videos, args.segments):
+            json_cache.set(video_id, transcript.to_dict())
+            items.append((video_id, transcript, None))
+        corpus_path = os.path.join(directory, "transcripts.corpus")
+        start = time.perf_counter()
+        build(corpus_path, items)
+        print(f"📦 Built the corpus in {time.perf_counter() - start:.1f}s")
+        del items
+
+        json_bytes = sum(os.path.getsize(os.path.join(json_cache.directory, name))
+                         for name in os.listdir(json_cache.directory))
+        results = {"json": {"disk_mb": json_bytes / 1e6},
+                   "corpus": {"disk_mb": os.path.getsize(corpus_path) / 1e6}}
+        for kind, path in (("json", json_cache.directory), ("corpus", corpus_path)):
+            # a fresh process each, so neither run sees the other's memory
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "bench-worker", kind, path,
+                 "--accesses", str(args.accesses)],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            results[kind].update(json.loads(output.splitlines()[-1]))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print(f"\n{'='*60}")
+    print("📊 CORPUS BENCHMARK")
+    print(f"{'='*60}")
+    print(f"{'':>23} {'JSON files':>12} {'corpus':>12}")
+    rows = [("disk (MB)", "disk_mb", "{:.1f}"), ("open (s)", "open_seconds", "{:.3f}"),
+            ("random access p50 (ms)", "access_p50_ms", "{:.3f}"), ("random access p99 (ms)", "access_p99_ms", "{:.3f}"),
+            ("private RSS growth (MB)", "private_growth_mb", "{:.1f}"),
+            ("mapped file RSS (MB)", "file_pages_mb", "{:.1f}"),
+            ("timestamp scan (s)", "scan_seconds", "{:.3f}"),
+            ("scan private RSS (MB)", "scan_private_growth_mb", "{:.1f}")]
+    for label, key, fmt in rows:
+        print(f"{label:>23} {fmt.format(results['json'][key]):>12} {fmt.format(results['corpus'][key]):>12}")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"videos": args.videos, "segments": args.segments, "accesses": args.accesses, **results}, f, indent=2)
+        print(f"📄 Report written to: {args.report}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build, inspect and benchmark memory-mapped transcript corpora",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument("command", choices=["build", "info", "bench", "bench-worker"])
+    parser.add_argument("path", nargs="?", help="corpus file")
+    parser.add_argument("video_ids", nargs="*", help="video ids to look up (info)")
+    parser.add_argument("--merge", help="keep the transcripts of this corpus not in the cache (build)")
+    parser.add_argument("--videos", type=int, default=5000, help="synthetic transcripts (bench)")
+    parser.add_argument("--segments", type=int, default=300, help="segments per transcript (bench)")
+    parser.add_argument("--accesses", type=int, default=2000, help="random reads (bench)")
+    parser.add_argument("--report", help="write the benchmark results as JSON")
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        run_bench(args)
+        return
+    if not args.path:
+        parser.print_help()
+        sys.exit(1)
+    if args.command == "bench-worker":
+        kind, path = args.path, args.video_ids[0]
+        print(json.dumps(bench_worker(kind, path, args.accesses, seed=7)))
+        return
+
+    if args.command == "build":
+        items = cached_transcripts()
+        if args.merge:
+            old = Corpus(args.merge)
+            known = {video_id for video_id, _, _ in items}
+            items += [(video_id, old.get(video_id), old.written(video_id))
+                      for video_id in old.video_ids() if video_id not in known]
+        start = time.perf_counter()
+        count = build(args.path, items)
+        print(f"📦 {count} transcript(s) written to {args.path} in {time.perf_counter() - start:.1f}s")
+
+    corpus = Corpus(args.path)
+    stats = corpus.stats()
+    print(f"📚 {stats['transcripts']} transcript(s), {stats['file_bytes'] / 1e6:.1f} MB, "
+          f"text compressed {stats['compression_ratio']:.1f}x with a {stats['dictionary_bytes']} byte dictionary")
+    for video_id in args.video_ids:
+        transcript = corpus.get(video_id)
+        if transcript is None:
+            print(f"❌ {video_id}: not in the corpus")
+        else:
+            print(f"✅ {video_id}: {len(transcript)} segments, {len(transcript.text)} characters, "
+                  f"{transcript.starts[-1] if len(transcript) else 0:.0f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,44 @@
 #!/usr/bin/env python3
 """
 Simple diagnostic tool to check YouTube transcript API issues
+
+With --bulk, probes many videos and all their transcript tracks concurrently
+and reports, per track, list/fetch latency, segment count and sizes (raw
+JSON, text, and the transcript cache entry), which track the app's language
+preference order picks, and latency/size histograms. Use it to choose the
+language order and to size the transcript cache from real data.
+
+Usage:
+    python3 diagnose_transcript.py <video_id_or_url>
+    python3 diagnose_transcript.py --bulk <file_with_urls> [--workers 8] [--json report.json] [--csv tracks.csv]
+
+Examples:
+    python3 diagnose_transcript.py DgpYiysQjeI
+    python3 diagnose_transcript.py --bulk sample_test_urls.txt --csv tracks.csv
+    python3 diagnose_transcript.py --bulk sample_test_urls.txt --rate 2 --replay fixtures/sample.jsonl.gz
 """
 
 from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound
-import sys
+import csv
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import recorder
+import utility
+from segments import TranscriptSegments
+from stats import percentile
+from transcript_fetcher import fetcher, TokenBucket, BURST
+
+# histogram bucket upper bounds
+LATENCY_BUCKETS = [0.1, 0.2, 0.5, 1, 2, 5, 10, 30]
+SEGMENT_BUCKETS = [100, 250, 500, 1000, 2500, 5000, 10000]
+SIZE_BUCKETS_KB = [10, 25, 50, 100, 250, 500, 1000, 2500]
+BAR_WIDTH = 40
+CSV_FIELDS = ["video_id", "language", "language_code", "is_generated", "is_translatable", "chosen",
+              "ok", "error", "list_seconds", "fetch_seconds", "segments", "seconds_covered",
+              "raw_bytes", "text_bytes", "cache_bytes"]
 
 def diagnose_video(video_id):
     print(f"🔍 Diagnosing video ID: {video_id}")
@@ -53,13 +87,206 @@ def diagnose_video(video_id):
     except Exception as e:
         print(f"❌ Error: {e}")
 
+def probe_track(video_id, transcript, chosen, list_seconds):
+    """Fetch one track and measure it; failures are recorded, not raised"""
+    track = {
+        "video_id": video_id, "language": transcript.language, "language_code": transcript.language_code,
+        "is_generated": transcript.is_generated, "is_translatable": transcript.is_translatable,
+        "chosen": chosen, "ok": False, "error": "", "list_seconds": list_seconds, "fetch_seconds": None,
+        "segments": 0, "seconds_covered": 0.0, "raw_bytes": 0, "text_bytes": 0, "cache_bytes": 0,
+    }
+    start = time.perf_counter()
+    try:
+        data = fetcher.fetch_track(transcript).to_raw_data()
+    except Exception as e:
+        track["fetch_seconds"] = time.perf_counter() - start
+        track["error"] = f"{type(e).__name__}: {e}"[:200]
+        return track
+    track["fetch_seconds"] = time.perf_counter() - start
+    segments = TranscriptSegments.from_raw_data(data)
+    track.update(
+        ok=True,
+        segments=len(segments),
+        seconds_covered=float(segments.starts[-1] + segments.durations[-1]) if len(segments) else 0.0,
+        raw_bytes=len(json.dumps(data).encode()),
+        text_bytes=len(segments.text.encode()),
+        cache_bytes=len(json.dumps(segments.to_dict()).encode()),
+    )
+    return track
+
+
+def chosen_track(transcript_list):
+    """The track utility.get_segments would fetch, as (language_code, is_generated)"""
+    try:
+        transcript = transcript_list.find_transcript(utility.LANGUAGES)
+    except NoTranscriptFound:
+        return None
+    return transcript.language_code, transcript.is_generated
+
+
+def probe_videos(video_ids, workers, progress=None):
+    """List and fetch every track of every video, at most workers requests at a time
+
+    Returns (videos, tracks): one record per video and one per track.
+    """
+    videos, tracks = [], []
+
+    def list_tracks(video_id):
+        start = time.perf_counter()
+        try:
+            transcript_list = fetcher.list_transcripts(video_id)
+            return video_id, transcript_list, time.perf_counter() - start, None
+        except Exception as e:
+            return video_id, None, time.perf_counter() - start, f"{type(e).__name__}: {e}"[:200]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # track fetches are submitted as lists come in, to the same bounded pool
+        pending = {executor.submit(list_tracks, video_id) for video_id in video_ids}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if isinstance(result, dict):
+                    tracks.append(result)
+                    continue
+                video_id, transcript_list, list_seconds, error = result
+                listed = list(transcript_list) if transcript_list is not None else []
+                chosen = chosen_track(transcript_list) if listed else None
+                videos.append({
+                    "video_id": video_id, "list_seconds": list_seconds, "error": error or "",
+                    "tracks": len(listed), "chosen": f"{chosen[0]}{' (generated)' if chosen[1] else ''}" if chosen else "",
+                })
+                for transcript in listed:
+                    is_chosen = chosen == (transcript.language_code, transcript.is_generated)
+                    pending.add(executor.submit(probe_track, video_id, transcript, is_chosen, list_seconds))
+                if progress:
+                    progress(len(videos), len(video_ids), videos[-1])
+    return videos, tracks
+
+
+def histogram(values, buckets):
+    """Counts per bucket (value <= bound), the last bucket open ended"""
+    counts = [0] * (len(buckets) + 1)
+    for value in values:
+        counts[next((i for i, bound in enumerate(buckets) if value <= bound), len(buckets))] += 1
+    labels = [f"<= {bound}" for bound in buckets] + [f"> {buckets[-1]}"]
+    return [{"bucket": label, "count": count} for label, count in zip(labels, counts)]
+
+
+def print_histogram(title, rows):
+    print(f"\n📊 {title}")
+    most = max((row["count"] for row in rows), default=0) or 1
+    for row in rows:
+        print(f"   {row['bucket']:>10} | {'█' * round(BAR_WIDTH * row['count'] / most):<{BAR_WIDTH}} {row['count']}")
+
+
+def summarize(videos, tracks):
+    fetched = [t for t in tracks if t["ok"]]
+    chosen = [t for t in fetched if t["chosen"]]
+    languages = {}
+    for track in tracks:
+        key = f"{track['language_code']}{' (generated)' if track['is_generated'] else ''}"
+        languages[key] = languages.get(key, 0) + 1
+    list_latency = [v["list_seconds"] for v in videos]
+    fetch_latency = [t["fetch_seconds"] for t in fetched]
+    return {
+        "videos": len(videos),
+        "videos_failed": sum(1 for v in videos if v["error"]),
+        "videos_without_preferred_language": sum(1 for v in videos if not v["error"] and not v["chosen"]),
+        "tracks": len(tracks),
+        "tracks_failed": len(tracks) - len(fetched),
+        "languages": dict(sorted(languages.items(), key=lambda item: -item[1])),
+        "list_latency": {f"p{p}": percentile(list_latency, p) for p in (50, 90, 99)},
+        "fetch_latency": {f"p{p}": percentile(fetch_latency, p) for p in (50, 90, 99)},
+        "chosen_cache_bytes": sum(t["cache_bytes"] for t in chosen),
+        "chosen_cache_bytes_p50": percentile([t["cache_bytes"] for t in chosen], 50),
+        "chosen_cache_bytes_p99": percentile([t["cache_bytes"] for t in chosen], 99),
+        "histograms": {
+            "list_seconds": histogram(list_latency, LATENCY_BUCKETS),
+            "fetch_seconds": histogram(fetch_latency, LATENCY_BUCKETS),
+            "segments": histogram([t["segments"] for t in fetched], SEGMENT_BUCKETS),
+            "cache_kb": histogram([t["cache_bytes"] / 1024 for t in fetched], SIZE_BUCKETS_KB),
+        },
+    }
+
+
+def run_bulk(args):
+    # playlist also summarizes, importing it pulls in bedrock and LangChain
+    import playlist
+
+    video_ids = playlist.read_video_ids(args.bulk)
+    if args.rate:
+        fetcher.bucket = TokenBucket(args.rate, max(BURST, args.workers))
+    print(f"🔍 Probing {len(video_ids)} video(s) with {args.workers} workers")
+
+    def progress(done, total, video):
+        status = f"❌ {video['error']}" if video["error"] else f"✅ {video['tracks']} track(s), app picks {video['chosen'] or 'none'}"
+        print(f"  [{done}/{total}] {video['video_id']} ({video['list_seconds']:.2f}s) {status}")
+
+    start = time.perf_counter()
+    videos, tracks = probe_videos(video_ids, args.workers, progress)
+    elapsed = time.perf_counter() - start
+    summary = summarize(videos, tracks)
+
+    print(f"\n{'='*60}")
+    print(f"📊 BULK DIAGNOSIS ({elapsed:.1f}s)")
+    print(f"{'='*60}")
+    print(f"🎬 Videos: {summary['videos']} ({summary['videos_failed']} failed, "
+          f"{summary['videos_without_preferred_language']} without a {'/'.join(utility.LANGUAGES)} track)")
+    print(f"📋 Tracks: {summary['tracks']} ({summary['tracks_failed']} failed to fetch)")
+    print("🌍 Tracks per language: " + ", ".join(f"{k}: {v}" for k, v in summary["languages"].items()))
+    print(f"⏱️  List latency:  p50 {summary['list_latency']['p50']:.2f}s  p90 {summary['list_latency']['p90']:.2f}s  p99 {summary['list_latency']['p99']:.2f}s")
+    print(f"⏱️  Fetch latency: p50 {summary['fetch_latency']['p50']:.2f}s  p90 {summary['fetch_latency']['p90']:.2f}s  p99 {summary['fetch_latency']['p99']:.2f}s")
+    print(f"💾 Cache entries of the picked tracks: {summary['chosen_cache_bytes'] / 1024:.0f} KB in total, "
+          f"p50 {summary['chosen_cache_bytes_p50'] / 1024:.0f} KB, p99 {summary['chosen_cache_bytes_p99'] / 1024:.0f} KB")
+    print_histogram("List latency (s)", summary["histograms"]["list_seconds"])
+    print_histogram("Fetch latency (s)", summary["histograms"]["fetch_seconds"])
+    print_histogram("Segments per track", summary["histograms"]["segments"])
+    print_histogram("Cache entry size per track (KB)", summary["histograms"]["cache_kb"])
+    for line in fetcher.format_stats():
+        print(f"🌐 {line}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"summary": summary, "videos": videos, "tracks": tracks}, f, indent=2)
+        print(f"\n📄 JSON report written to {args.json}")
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            writer.writerows(tracks)
+        print(f"📄 CSV report written to {args.csv}")
+
+
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python3 diagnose_transcript.py <video_id>")
-        print("Example: python3 diagnose_transcript.py DgpYiysQjeI")
+    parser = argparse.ArgumentParser(
+        description="Diagnose YouTube transcript downloads of one or many videos",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument("video", nargs="?", help="video id or URL")
+    parser.add_argument("--bulk", metavar="FILE", help="file with video/playlist URLs, one per line")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent requests (bulk)")
+    parser.add_argument("--rate", type=float, help="requests per second, instead of YOUTUBE_REQUESTS_PER_SECOND (bulk)")
+    parser.add_argument("--json", help="write the bulk report as JSON")
+    parser.add_argument("--csv", help="write one row per track as CSV")
+    parser.add_argument("--record", metavar="FIXTURE", help="record YouTube traffic to a fixture file")
+    parser.add_argument("--replay", metavar="FIXTURE", help="replay YouTube traffic from a fixture file")
+    args = parser.parse_args()
+
+    if args.record:
+        recorder.install(args.record, "record")
+    elif args.replay:
+        recorder.install(args.replay, "replay")
+
+    if args.bulk:
+        run_bulk(args)
         return
-    
-    video_id = sys.argv[1]
+    if not args.video:
+        parser.print_help()
+        return
+
+    video_id = args.video
     
     # Handle full URLs
     if 'youtube.com' in video_id or 'youtu.be' in video_id:
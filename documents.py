@@ -0,0 +1,487 @@
+#!/usr/bin/env python3
+"""
+Text extraction from PDF, DOCX and HTML documents
+
+Parsing a document is CPU-bound Python that would hold the GIL and stall
+the script thread of every Streamlit session, so it runs in a process pool
+shared by the whole process. A PDF is split into batches of pages parsed in
+parallel; DOCX and HTML are parsed in one task each (with a streaming
+parser) and split into pages at page breaks, or every PAGE_CHARS
+characters. Pages come back in document order as soon as they are ready.
+
+Every document gets DOCUMENT_TIMEOUT seconds in total, enforced inside the
+workers as well, and every worker process may grow by DOCUMENT_MEMORY_MB of
+address space, so one huge or malicious file fails alone instead of taking
+the pool or the app down. PDF support needs pypdf.
+
+Workers are forked: spawned ones would run the main module again, which
+under Streamlit is app.py itself.
+
+Usage:
+    python3 documents.py extract <file> [<file> ...]
+    python3 documents.py bench [--pages 200] [--documents 8] [--workers 1,2,4]
+
+Examples:
+    python3 documents.py extract report.pdf --show
+    python3 documents.py bench --kinds pdf,html --workers 1,4,8 --report docs.json
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import signal
+import zipfile
+import zlib
+import logging
+import argparse
+import tempfile
+import threading
+import multiprocessing
+from html.parser import HTMLParser
+from xml.etree import ElementTree
+from concurrent import futures
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger()
+
+# worker processes of the shared pool
+WORKERS = int(os.environ.get("DOCUMENT_WORKERS", str(os.cpu_count() or 1)))
+# total seconds one document may take, queueing in the pool included
+DOCUMENT_TIMEOUT = float(os.environ.get("DOCUMENT_TIMEOUT", "60"))
+# address space a worker process may add to what it inherited; 0 for no limit
+DOCUMENT_MEMORY_MB = int(os.environ.get("DOCUMENT_MEMORY_MB", "1024"))
+# PDF pages parsed per task: fewer means more parallelism, more means fewer
+# times the file's cross-reference table is parsed again
+PAGES_PER_TASK = 4
+# DOCX and HTML have no pages; their text is split at about this size
+PAGE_CHARS = 3000
+
+KINDS = ("pdf", "docx", "html")
+CONTENT_TYPES = {
+    "application/pdf": "pdf",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": "docx",
+    "text/html": "html",
+    "application/xhtml+xml": "html",
+}
+EXTENSIONS = {".pdf": "pdf", ".docx": "docx", ".html": "html", ".htm": "html"}
+
+WORD = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+class DocumentError(Exception):
+    """The document could not be read"""
+
+
+class DocumentLimitExceeded(DocumentError):
+    """The document needed more time or memory than it may use"""
+
+
+def document_kind(name, content_type=None):
+    """"pdf", "docx" or "html" from a content type (e.g. S3's) or file name;
+    None if the document is not supported"""
+    if content_type:
+        kind = CONTENT_TYPES.get(content_type.split(";")[0].strip().lower())
+        if kind:
+            return kind
+    return EXTENSIONS.get(os.path.splitext(name or "")[1].lower())
+
+
+# --- worker side ---
+
+def _init_worker(memory_mb):
+    if memory_mb:
+        import resource
+        limit = _address_space() + memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _address_space():
+    """Virtual memory size of this process in bytes"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmSize:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def _on_alarm(signum, frame):
+    raise DocumentLimitExceeded("took longer than its time limit")
+
+
+def _with_deadline(deadline, fn, *args):
+    """fn(*args) in a worker, interrupted when the document's deadline passes"""
+    remaining = deadline - time.time()
+    if remaining <= 0:
+        raise DocumentLimitExceeded("took longer than its time limit")
+    previous = signal.signal(signal.SIGALRM, _on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, remaining)
+    try:
+        return fn(*args)
+    except MemoryError:
+        raise DocumentLimitExceeded("needed more memory than its limit") from None
+    except DocumentError:
+        raise
+    except (ElementTree.ParseError, zipfile.BadZipFile, zlib.error) as e:
+        raise DocumentError(f"not a readable document ({e})") from None
+    except Exception as e:
+        # pypdf's own errors, from malformed pages found while extracting
+        if type(e).__module__.split(".")[0] == "pypdf":
+            raise DocumentError(f"not a readable PDF ({e})") from None
+        raise
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _pdf_reader(path):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise DocumentError("PDF support needs pypdf: pip install pypdf") from None
+    try:
+        return PdfReader(path)
+    except Exception as e:
+        raise DocumentError(f"not a readable PDF ({e})") from None
+
+
+def _count_pdf_pages(path, deadline):
+    return _with_deadline(deadline, lambda: len(_pdf_reader(path).pages))
+
+
+def _extract_pdf_pages(path, first, last, deadline):
+    def extract():
+        reader = _pdf_reader(path)
+        return [(number + 1, reader.pages[number].extract_text() or "") for number in range(first, last)]
+    return _with_deadline(deadline, extract)
+
+
+def _extract_paged(path, kind, deadline):
+    parse = _docx_paragraphs if kind == "docx" else _html_paragraphs
+    return _with_deadline(deadline, lambda: list(enumerate(_pages(parse(path)), start=1)))
+
+
+def _pages(paragraphs):
+    """Pages from paragraphs, where None stands for a page break"""
+    page, size = [], 0
+    for paragraph in paragraphs:
+        if paragraph is None or size >= PAGE_CHARS:
+            if page:
+                yield "\n".join(page)
+            page, size = [], 0
+        if paragraph:
+            page.append(paragraph)
+            size += len(paragraph)
+    if page:
+        yield "\n".join(page)
+
+
+def _docx_paragraphs(path):
+    """Paragraph texts of word/document.xml, read with iterparse so only one
+    paragraph is in memory at a time; None at page breaks"""
+    try:
+        archive = zipfile.ZipFile(path)
+        document = archive.open("word/document.xml")
+    except (zipfile.BadZipFile, KeyError) as e:
+        raise DocumentError(f"not a readable DOCX ({e})") from None
+    with archive, document:
+        text = []
+        for event, element in ElementTree.iterparse(document, events=("end",)):
+            if element.tag == WORD + "t":
+                text.append(element.text or "")
+            elif element.tag == WORD + "tab":
+                text.append("\t")
+            elif element.tag == WORD + "lastRenderedPageBreak" or \
+                    (element.tag == WORD + "br" and element.get(WORD + "type") == "page"):
+                yield None
+            elif element.tag == WORD + "p":
+                yield "".join(text).strip()
+                text = []
+                element.clear()
+
+
+class _HTMLText(HTMLParser):
+    """Text of an HTML document by block, without scripts and styles"""
+
+    BLOCKS = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6",
+              "section", "article", "table", "pre", "blockquote", "title"}
+    SKIPPED = {"script", "style", "noscript", "template", "svg"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.paragraphs = []
+        self._text = []
+        self._skipping = 0
+
+    def _flush(self):
+        paragraph = " ".join("".join(self._text).split())
+        if paragraph:
+            self.paragraphs.append(paragraph)
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIPPED:
+            self._skipping += 1
+        elif tag in self.BLOCKS:
+            self._flush()
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIPPED:
+            self._skipping = max(0, self._skipping - 1)
+        elif tag in self.BLOCKS:
+            self._flush()
+
+    def handle_data(self, data):
+        if not self._skipping:
+            self._text.append(data)
+
+
+def _html_paragraphs(path):
+    """Paragraph texts of an HTML file, fed to the parser in chunks"""
+    parser = _HTMLText()
+    with open(path, encoding="utf-8", errors="replace") as f:
+        while True:
+            chunk = f.read(64 * 1024)
+            if not chunk:
+                break
+            parser.feed(chunk)
+            yield from parser.paragraphs
+            parser.paragraphs = []
+    parser.close()
+    parser._flush()
+    yield from parser.paragraphs
+
+
+# --- pool side ---
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def shared_pool():
+    """The process pool of this process, started on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = _process_pool(WORKERS)
+        return _pool
+
+
+def _process_pool(workers):
+    return futures.ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("fork"),
+        initializer=_init_worker, initargs=(DOCUMENT_MEMORY_MB,),
+    )
+
+
+def _reset_pool(broken):
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def extract_pages(path, kind, timeout=DOCUMENT_TIMEOUT, pool=None):
+    """Yield (page number, text) of a document file in order, as the pool
+    extracts them
+
+    Raises DocumentError if the document can not be read and
+    DocumentLimitExceeded if it takes longer than timeout or its worker runs
+    out of memory.
+    """
+    if kind not in KINDS:
+        raise DocumentError(f"unsupported document type {kind}")
+    pool = pool or shared_pool()
+    deadline = time.time() + timeout
+    tasks = []
+    try:
+        if kind == "pdf":
+            pages = _result(pool.submit(_count_pdf_pages, path, deadline), deadline)
+            tasks = [pool.submit(_extract_pdf_pages, path, first, min(first + PAGES_PER_TASK, pages), deadline)
+                     for first in range(0, pages, PAGES_PER_TASK)]
+        else:
+            tasks = [pool.submit(_extract_paged, path, kind, deadline)]
+        for task in tasks:
+            yield from _result(task, deadline)
+    except BrokenProcessPool:
+        # a worker died (e.g. killed for memory); the next document gets a new pool
+        _reset_pool(pool)
+        raise DocumentLimitExceeded("crashed the parser, most likely running out of memory") from None
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def _result(task, deadline):
+    try:
+        # the workers stop themselves at the deadline, this is for queueing
+        return task.result(timeout=max(0.0, deadline - time.time()) + 1.0)
+    except futures.TimeoutError:
+        raise DocumentLimitExceeded("took longer than its time limit") from None
+
+
+def extract_text(data, kind, progress=None, timeout=DOCUMENT_TIMEOUT, pool=None):
+    """Pages of a document given as bytes; progress(pages) is called as
+    pages arrive"""
+    with tempfile.NamedTemporaryFile(suffix=f".{kind}") as f:
+        f.write(data)
+        f.flush()
+        pages = []
+        for _, text in extract_pages(f.name, kind, timeout, pool):
+            pages.append(text)
+            if progress:
+                progress(len(pages))
+        return pages
+
+
+# --- benchmark ---
+
+def synthetic_pdf(pages, lines=40):
+    """A PDF of pages pages of text lines, written without a PDF library"""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in range(pages):
+        text = "".join(f"({_sentence(page, line)}) Tj T* " for line in range(lines))
+        stream = f"BT /F1 10 Tf 12 TL 40 800 Td {text}ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>"
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode())
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return out.getvalue()
+
+
+def synthetic_docx(pages, lines=40):
+    """A DOCX with a page break after every lines paragraphs"""
+    body = []
+    for page in range(pages):
+        for line in range(lines):
+            body.append(f"<w:p><w:r><w:t>{_sentence(page, line)}</w:t></w:r></w:p>")
+        body.append('<w:p><w:r><w:br w:type="page"/></w:r></w:p>')
+    document = (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                f'<w:document xmlns:w="{WORD[1:-1]}"><w:body>{"".join(body)}</w:body></w:document>')
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("word/document.xml", document)
+    return out.getvalue()
+
+
+def synthetic_html(pages, lines=40):
+    """An HTML page with about pages pages of paragraphs, plus a script"""
+    body = "".join(f"<p>{_sentence(page, line)}</p>\n" for page in range(pages) for line in range(lines))
+    return f"<html><head><script>var x = 1;</script></head><body>{body}</body></html>".encode()
+
+
+def _sentence(page, line):
+    return f"Page {page + 1} line {line + 1}: the quick brown fox jumps over the lazy dog again"
+
+
+SYNTHETIC = {"pdf": synthetic_pdf, "docx": synthetic_docx, "html": synthetic_html}
+
+
+def bench_step(kind, data, documents, workers):
+    """Extract documents copies of one document at once with a fresh pool"""
+    pool = _process_pool(workers)
+    try:
+        # start the workers before timing
+        list(pool.map(abs, range(workers)))
+        with tempfile.NamedTemporaryFile(suffix=f".{kind}") as f:
+            f.write(data)
+            f.flush()
+            latencies = []
+
+            def extract_one():
+                start = time.perf_counter()
+                count = sum(1 for _ in extract_pages(f.name, kind, pool=pool))
+                latencies.append(time.perf_counter() - start)
+                return count
+
+            start = time.perf_counter()
+            with futures.ThreadPoolExecutor(max_workers=documents) as threads:
+                extracted = sum(threads.map(lambda _: extract_one(), range(documents)))
+            wall = time.perf_counter() - start
+    finally:
+        pool.shutdown()
+    return {"kind": kind, "workers": workers, "documents": documents, "pages": extracted,
+            "seconds": wall, "pages_per_second": extracted / wall,
+            "document_seconds_max": max(latencies)}
+
+
+def run_bench(args):
+    print(f"🖥️  {os.cpu_count()} CPU(s); {args.documents} documents of {args.pages} pages at once")
+    print(f"{'kind':>5} {'workers':>8} {'pages':>7} {'seconds':>8} {'pages/s':>8} {'slowest doc':>12}")
+    results = []
+    for kind in args.kinds.split(","):
+        data = SYNTHETIC[kind](args.pages)
+        for workers in [int(n) for n in args.workers.split(",")]:
+            try:
+                result = bench_step(kind, data, args.documents, workers)
+            except DocumentError as e:
+                print(f"{kind:>5} ❌ {e}")
+                break
+            results.append(result)
+            print(f"{kind:>5} {workers:>8} {result['pages']:>7} {result['seconds']:>8.2f} "
+                  f"{result['pages_per_second']:>8.1f} {result['document_seconds_max']:>11.2f}s")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n📄 Report written to {args.report}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Extract text from documents in a process pool, or benchmark it",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument("command", choices=["extract", "bench"])
+    parser.add_argument("files", nargs="*", help="documents to extract")
+    parser.add_argument("--show", action="store_true", help="print the text of every page")
+    parser.add_argument("--pages", type=int, default=200, help="pages per benchmark document")
+    parser.add_argument("--documents", type=int, default=8, help="documents extracted at once")
+    parser.add_argument("--workers", default="1,2,4", help="pool sizes to compare, comma separated")
+    parser.add_argument("--kinds", default=",".join(KINDS), help="document types to benchmark")
+    parser.add_argument("--report", help="write the benchmark results as JSON")
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        run_bench(args)
+        return
+    if not args.files:
+        parser.print_help()
+        sys.exit(1)
+    for path in args.files:
+        kind = document_kind(path)
+        if kind is None:
+            print(f"❌ {path}: not a PDF, DOCX or HTML file")
+            continue
+        start = time.perf_counter()
+        try:
+            pages = list(extract_pages(path, kind))
+        except DocumentError as e:
+            print(f"❌ {path}: {e}")
+            continue
+        characters = sum(len(text) for _, text in pages)
+        print(f"📄 {path}: {len(pages)} pages, {characters} characters in {time.perf_counter() - start:.2f}s")
+        if args.show:
+            for number, text in pages:
+                print(f"\n--- page {number} ---\n{text}")
+
+
+if __name__ == "__main__":
+    main()
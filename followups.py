@@ -0,0 +1,213 @@
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+
+import bedrock
+import scheduler
+import segments
+import throttle
+
+logger = logging.getLogger()
+
+# suggested follow-up questions shown under a summary
+SUGGESTION_COUNT = int(os.environ.get("FOLLOWUP_SUGGESTIONS", "3"))
+# tokens (input + output) that may be spent per video on answers nobody asked
+# for yet; 0 disables precomputation, suggestions are still shown
+TOKEN_BUDGET = int(os.environ.get("FOLLOWUP_TOKEN_BUDGET", "60000"))
+# expected output tokens of one answer, used to check the budget up front
+ANSWER_TOKEN_ESTIMATE = 600
+# precomputation is background work: keep it from crowding out user requests
+MAX_WORKERS = 2
+# seconds a clicked suggestion waits for its precomputation still running,
+# before asking the model like any other question
+TAKE_WAIT = float(os.environ.get("FOLLOWUP_TAKE_WAIT", "2"))
+
+SUGGESTIONS_SYSTEM_PROMPT = f"You are given the summary of a video. Write the {SUGGESTION_COUNT} follow-up questions a viewer is most likely to ask next, one per line, without numbering or any other text."
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="followups")
+
+
+def estimate_tokens(text):
+    # ~4 characters per token for English text
+    return len(text) // 4 + 1
+
+
+def usage_tokens(message):
+    usage = getattr(message, "usage_metadata", None) or {}
+    return usage.get("total_tokens") or usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+
+
+class PrecomputeStats:
+    """Process-wide counters for tuning TOKEN_BUDGET
+
+    hit rate is clicked suggestions answered from a precomputed answer;
+    wasted tokens were spent on answers that were never shown.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.suggested = 0
+        self.precomputed = 0
+        self.skipped_budget = 0
+        self.hits = 0
+        self.misses = 0
+        self.tokens_spent = 0
+        self.tokens_wasted = 0
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def snapshot(self):
+        with self._lock:
+            clicks = self.hits + self.misses
+            return {
+                "suggested": self.suggested,
+                "precomputed": self.precomputed,
+                "skipped_budget": self.skipped_budget,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / clicks if clicks else 0.0,
+                "tokens_spent": self.tokens_spent,
+                "tokens_wasted": self.tokens_wasted,
+                "waste_ratio": self.tokens_wasted / self.tokens_spent if self.tokens_spent else 0.0,
+            }
+
+
+stats = PrecomputeStats()
+
+
+def suggest_questions(summary, model=None, count=SUGGESTION_COUNT, user="followups"):
+    """Likely follow-up questions for a summary; [] if Bedrock fails"""
+    try:
+        text = bedrock.summarize(
+            segments.strip_time_markers(summary), model=model, system_prompt=SUGGESTIONS_SYSTEM_PROMPT,
+            user=user, kind="background",
+        )
+    except Exception as e:
+        logger.warning(f"Could not suggest follow-up questions: {e}")
+        return []
+    questions = [line.strip(" -*\t").strip() for line in text.splitlines()]
+    return [q for q in questions if q.endswith("?")][:count]
+
+
+def prepare(prompt, summary, model=None, user="followups"):
+    """Suggest questions and start precomputing in the background
+
+    Returns a Future of the FollowupPrecomputer, so showing the summary does
+    not wait for the suggestions. The Bedrock calls are queued as background
+    work of user, i.e. count against that user's scheduler quota.
+    """
+    def run():
+        precomputer = FollowupPrecomputer(prompt, summary, suggest_questions(summary, model, user=user), model,
+                                          user=user)
+        precomputer.start()
+        return precomputer
+    return _executor.submit(run)
+
+
+class FollowupPrecomputer:
+    """Suggested questions for one summary, with answers computed ahead of time
+
+    Answers are produced from exactly the messages the chain would send for
+    the first follow-up (system prompt, transcript prompt, summary,
+    question), so a precomputed answer is only valid while that is still the
+    whole chat history. Once anything else is asked, take() stops handing
+    them out and the unused ones count as wasted.
+    """
+
+    def __init__(self, prompt, summary, questions, model=None, token_budget=TOKEN_BUDGET, user="followups"):
+        self.prompt = prompt
+        self.summary = summary
+        self.questions = questions
+        self.model = model
+        self.user = user
+        self.budget = token_budget
+        self.spent = 0
+        self._answers = {}
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        stats.add(suggested=len(questions))
+
+    def messages(self, question):
+        return [
+            SystemMessage(content=bedrock.SYSTEM_PROMPT),
+            HumanMessage(content=self.prompt),
+            AIMessage(content=self.summary),
+            HumanMessage(content=question),
+        ]
+
+    def start(self):
+        """Queue precomputation of the suggestions the token budget allows"""
+        cost = estimate_tokens(self.prompt) + estimate_tokens(self.summary) + ANSWER_TOKEN_ESTIMATE
+        reserved = 0
+        for question in self.questions:
+            if reserved + cost > self.budget:
+                stats.add(skipped_budget=1)
+                continue
+            reserved += cost
+            self._futures[question] = _executor.submit(self._precompute, question)
+
+    def _precompute(self, question):
+        if self._closed:
+            return None
+        if self.model is None:
+            self.model = bedrock.bedrock_model()
+        try:
+            with throttle.request_budget():
+                # queued behind everything users are waiting for
+                with scheduler.scheduler.slot(self.user, "background", scheduler.estimate_cost(question)):
+                    result = self.model.invoke(self.messages(question))
+        except Exception as e:
+            logger.warning(f"Precomputing follow-up failed: {e}")
+            return None
+        tokens = usage_tokens(result) or estimate_tokens(self.prompt) + estimate_tokens(result.content)
+        with self._lock:
+            self.spent += tokens
+            self._answers[question] = (result.content, tokens)
+            wasted = tokens if self._closed else 0
+        stats.add(precomputed=1, tokens_spent=tokens, tokens_wasted=wasted)
+        return result.content
+
+    def take(self, question, wait=TAKE_WAIT):
+        """Precomputed answer for a suggestion, or None to ask the model
+
+        Waits up to wait seconds (None: until done) for a precomputation
+        already queued or running. It is background work that may still be
+        waiting behind user requests, so the wait is kept short: past it the
+        caller is better off asking the model itself.
+        """
+        future = self._futures.get(question)
+        answer = None
+        if future is not None and not self._closed:
+            try:
+                answer = future.result(timeout=wait)
+            except Exception:
+                answer = None
+        if answer is None:
+            stats.add(misses=1)
+        else:
+            with self._lock:
+                tokens = self._answers.pop(question)[1]
+            stats.add(hits=1)
+            logger.info(f"Follow-up answered from precompute ({tokens} tokens)")
+        self.close()
+        return answer
+
+    def close(self):
+        """Stop precomputing; answers not taken so far are wasted"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            wasted = sum(tokens for _, tokens in self._answers.values())
+            self._answers.clear()
+        for future in self._futures.values():
+            future.cancel()
+        stats.add(tokens_wasted=wasted)
+        logger.info(f"Follow-up precompute stats: {stats.snapshot()}")
@@ -0,0 +1,256 @@
+"""
+Idempotent handling of user submissions
+
+Streamlit runs the input callback again for the same text on a double Enter,
+a browser reconnect or a rerun that interrupted the first run, which used to
+mean a second full-transcript Bedrock call and a second copy of the exchange
+in the history. A submission is identified by an idempotency key: the
+session, the position in the conversation and the text. While a key is in
+flight, repeated submissions wait for the running request and get its
+result; for RECENT_SECONDS after it finished, they are recognized and
+dropped.
+
+The request itself runs in a worker thread with the session's script
+context, so a rerun interrupting the callback (at its next st.* call) can
+not abort it half way, e.g. after Bedrock answered but before the answer
+was recorded.
+
+A running request can be cancelled (the user pasted the wrong URL): code
+doing slow work checks cancelled() between steps, and open Bedrock response
+streams registered with on_cancel() are closed at once, which stops the
+generation and releases the concurrency slot.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+import contextvars
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+
+import state
+
+logger = logging.getLogger()
+
+# finished requests are remembered this long to recognize late duplicates
+RECENT_SECONDS = float(os.environ.get("INFLIGHT_RECENT_SECONDS", "30"))
+# finished requests (and their results) remembered per process, without Redis
+MAX_RECENT = 200
+
+
+class Cancelled(Exception):
+    """The user cancelled the request; tokens_saved estimates the Bedrock
+    tokens it did not spend"""
+
+    def __init__(self, tokens_saved=0):
+        self.tokens_saved = tokens_saved
+        super().__init__("The request was cancelled.")
+
+
+class _Cancellation:
+    def __init__(self):
+        self.event = threading.Event()
+        self.callbacks = []
+        self.lock = threading.Lock()
+
+
+# cancellation of the request the current thread works for, if any
+_cancellation = contextvars.ContextVar("cancellation", default=None)
+
+
+def cancelled():
+    """True once the request the current thread works for was cancelled"""
+    cancellation = _cancellation.get()
+    return cancellation is not None and cancellation.event.is_set()
+
+
+def check():
+    """Raise Cancelled if the current request was cancelled"""
+    if cancelled():
+        raise Cancelled()
+
+
+def sleep(seconds):
+    """time.sleep() that raises Cancelled as soon as the current request is
+    cancelled"""
+    cancellation = _cancellation.get()
+    if cancellation is None:
+        time.sleep(seconds)
+    elif cancellation.event.wait(seconds):
+        raise Cancelled()
+
+
+def on_cancel(callback):
+    """Run callback() when the current request is cancelled, e.g. to close
+    a response stream; at once if it already is"""
+    cancellation = _cancellation.get()
+    if cancellation is None:
+        return
+    with cancellation.lock:
+        if not cancellation.event.is_set():
+            cancellation.callbacks.append(callback)
+            return
+    _run_callback(callback)
+
+
+def _run_callback(callback):
+    try:
+        callback()
+    except Exception as e:
+        logger.warning(f"Cancelling a request failed: {e}")
+
+
+def request_key(session_id, position, text):
+    """Idempotency key of submitting text at a position of a conversation"""
+    return hashlib.sha256(json.dumps([session_id, position, text.strip()]).encode()).hexdigest()[:32]
+
+
+def _script_context():
+    """Streamlit script run context of the calling thread, None outside the app"""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return None
+    return get_script_run_ctx(suppress_warning=True)
+
+
+class InFlightRequests:
+    """Requests by idempotency key: running ones and recently finished ones"""
+
+    def __init__(self, recent_seconds=RECENT_SECONDS, max_recent=MAX_RECENT):
+        self.recent_seconds = recent_seconds
+        self.max_recent = max_recent
+        self._running = {}
+        self._cancellations = {}
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = Counter()
+
+    def submit(self, key, fn):
+        """Start fn() unless a request with this key is in flight already
+
+        Returns a Future of (result, duplicate): a repeated key gets the
+        first request's result. fn runs in a worker thread with the caller's
+        Streamlit script context and contextvars. A cancelled request's
+        future raises Cancelled.
+        """
+        with self._lock:
+            running = self._running.get(key)
+            if running is None:
+                future = self._running[key] = Future()
+                cancellation = self._cancellations[key] = _Cancellation()
+        if running is not None:
+            self._count("attached")
+            logger.info(f"Request {key} is in flight, waiting for it instead of starting it again")
+            future = Future()
+            running.add_done_callback(lambda f: _chain_duplicate(f, future))
+            return future
+
+        worker = threading.Thread(target=self._work, args=(key, fn, future, cancellation, contextvars.copy_context(), _script_context()),
+                                  name=f"request-{key[:8]}", daemon=True)
+        worker.start()
+        return future
+
+    def _work(self, key, fn, future, cancellation, context, script_context):
+        if script_context is not None:
+            from streamlit.runtime.scriptrunner import add_script_run_ctx
+            add_script_run_ctx(threading.current_thread(), script_context)
+        try:
+            # replicas sharing state: the same submission on another replica waits here
+            with state.lock(f"request:{key}"):
+                result = self._recent_result(key)
+                duplicate = result is not None
+                if duplicate:
+                    self._count("attached")
+                else:
+                    self._count("started")
+                    result = context.run(self._run, fn, cancellation)
+                    # failed requests (None) may be submitted again
+                    if result is not None:
+                        self._remember(key, result)
+        except Cancelled as e:
+            with self._lock:
+                self.counters["cancelled"] += 1
+                self.counters["tokens_saved"] += e.tokens_saved
+            logger.info(f"Request {key} cancelled, about {e.tokens_saved} tokens saved")
+            future.set_exception(e)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result((result, duplicate))
+        finally:
+            with self._lock:
+                self._running.pop(key, None)
+                self._cancellations.pop(key, None)
+
+    def _run(self, fn, cancellation):
+        _cancellation.set(cancellation)
+        result = fn()
+        # cancelled after the last check: the answer is not wanted anymore
+        check()
+        return result
+
+    def cancel(self, key):
+        """Cancel the request with this key; False if none is running"""
+        with self._lock:
+            cancellation = self._cancellations.get(key)
+        if cancellation is None:
+            return False
+        with cancellation.lock:
+            cancellation.event.set()
+            callbacks, cancellation.callbacks = cancellation.callbacks, []
+        logger.info(f"Cancelling request {key}")
+        for callback in callbacks:
+            _run_callback(callback)
+        return True
+
+    def _remember(self, key, result):
+        if state.enabled():
+            state.redis_client().set(state.key("request", key), json.dumps(result), ex=max(1, int(self.recent_seconds)))
+            return
+        with self._lock:
+            self._recent[key] = (time.monotonic(), result)
+            self._recent.move_to_end(key)
+            while len(self._recent) > self.max_recent:
+                self._recent.popitem(last=False)
+
+    def _recent_result(self, key):
+        if state.enabled():
+            data = state.redis_client().get(state.key("request", key))
+            return json.loads(data) if data else None
+        with self._lock:
+            finished, result = self._recent.get(key, (float("-inf"), None))
+        return result if time.monotonic() - finished < self.recent_seconds else None
+
+    def finished_recently(self, key):
+        """True if the request with this key was answered within
+        recent_seconds; counted as a suppressed duplicate"""
+        if self._recent_result(key) is None:
+            return False
+        self._count("suppressed")
+        logger.info(f"Request {key} was answered already, ignoring the repeated submission")
+        return True
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def stats(self):
+        """Running requests, and started/attached/suppressed/cancelled
+        counts and the tokens saved by cancelling"""
+        with self._lock:
+            return {"running": len(self._running), **self.counters}
+
+
+def _chain_duplicate(source, target):
+    if source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result((source.result()[0], True))
+
+
+# one registry per process, shared by all Streamlit sessions
+requests = InFlightRequests()
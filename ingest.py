@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Concurrent ingestion of a YouTube video: transcript and metadata are fetched
+at the same time, so ingest time is the slower of the two, not their sum
+
+Usage:
+    python3 ingest.py <youtube_url> [<youtube_url> ...]
+"""
+
+import re
+import sys
+import json
+import time
+import asyncio
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import cache
+import profiling
+import utility
+
+logger = logging.getLogger()
+
+TRANSCRIPT_TIMEOUT = 60
+METADATA_TIMEOUT = 8
+WATCH_URL = "https://www.youtube.com/watch?v={video_id}"
+PLAYER_RESPONSE_MARKER = "ytInitialPlayerResponse = "
+# "1:23 Intro" / "01:02:03 - Results" lines in the description are chapters
+CHAPTER_PATTERN = re.compile(r'^\s*(?:(\d{1,2}):)?(\d{1,2}):(\d{2})\s*[-–:]?\s+(.+?)\s*$', re.MULTILINE)
+
+metadata_cache = cache.open_cache("metadata")
+
+
+def parse_chapters(description):
+    """Chapters as [{"start": seconds, "title": ...}] from a video description
+
+    YouTube only treats timestamps as chapters if the list starts at 0:00,
+    so anything else is ignored.
+    """
+    chapters = []
+    for hours, minutes, seconds, title in CHAPTER_PATTERN.findall(description or ""):
+        start = int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds)
+        chapters.append({"start": start, "title": title})
+    if not chapters or chapters[0]["start"] != 0:
+        return []
+    return chapters
+
+
+def fetch_video_metadata(video_id, use_cache=True):
+    """Title, channel, duration and chapters of a video, through the cache"""
+    if use_cache:
+        cached = metadata_cache.get(video_id)
+        if cached:
+            return cached
+
+    with profiling.stage("metadata"):
+        metadata = download_video_metadata(video_id)
+    if use_cache:
+        metadata_cache.set(video_id, metadata)
+    return metadata
+
+
+def download_video_metadata(video_id):
+    """Title, channel, duration and chapters of a video, from its watch page"""
+    response = requests.get(
+        WATCH_URL.format(video_id=video_id),
+        headers={"Accept-Language": "en-US"},
+        timeout=METADATA_TIMEOUT,
+    )
+    response.raise_for_status()
+    html = response.text
+    start = html.find(PLAYER_RESPONSE_MARKER)
+    if start == -1:
+        raise ValueError("No player response in watch page")
+    player_response, _ = json.JSONDecoder().raw_decode(html, start + len(PLAYER_RESPONSE_MARKER))
+    details = player_response.get("videoDetails", {})
+
+    metadata = {
+        "title": details.get("title"),
+        "channel": details.get("author"),
+        "duration": int(details.get("lengthSeconds") or 0),
+        "chapters": parse_chapters(details.get("shortDescription")),
+    }
+    return metadata
+
+
+class IngestResult:
+    """Transcript segments and metadata of one video, plus fetch timings"""
+
+    def __init__(self, video_id, transcript, metadata, timings):
+        self.video_id = video_id
+        self.transcript = transcript
+        self.metadata = metadata
+        self.timings = timings
+
+    @property
+    def overlap(self):
+        """sum of fetch times / total time: ~2 when both fetches fully overlap"""
+        total = self.timings.get("total")
+        fetches = self.timings.get("transcript", 0) + self.timings.get("metadata", 0)
+        return fetches / total if total else 0.0
+
+    def prompt(self):
+        return utility.generate_prompt_from_transcript(self.transcript, self.metadata)
+
+
+async def _timed(name, fn, timeout, timings, executor):
+    """Run a blocking fetch in a thread; None on timeout or error
+
+    The thread gets a copy of the caller's context, so cancellation and
+    profiling follow the fetch as they would with asyncio.to_thread.
+    """
+    start = time.perf_counter()
+    try:
+        future = asyncio.get_running_loop().run_in_executor(executor, contextvars.copy_context().run, fn)
+        return await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"{name} fetch timed out after {timeout}s")
+        return None
+    except Exception as e:
+        logger.warning(f"{name} fetch failed: {e}")
+        return None
+    finally:
+        timings[name] = time.perf_counter() - start
+
+
+async def ingest_async(video_id, use_cache=True):
+    timings = {}
+    start = time.perf_counter()
+    # not the loop's default executor: asyncio.run waits for that one, so a
+    # fetch that timed out would still hold up the caller
+    executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ingest")
+    try:
+        transcript, metadata = await asyncio.gather(
+            _timed("transcript", lambda: utility.get_segments(video_id, use_cache), TRANSCRIPT_TIMEOUT,
+                   timings, executor),
+            _timed("metadata", lambda: fetch_video_metadata(video_id, use_cache), METADATA_TIMEOUT,
+                   timings, executor),
+        )
+    finally:
+        # a timed out fetch finishes in the background, its result is dropped
+        executor.shutdown(wait=False)
+    timings["total"] = time.perf_counter() - start
+    logger.info(f"Ingested {video_id} in {timings['total']:.2f}s "
+                f"(transcript {timings['transcript']:.2f}s, metadata {timings['metadata']:.2f}s)")
+    return IngestResult(video_id, transcript, metadata, timings)
+
+
+def ingest(video_id, use_cache=True):
+    """Fetch transcript and metadata concurrently; metadata may be None"""
+    return asyncio.run(ingest_async(video_id, use_cache))
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+
+    print(f"{'video':<13} {'transcript':>11} {'metadata':>9} {'total':>7} {'max':>7} {'sum':>7}")
+    for url in sys.argv[1:]:
+        video_id, content_type = utility.validate_url(url)
+        result = ingest(video_id, use_cache=False)
+        t = result.timings
+        print(f"{video_id:<13} {t['transcript']:>10.2f}s {t['metadata']:>8.2f}s {t['total']:>6.2f}s "
+              f"{max(t['transcript'], t['metadata']):>6.2f}s {t['transcript'] + t['metadata']:>6.2f}s")
+        if result.metadata:
+            print(f"   🎬 {result.metadata['title']} - {result.metadata['channel']} "
+                  f"({len(result.metadata['chapters'])} chapters)")
+        if not result.transcript:
+            print("   ❌ No supported transcript")
+
+
+if __name__ == "__main__":
+    main()
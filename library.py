@@ -0,0 +1,719 @@
+#!/usr/bin/env python3
+"""
+Search index over every summarized video, for questions across the library
+("which videos talk about X?")
+
+Every indexed video contributes its summary and its transcript, split into
+chunks on segment boundaries. Chunks are found two ways and the rankings are
+merged (reciprocal rank fusion):
+  - by meaning: Titan embeddings in an inverted file index (IVF), i.e. the
+    vectors are clustered with k-means and a query only scans the clusters
+    closest to it
+  - by words: an inverted index from terms to the chunks containing them,
+    weighted by how rare a term is
+
+The index lives in LIBRARY_DIR as append-only files (chunk records, float16
+vectors, cluster assignments) plus the cluster centroids, so adding a video
+never rewrites what is there. Clusters are re-trained as the library grows.
+Processes sharing the directory (replicas on one host, the build command)
+pick up each other's chunks by reading the appended ends of the files.
+
+Usage:
+    python3 library.py build
+    python3 library.py search "how do transformers work?"
+    python3 library.py bench [--chunks 1000000] [--queries 200]
+
+Examples:
+    python3 library.py search "vector databases" --results 5
+    python3 library.py bench --chunks 200000 --nprobe 8
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import fcntl
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import bedrock
+import cache
+import corpus
+import ingest
+import segments
+
+logger = logging.getLogger()
+
+LIBRARY_DIR = os.environ.get("BEDROCK_CHAT_LIBRARY_DIR", os.path.join(cache.CACHE_DIR, "library"))
+# index every video the app, playlists and the cache warmer summarize; 0 turns it off
+INDEXING = os.environ.get("LIBRARY_INDEXING", "1") != "0"
+CHUNK_CHARS = 1500
+# excerpts given to the model for a library question
+RESULTS = 8
+# clusters scanned per query: more finds more of the true nearest chunks, slower
+NPROBE = int(os.environ.get("LIBRARY_NPROBE", "16"))
+# below this many chunks every vector is scanned, and there is too little to cluster
+TRAIN_MIN = 4096
+# clusters are re-trained when the library has grown this much since the last training
+RETRAIN_GROWTH = 4
+MAX_LISTS = 4096
+TRAIN_SAMPLE_PER_LIST = 64
+KMEANS_ITERATIONS = 8
+# chunks added since the cluster lists were last sorted are scanned directly
+MAX_UNLISTED = 50000
+# chunks added by other processes that a search reads in place; more than
+# that (e.g. the build command) are loaded in the background
+MAX_APPENDED_READ = 20000
+# ranked hits from each of the two searches that go into the fusion
+CANDIDATES = 50
+RRF_K = 60
+# terms in more chunks than this share say little and cost a lot
+MAX_TERM_SHARE = 0.2
+EMBED_WORKERS = 4
+# rows per matrix product when assigning vectors to clusters
+BATCH_ROWS = 16384
+
+TOKEN_PATTERN = re.compile(r"[^\W\d_]{3,}")
+STOPWORDS = frozenset("""
+the and for are but not you all any can had her was one our out has him his how its may new now old see
+two way who did get got let say she too use that with have this will your from they know want been good
+much some time very when come here just like long make many more only over such take than them well were
+what which about would there their could other into then these those also after because while where
+""".split())
+
+
+def tokenize(text):
+    """Distinct lowercase terms of a text, without stopwords"""
+    return {term for term in TOKEN_PATTERN.findall(text.lower()) if term not in STOPWORDS}
+
+
+def nearest(vectors, centroids):
+    """Index of the closest centroid (dot product) of every row"""
+    labels = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), BATCH_ROWS):
+        batch = np.asarray(vectors[start:start + BATCH_ROWS], dtype=np.float32)
+        labels[start:start + len(batch)] = np.argmax(batch @ centroids.T, axis=1)
+    return labels
+
+
+def top(ids, scores, k):
+    """(id, score) of the k highest scores, best first"""
+    if len(scores) > k:
+        best = np.argpartition(-scores, k)[:k]
+    else:
+        best = np.arange(len(scores))
+    best = best[np.argsort(-scores[best])]
+    return [(int(ids[i]), float(scores[i])) for i in best]
+
+
+class LibraryIndex:
+    """Chunks of many videos, searchable by embedding and by terms
+
+    Safe to share between threads. Chunks other processes append (e.g. the
+    build command while the app is running) are read by the next search,
+    only the new ones; after they re-train the clusters the index is
+    reloaded in the background.
+    """
+
+    def __init__(self, directory, dimensions=bedrock.EMBEDDING_DIMENSIONS, nprobe=NPROBE):
+        self.directory = directory
+        self.dimensions = dimensions
+        self.nprobe = nprobe
+        self._lock = threading.RLock()
+        self._reloading = None
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            self._load()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _trained_stamp(self):
+        """Changes whenever any process re-trained the clusters"""
+        try:
+            stat = os.stat(self._path("centroids.npy"))
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def _stored_rows(self):
+        """Chunks in the files; a chunk counts once its vector is written"""
+        try:
+            return os.path.getsize(self._path("vectors.f16")) // (2 * self.dimensions)
+        except OSError:
+            return 0
+
+    def _file_lock(self):
+        """Exclusive lock against other processes writing the same index"""
+        lock_file = open(self._path("lock"), "w")
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    def _load(self):
+        with self._file_lock():
+            self._read_all()
+
+    def _read_all(self):
+        self.size = 0
+        self._vectors = np.zeros((1024, self.dimensions), dtype=np.float16)
+        self._assignments = np.full(1024, -1, dtype=np.int32)
+        self._chunk_videos = array("I")
+        self._line_offsets = array("Q")
+        self._chunks_end = 0
+        self._videos = []
+        self._video_numbers = {}
+        self._postings = {}
+        self.centroids = None
+        self.trained_size = 0
+        self._order = None
+        self._listed = 0
+
+        row_bytes = 2 * self.dimensions
+        vectors = np.zeros((0, self.dimensions), dtype=np.float16)
+        if os.path.exists(self._path("vectors.f16")):
+            vectors = np.fromfile(self._path("vectors.f16"), dtype=np.float16)
+            vectors = vectors[:len(vectors) // self.dimensions * self.dimensions].reshape(-1, self.dimensions)
+        if os.path.exists(self._path("centroids.npy")):
+            self.centroids = np.load(self._path("centroids.npy"))
+            with open(self._path("trained.json")) as f:
+                self.trained_size = json.load(f)["size"]
+        if os.path.exists(self._path("chunks.jsonl")):
+            with open(self._path("chunks.jsonl"), "rb") as f:
+                for line in f:
+                    # a record without its vector (or a torn write) is dropped
+                    if len(self._chunk_videos) == len(vectors) or not line.endswith(b"\n"):
+                        break
+                    self._register(json.loads(line), len(line))
+        count = len(self._chunk_videos)
+        # room for what other processes add until the next reload
+        self._ensure_capacity(count + count // 4)
+        self._vectors[:count] = vectors[:count]
+        self.size = count
+
+        assignments = np.zeros(0, dtype=np.int32)
+        if os.path.exists(self._path("assignments.i32")):
+            assignments = np.fromfile(self._path("assignments.i32"), dtype=np.int32)
+        if self.centroids is not None:
+            if len(assignments) < count:
+                assignments = np.concatenate([assignments, nearest(self._vectors[len(assignments):count], self.centroids)])
+            self._assignments[:count] = assignments[:count]
+
+        # forget whatever was written past the last complete chunk
+        for name, length in (("chunks.jsonl", self._chunks_end), ("vectors.f16", count * row_bytes)):
+            if os.path.exists(self._path(name)) and os.path.getsize(self._path(name)) != length:
+                os.truncate(self._path(name), length)
+        if self.centroids is not None:
+            self._assignments[:count].tofile(self._path("assignments.i32"))
+        self._loaded_trained = self._trained_stamp()
+
+    def _register(self, record, length):
+        """Add the record of the next chunk, a chunks.jsonl line of length bytes"""
+        chunk = len(self._chunk_videos)
+        number = self._video_numbers.get(record["video_id"])
+        if number is None:
+            number = self._video_numbers[record["video_id"]] = len(self._videos)
+            self._videos.append(record["video_id"])
+        self._chunk_videos.append(number)
+        self._line_offsets.append(self._chunks_end)
+        self._chunks_end += length
+        for term in tokenize(record["text"]):
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = array("I")
+            postings.append(chunk)
+
+    def _append(self, records, lengths, vectors, assignments):
+        """Add chunks that are in the files to the in-memory index"""
+        for record, length in zip(records, lengths):
+            self._register(record, length)
+        self._ensure_capacity(self.size + len(records))
+        self._vectors[self.size:self.size + len(records)] = vectors
+        self._assignments[self.size:self.size + len(records)] = assignments
+        self.size += len(records)
+
+    def _ensure_capacity(self, count):
+        if count <= len(self._vectors):
+            return
+        capacity = max(count, 2 * len(self._vectors))
+        vectors = np.zeros((capacity, self.dimensions), dtype=np.float16)
+        vectors[:self.size] = self._vectors[:self.size]
+        assignments = np.full(capacity, -1, dtype=np.int32)
+        assignments[:self.size] = self._assignments[:self.size]
+        self._vectors, self._assignments = vectors, assignments
+
+    def _read_appended(self, rows):
+        """Read the chunks other processes appended after the loaded ones, up
+        to rows; False if they re-trained the clusters meanwhile"""
+        with open(self._path("vectors.f16"), "rb") as f:
+            f.seek(self.size * 2 * self.dimensions)
+            vectors = np.fromfile(f, dtype=np.float16, count=(rows - self.size) * self.dimensions)
+        vectors = vectors[:len(vectors) // self.dimensions * self.dimensions].reshape(-1, self.dimensions)
+        records, lengths = [], []
+        with open(self._path("chunks.jsonl"), "rb") as f:
+            f.seek(self._chunks_end)
+            for line in f:
+                if len(records) == len(vectors) or not line.endswith(b"\n"):
+                    break
+                records.append(json.loads(line))
+                lengths.append(len(line))
+        count = len(records)
+        if self.centroids is None:
+            assignments = np.full(count, -1, dtype=np.int32)
+        else:
+            assignments = np.zeros(0, dtype=np.int32)
+            if os.path.exists(self._path("assignments.i32")):
+                with open(self._path("assignments.i32"), "rb") as f:
+                    f.seek(self.size * 4)
+                    assignments = np.fromfile(f, dtype=np.int32, count=count)
+            if len(assignments) < count:
+                assignments = np.concatenate([assignments, nearest(vectors[len(assignments):count], self.centroids)])
+        # _train() replaces the centroids before the assignments, so
+        # assignments read before this check belong to the loaded centroids
+        if self._trained_stamp() != self._loaded_trained:
+            return False
+        self._append(records, lengths, vectors[:count], assignments[:count])
+        return True
+
+    def _catch_up(self, max_rows=None):
+        """Read what other processes appended since the index was loaded
+
+        False when that needs a full reload instead: the clusters were
+        re-trained, or with max_rows, more chunks were added than that or
+        than fit without growing the arrays (a copy of all vectors).
+        """
+        if self._trained_stamp() != self._loaded_trained:
+            return False
+        rows = self._stored_rows()
+        if rows <= self.size:
+            return True
+        if max_rows is not None and (rows - self.size > max_rows or rows > len(self._vectors)):
+            return False
+        return self._read_appended(rows)
+
+    def _reload(self):
+        """Load the index from the files again, without holding up searches"""
+        fresh = LibraryIndex(self.directory, self.dimensions, self.nprobe)
+        with self._lock:
+            for name in ("size", "_vectors", "_assignments", "_chunk_videos", "_line_offsets", "_chunks_end",
+                         "_videos", "_video_numbers", "_postings", "centroids", "trained_size", "_order",
+                         "_listed", "_loaded_trained"):
+                setattr(self, name, getattr(fresh, name))
+        logger.info(f"Library index reloaded, {self.size} chunks")
+
+    def _refresh(self):
+        """Pick up chunks other processes added; a full reload (after they
+        re-trained, or added a lot) happens in the background, searches meanwhile
+        use what is loaded"""
+        if self._catch_up(MAX_APPENDED_READ):
+            return
+        if self._reloading is None or self._reloading.done():
+            logger.info("Library index re-trained or grown on disk, reloading in the background")
+            self._reloading = _reload_executor.submit(self._reload)
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, video_id):
+        with self._lock:
+            self._refresh()
+            return video_id in self._video_numbers
+
+    def videos(self):
+        with self._lock:
+            return list(self._videos)
+
+    def add_chunks(self, records, vectors):
+        """Append chunk records ({"video_id", "text", ...}) with their normalized embeddings"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(records), self.dimensions)
+        # clusters another process re-trained are loaded before taking the lock
+        if self._trained_stamp() != self._loaded_trained:
+            self._reload()
+        with self._lock:
+            with self._file_lock():
+                # nobody writes while the file lock is held: read up to the end
+                if not self._catch_up():
+                    self._read_all()
+                assignments = (nearest(vectors, self.centroids) if self.centroids is not None
+                               else np.full(len(records), -1, dtype=np.int32))
+                lines = [(json.dumps(record, ensure_ascii=False) + "\n").encode() for record in records]
+                # vectors last: a chunk only counts once its vector is written
+                with open(self._path("chunks.jsonl"), "ab") as f:
+                    f.write(b"".join(lines))
+                if self.centroids is not None:
+                    with open(self._path("assignments.i32"), "ab") as f:
+                        f.write(assignments.tobytes())
+                with open(self._path("vectors.f16"), "ab") as f:
+                    f.write(vectors.astype(np.float16).tobytes())
+                self._append(records, [len(line) for line in lines], vectors, assignments)
+
+                if (self.centroids is None and self.size >= TRAIN_MIN) or (
+                        self.centroids is not None and self.size >= RETRAIN_GROWTH * self.trained_size):
+                    self._train()
+
+    def _train(self):
+        """Spherical k-means over a sample, then assign every chunk to a cluster"""
+        start = time.perf_counter()
+        lists = min(MAX_LISTS, max(16, int(math.sqrt(self.size))))
+        rng = np.random.default_rng(0)
+        sample_ids = np.sort(rng.choice(self.size, min(self.size, lists * TRAIN_SAMPLE_PER_LIST), replace=False))
+        sample = self._vectors[sample_ids].astype(np.float32)
+        centroids = sample[rng.choice(len(sample), lists, replace=False)]
+        for _ in range(KMEANS_ITERATIONS):
+            labels = nearest(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # an empty cluster keeps its old centroid
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+
+        self._assignments[:self.size] = nearest(self._vectors[:self.size], centroids)
+        self.centroids = centroids
+        self.trained_size = self.size
+        self._order = None
+        # centroids first: their change tells other processes to reload, and
+        # one that reads the new assignments must see it (see _read_appended)
+        for name, data in (("centroids.npy", None),
+                           ("trained.json", json.dumps({"size": self.size}).encode()),
+                           ("assignments.i32", self._assignments[:self.size].tobytes())):
+            tmp_path = f"{self._path(name)}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                if data is None:
+                    np.save(f, centroids)
+                else:
+                    f.write(data)
+            os.replace(tmp_path, self._path(name))
+        self._loaded_trained = self._trained_stamp()
+        logger.info(f"Library index trained {lists} clusters over {self.size} chunks in {time.perf_counter() - start:.1f}s")
+
+    def _build_lists(self):
+        """Chunk ids grouped by cluster: order[bounds[c]:bounds[c + 1]] are cluster c's"""
+        assignments = self._assignments[:self.size]
+        self._order = np.argsort(assignments, kind="stable").astype(np.int32)
+        self._bounds = np.searchsorted(assignments[self._order], np.arange(len(self.centroids) + 1))
+        self._listed = self.size
+
+    def search_vectors(self, vector, k=CANDIDATES):
+        """(chunk, similarity) of the chunks closest to a normalized vector"""
+        with self._lock:
+            return self._search_vectors(np.asarray(vector, dtype=np.float32), k)
+
+    def _search_vectors(self, query, k):
+        if self.centroids is None:
+            ids = np.arange(self.size)
+        else:
+            if self._order is None or self.size - self._listed > MAX_UNLISTED:
+                self._build_lists()
+            nprobe = min(self.nprobe, len(self.centroids))
+            closest = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+            parts = [self._order[self._bounds[c]:self._bounds[c + 1]] for c in closest]
+            parts.append(np.arange(self._listed, self.size, dtype=np.int32))
+            ids = np.concatenate(parts)
+        scores = self._vectors[ids].astype(np.float32) @ query
+        return top(ids, scores, k)
+
+    def search_terms(self, text, k=CANDIDATES):
+        """(chunk, score) of the chunks sharing the rarest terms with a text"""
+        with self._lock:
+            return self._search_terms(text, k)
+
+    def _search_terms(self, text, k):
+        ids = []
+        weights = []
+        for term in tokenize(text):
+            postings = self._postings.get(term)
+            if not postings or len(postings) > max(CANDIDATES, MAX_TERM_SHARE * self.size):
+                continue
+            # rare terms count more (BM25 idf)
+            ids.append(np.array(postings, dtype=np.int32))
+            weights.append(np.full(len(postings), math.log(1 + (self.size - len(postings) + 0.5) / (len(postings) + 0.5))))
+        if not ids:
+            return []
+        chunks, inverse = np.unique(np.concatenate(ids), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(weights))
+        return top(chunks, scores, k)
+
+    def search(self, vector, text, k=RESULTS):
+        """Chunk records best matching a question by meaning and by words"""
+        with self._lock:
+            self._refresh()
+            if not self.size:
+                return []
+            rankings = [self._search_vectors(np.asarray(vector, dtype=np.float32), CANDIDATES),
+                        self._search_terms(text, CANDIDATES)]
+        fused = {}
+        for ranking in rankings:
+            for rank, (chunk, _) in enumerate(ranking):
+                fused[chunk] = fused.get(chunk, 0.0) + 1.0 / (RRF_K + rank + 1)
+        best = sorted(fused, key=fused.get, reverse=True)[:k]
+        return [dict(self.chunk(chunk), score=fused[chunk]) for chunk in best]
+
+    def chunk(self, chunk):
+        """The stored record of a chunk, read from disk"""
+        with open(self._path("chunks.jsonl"), "rb") as f:
+            f.seek(self._line_offsets[chunk])
+            return json.loads(f.readline())
+
+
+_shared = None
+_shared_lock = threading.Lock()
+# one video at a time, so the app's other Bedrock calls are not crowded out
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="library")
+_reload_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="library-reload")
+
+
+def shared():
+    """The library index of this process, loaded on first use"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = LibraryIndex(LIBRARY_DIR)
+    return _shared
+
+
+def chunk_records(video_id, transcript, summary=None, metadata=None):
+    title = (metadata or {}).get("title") or video_id
+    records = []
+    if summary:
+        records.append({"video_id": video_id, "title": title, "kind": "summary", "start": 0.0,
+                        "text": segments.strip_time_markers(summary)})
+    for chunk in transcript.chunks(CHUNK_CHARS):
+        records.append({"video_id": video_id, "title": title, "kind": "transcript",
+                        "start": float(chunk.starts[0]), "text": chunk.text})
+    return records
+
+
+def index_video(video_id, transcript, summary=None, metadata=None, index=None):
+    """Embed and add a video's summary and transcript chunks; 0 if already indexed"""
+    index = index or shared()
+    if video_id in index:
+        return 0
+    records = chunk_records(video_id, transcript, summary, metadata)
+    with ThreadPoolExecutor(max_workers=EMBED_WORKERS) as executor:
+        vectors = list(executor.map(lambda record: bedrock.embed(record["text"]), records))
+    index.add_chunks(records, vectors)
+    logger.info(f"Added {video_id} to the library index ({len(records)} chunks)")
+    return len(records)
+
+
+def index_video_async(video_id, transcript, summary=None, metadata=None):
+    """index_video in the background; failures are logged, not raised"""
+    if not INDEXING or not transcript:
+        return None
+
+    def run():
+        try:
+            return index_video(video_id, transcript, summary, metadata)
+        except Exception as e:
+            logger.warning(f"Could not add {video_id} to the library index: {e}")
+            return 0
+    return _executor.submit(run)
+
+
+def ask(question, user="library", k=RESULTS):
+    """Answer a question from the best matching chunks across all videos
+
+    Returns {"response", "sources", "timings"}; sources are numbered as the
+    model was asked to cite them.
+    """
+    timings = {}
+    start = time.perf_counter()
+    vector = bedrock.embed(question)
+    timings["embed"] = time.perf_counter() - start
+    start = time.perf_counter()
+    hits = shared().search(vector, question, k)
+    timings["search"] = time.perf_counter() - start
+    if not hits:
+        return {"response": "The library is empty so far. Summarize a few videos first.", "sources": [], "timings": timings}
+
+    excerpts = []
+    for number, hit in enumerate(hits, 1):
+        where = "summary" if hit["kind"] == "summary" else f"at {segments.format_timestamp(hit['start'])}"
+        excerpts.append(f"[{number}] \"{hit['title']}\" ({where}):\n{hit['text']}")
+    prompt = f"Question: {question}\n\nExcerpts:\n\n" + "\n\n".join(excerpts)
+    start = time.perf_counter()
+    response = bedrock.summarize(prompt, system_prompt=bedrock.LIBRARY_SYSTEM_PROMPT, user=user, kind="followup")
+    timings["answer"] = time.perf_counter() - start
+    logger.info(f"Library question: embed {timings['embed']:.3f}s, search {timings['search'] * 1000:.1f}ms, "
+                f"answer {timings['answer']:.2f}s")
+    sources = [{"number": number, "video_id": hit["video_id"], "title": hit["title"],
+                "kind": hit["kind"], "start": hit["start"]} for number, hit in enumerate(hits, 1)]
+    return {"response": response, "sources": sources, "timings": timings}
+
+
+def build():
+    """Index every cached summary whose transcript is cached (or in the corpus)"""
+    index = shared()
+    added = skipped = 0
+    for key in cache.summary_cache.keys():
+        video_id, _, version = key.rpartition("-v")
+        if version != bedrock.PROMPT_VERSION or video_id in index:
+            continue
+        shared_corpus = corpus.shared()
+        transcript = shared_corpus.get(video_id) if shared_corpus else None
+        if transcript is None:
+            data = cache.transcript_cache.get(video_id)
+            transcript = segments.TranscriptSegments.from_dict(data) if isinstance(data, dict) else None
+        if transcript is None:
+            skipped += 1
+            continue
+        chunks = index_video(video_id, transcript, cache.summary_cache.get(key), ingest.metadata_cache.get(video_id))
+        print(f"   📚 {video_id}: {chunks} chunks")
+        added += 1
+    return added, skipped
+
+
+# spread of synthetic chunks around their topic: a chunk is ~0.8 similar to it
+SYNTHETIC_NOISE = 0.75
+# chunks of a long video, added while the benchmark index is being searched
+APPENDED_CHUNKS = 100
+
+
+def synthetic_library(count, dimensions, topics, seed=1):
+    """Batches of (records, vectors) clustered by topic, each topic with its own words"""
+    rng = np.random.default_rng(seed)
+    words = random.Random(seed)
+    vocabulary = ["".join(words.choice("etaoinshrdlucmfwypvbgk") for _ in range(words.randint(4, 9)))
+                  for _ in range(20000)]
+    centers = rng.standard_normal((topics, dimensions)).astype(np.float32)
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    batch = 50000
+    for first in range(0, count, batch):
+        n = min(batch, count - first)
+        labels = rng.integers(0, topics, n)
+        vectors = centers[labels] + rng.standard_normal((n, dimensions)).astype(np.float32) * (SYNTHETIC_NOISE / math.sqrt(dimensions))
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        records = []
+        for i, label in enumerate(labels):
+            topic_words = vocabulary[5 * label % len(vocabulary):5 * label % len(vocabulary) + 5]
+            text = " ".join(topic_words[:2] + words.choices(vocabulary, k=10))
+            records.append({"video_id": f"v{(first + i) // 50:09d}", "title": "", "kind": "transcript",
+                            "start": float((first + i) % 50 * 60), "text": text})
+        yield records, vectors, labels, centers, vocabulary
+
+
+def percentiles(values):
+    values = sorted(values)
+    return {p: values[min(len(values) - 1, int(len(values) * p / 100))] * 1000 for p in (50, 95, 99)}
+
+
+def run_bench(args):
+    logging.getLogger().setLevel(logging.WARNING)
+    directory = args.dir or tempfile.mkdtemp(prefix="library-bench-")
+    try:
+        writer = LibraryIndex(directory, args.dimensions, args.nprobe)
+        print(f"🧪 Adding {args.chunks} synthetic chunks ({args.dimensions} dimensions) to {directory}")
+        start = time.perf_counter()
+        for records, vectors, _, centers, vocabulary in synthetic_library(args.chunks, args.dimensions, args.topics):
+            writer.add_chunks(records, vectors)
+            print(f"   {writer.size} chunks, {time.perf_counter() - start:.0f}s", end="\r")
+        built = time.perf_counter() - start
+        print(f"📦 Built in {built:.1f}s, {len(writer.centroids) if writer.centroids is not None else 0} clusters")
+
+        start = time.perf_counter()
+        index = LibraryIndex(directory, args.dimensions, args.nprobe)
+        loaded = time.perf_counter() - start
+
+        # as if another process added a video: the next search reads its chunks
+        records, vectors, *_ = next(synthetic_library(APPENDED_CHUNKS, args.dimensions, args.topics, seed=2))
+        index.search(vectors[0], records[0]["text"])
+        writer.add_chunks(records, vectors)
+        start = time.perf_counter()
+        index.search(vectors[0], records[0]["text"])
+        appended = time.perf_counter() - start
+
+        rng = np.random.default_rng(7)
+        timings = {"vector": [], "terms": [], "hybrid": []}
+        recall = []
+        for q in range(args.queries):
+            topic = int(rng.integers(0, len(centers)))
+            vector = centers[topic] + rng.standard_normal(args.dimensions).astype(np.float32) * (SYNTHETIC_NOISE / math.sqrt(args.dimensions))
+            vector /= np.linalg.norm(vector)
+            text = f"what about {vocabulary[5 * topic % len(vocabulary)]}?"
+            start = time.perf_counter()
+            hits = index.search_vectors(vector, 10)
+            timings["vector"].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            index.search_terms(text)
+            timings["terms"].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            index.search(vector, text)
+            timings["hybrid"].append(time.perf_counter() - start)
+            if q < args.recall_queries:
+                scores = np.concatenate([index._vectors[s:min(s + 100000, index.size)].astype(np.float32) @ vector
+                                         for s in range(0, index.size, 100000)])
+                exact = set(np.argpartition(-scores, 10)[:10].tolist())
+                recall.append(len(exact & {chunk for chunk, _ in hits}) / 10)
+    finally:
+        if not args.dir:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    print(f"\n{'='*60}")
+    print(f"📊 LIBRARY INDEX BENCHMARK ({args.chunks} chunks, nprobe {args.nprobe})")
+    print(f"{'='*60}")
+    print(f"📦 Build: {built:.1f}s ({args.chunks / built:.0f} chunks/s), reload: {loaded:.1f}s")
+    print(f"➕ First search after another process added {APPENDED_CHUNKS} chunks: {appended * 1000:.1f}ms")
+    for name, values in timings.items():
+        p = percentiles(values)
+        print(f"⏱️  {name:>6} search: p50 {p[50]:.1f}ms  p95 {p[95]:.1f}ms  p99 {p[99]:.1f}ms")
+    if recall:
+        print(f"🎯 Vector recall@10 against a full scan: {sum(recall) / len(recall):.2f}")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"chunks": args.chunks, "nprobe": args.nprobe, "build_seconds": built, "load_seconds": loaded,
+                       "search_after_append_ms": appended * 1000,
+                       "search_ms": {name: percentiles(values) for name, values in timings.items()},
+                       "recall_at_10": sum(recall) / len(recall) if recall else None}, f, indent=2)
+        print(f"📄 Report written to: {args.report}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build, query and benchmark the cross-video library index",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument("command", choices=["build", "search", "bench"])
+    parser.add_argument("question", nargs="?", help="question to search for (search)")
+    parser.add_argument("--results", type=int, default=RESULTS, help="chunks to show (search)")
+    parser.add_argument("--chunks", type=int, default=1000000, help="synthetic chunks (bench)")
+    parser.add_argument("--topics", type=int, default=5000, help="synthetic topic clusters (bench)")
+    parser.add_argument("--dimensions", type=int, default=bedrock.EMBEDDING_DIMENSIONS, help="vector size (bench)")
+    parser.add_argument("--queries", type=int, default=200, help="timed queries (bench)")
+    parser.add_argument("--recall-queries", type=int, default=20, help="queries checked against a full scan (bench)")
+    parser.add_argument("--nprobe", type=int, default=NPROBE, help="clusters scanned per query (bench)")
+    parser.add_argument("--dir", help="keep the benchmark index in this directory")
+    parser.add_argument("--report", help="write the benchmark results as JSON")
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        run_bench(args)
+    elif args.command == "build":
+        added, skipped = build()
+        print(f"📚 {added} video(s) added, {skipped} skipped without a cached transcript, "
+              f"{len(shared())} chunks in {LIBRARY_DIR}")
+    else:
+        if not args.question:
+            parser.print_help()
+            sys.exit(1)
+        index = shared()
+        start = time.perf_counter()
+        hits = index.search(bedrock.embed(args.question), args.question, args.results)
+        print(f"🔎 {len(hits)} of {len(index)} chunks in {time.perf_counter() - start:.2f}s (including the embedding)")
+        for hit in hits:
+            where = "summary" if hit["kind"] == "summary" else segments.format_timestamp(hit["start"])
+            print(f"   https://youtu.be/{hit['video_id']}?t={int(hit['start'])}  {where}  {hit['title']}")
+            print(f"      {hit['text'][:150]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import re
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+import bedrock
+import cache
+import ingest
+import library
+import segments
+import state
+import utility
+
+logger = logging.getLogger()
+
+# bounded pool: YouTube and Bedrock both throttle aggressive clients
+MAX_WORKERS = 4
+# how many per-video summaries are merged into one roll-up request
+ROLLUP_GROUP_SIZE = 10
+# playlist and channel pages only list their first ~100 videos without paging
+MAX_VIDEOS = 100
+REQUEST_TIMEOUT = 15
+
+VIDEO_ID_PATTERN = re.compile(r'"videoId":"([\w-]{11})"')
+
+
+def _scrape_video_ids(page_url, limit=MAX_VIDEOS):
+    """Return the unique video ids referenced on a YouTube page, in page order"""
+    response = requests.get(
+        page_url,
+        headers={"Accept-Language": "en-US"},
+        timeout=REQUEST_TIMEOUT,
+    )
+    response.raise_for_status()
+
+    video_ids = []
+    for video_id in VIDEO_ID_PATTERN.findall(response.text):
+        if video_id not in video_ids:
+            video_ids.append(video_id)
+            if len(video_ids) >= limit:
+                break
+    return video_ids
+
+
+def list_videos(source_id, content_type, limit=MAX_VIDEOS):
+    """Enumerate the video ids of a playlist or channel"""
+    if content_type == "youtube_playlist":
+        page_url = f"https://www.youtube.com/playlist?list={source_id}"
+    elif content_type == "youtube_channel":
+        page_url = f"https://www.youtube.com/{source_id}/videos"
+    else:
+        raise ValueError(f"Not a playlist or channel: {content_type}")
+
+    video_ids = _scrape_video_ids(page_url, limit)
+    logger.info(f"Found {len(video_ids)} videos in {source_id}")
+    return video_ids
+
+
+def read_video_ids(file_path):
+    """Video ids from a URL file (# comments allowed); playlists are expanded"""
+    with open(file_path, 'r') as f:
+        urls = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    return expand_urls(urls)
+
+
+def expand_urls(urls):
+    """Unique video ids of video, playlist and channel URLs, in order"""
+    video_ids = []
+    for url in urls:
+        video_id, content_type = utility.validate_url(url)
+        if content_type in ("youtube_playlist", "youtube_channel"):
+            ids = list_videos(video_id, content_type)
+        else:
+            ids = [video_id]
+        video_ids.extend(i for i in ids if i not in video_ids)
+    return video_ids
+
+
+def summarize_video(video_id, model=None, user="batch"):
+    """Summarize one video, going through the transcript and summary caches"""
+    key = cache.summary_key(video_id, bedrock.PROMPT_VERSION)
+    # the same video may be in flight for another user or replica
+    with state.lock(f"summary:{key}"):
+        return _summarize_video(video_id, key, model, user)
+
+
+def _summarize_video(video_id, key, model, user):
+    result = {"video_id": video_id, "summary": None, "cached": False, "error": None}
+
+    summary = cache.summary_cache.get(key)
+    if summary:
+        result["summary"] = summary
+        result["cached"] = True
+        return result
+
+    video = ingest.ingest(video_id)
+    if not video.transcript:
+        result["error"] = "No supported transcript"
+        return result
+
+    prompt = video.prompt()
+    try:
+        summary = bedrock.summarize(prompt, model=model, user=user)
+    except Exception as e:
+        logger.exception(e)
+        result["error"] = str(e)
+        return result
+
+    cache.summary_cache.set(key, summary)
+    library.index_video_async(video_id, video.transcript, summary, video.metadata)
+    result["summary"] = summary
+    return result
+
+
+def rollup(summaries, model=None, group_size=ROLLUP_GROUP_SIZE, user="batch"):
+    """Reduce per-video summaries to one summary, a group at a time
+
+    Large playlists would not fit into one prompt, so summaries are merged in
+    groups of group_size and the group summaries are merged again until one
+    is left.
+    """
+    while len(summaries) > 1:
+        merged = []
+        for start in range(0, len(summaries), group_size):
+            group = summaries[start:start + group_size]
+            if len(group) == 1:
+                merged.append(group[0])
+                continue
+            prompt = "Summarize the following video summaries:\n"
+            for i, summary in enumerate(group, 1):
+                # [t=...] citations are per video and mean nothing in a roll-up
+                summary = segments.strip_time_markers(summary)
+                prompt += f"\n--- Video {start + i} ---\n{summary}\n"
+            merged.append(bedrock.summarize(
+                prompt, model=model, system_prompt=bedrock.PLAYLIST_SYSTEM_PROMPT, user=user
+            ))
+        summaries = merged
+    return summaries[0] if summaries else ""
+
+
+def summarize_playlist(source_id, content_type, progress=None, max_workers=MAX_WORKERS, limit=MAX_VIDEOS, user="batch"):
+    """Summarize every video of a playlist or channel and roll the results up
+
+    progress is called from the calling thread as progress(done, total, result)
+    after each video, so it is safe to update Streamlit elements from it.
+    user is who the Bedrock requests are queued for (see scheduler.py).
+    """
+    video_ids = list_videos(source_id, content_type, limit)
+    model = bedrock.bedrock_model()
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(summarize_video, video_id, model, user): video_id
+            for video_id in video_ids
+        }
+        for future in as_completed(futures):
+            result = future.result()
+            results[result["video_id"]] = result
+            if progress:
+                progress(len(results), len(video_ids), result)
+
+    # keep playlist order for the roll-up and the per-video listing
+    videos = [results[video_id] for video_id in video_ids]
+    summaries = [video["summary"] for video in videos if video["summary"]]
+    return {
+        "source_id": source_id,
+        "videos": videos,
+        "summary": rollup(summaries, model=model, user=user),
+    }
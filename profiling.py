@@ -0,0 +1,281 @@
+"""
+Profiling of single runs: where does the time of a summary go?
+
+A profile records
+  - wall and CPU time per pipeline stage (transcript fetch, metadata, prompt
+    building, cache, scheduler queue, LangChain, the Bedrock call itself),
+    with the time spent in nested stages also shown as "self" time
+  - stack samples of the threads taking part, written as collapsed stacks
+    (flamegraph.pl, speedscope, inferno: one "frame;frame;frame count" per line)
+  - the source lines that allocated the most memory during the run (tracemalloc)
+
+Turn it on with BEDROCK_CHAT_PROFILE=1 (every CLI run and every app request),
+with --profile on the test scripts and batch tools, or per session with the
+"Profile my requests" toggle in the app's sidebar. Profiles are written to
+BEDROCK_CHAT_PROFILE_DIR.
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import logging
+import threading
+import tracemalloc
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger()
+
+ENABLED = os.environ.get("BEDROCK_CHAT_PROFILE", "0") != "0"
+PROFILE_DIR = os.environ.get("BEDROCK_CHAT_PROFILE_DIR", "profiles")
+# seconds between stack samples
+SAMPLE_INTERVAL = float(os.environ.get("BEDROCK_CHAT_PROFILE_INTERVAL", "0.005"))
+# tracemalloc roughly doubles the cost of allocations; 0 leaves it off
+ALLOCATIONS = os.environ.get("BEDROCK_CHAT_PROFILE_ALLOCATIONS", "1") != "0"
+TOP_ALLOCATIONS = 15
+MAX_STACK_DEPTH = 128
+
+_active = contextvars.ContextVar("profile", default=None)
+# profile of a whole CLI run, for stages in threads the context does not reach
+_process_profile = None
+# tracemalloc is process wide, started by the first profile and stopped by the last
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Profile:
+    """Stages, stack samples and allocations of one run"""
+
+    def __init__(self, name, interval=SAMPLE_INTERVAL, allocations=ALLOCATIONS, all_threads=False):
+        self.name = name
+        self.interval = interval
+        self.allocations = allocations
+        # a CLI run owns the process; an app request shares it with other sessions
+        self.all_threads = all_threads
+        self.stages = {}
+        self.samples = Counter()
+        self.sample_count = 0
+        self.top_allocations = []
+        self._threads = Counter()
+        self._stacks = threading.local()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = None
+        self._snapshot = None
+
+    def start(self):
+        global _tracing_users
+        if self.allocations:
+            with _tracing_lock:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                _tracing_users += 1
+            self._snapshot = tracemalloc.take_snapshot()
+        self._started = (time.perf_counter(), time.process_time())
+        self._add_thread()
+        self._sampler = threading.Thread(target=self._sample, name=f"profiler-{self.name}", daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        global _tracing_users
+        self.wall = time.perf_counter() - self._started[0]
+        self.cpu = time.process_time() - self._started[1]
+        self._stop.set()
+        self._sampler.join()
+        self._remove_thread()
+        if self.allocations:
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ])
+            self.top_allocations = [
+                {"site": str(stat.traceback), "size_kb": stat.size_diff / 1024, "count": stat.count_diff}
+                for stat in snapshot.compare_to(self._snapshot, "lineno")[:TOP_ALLOCATIONS]
+            ]
+            self._snapshot = None
+            with _tracing_lock:
+                _tracing_users -= 1
+                if not _tracing_users:
+                    tracemalloc.stop()
+
+    def _add_thread(self):
+        with self._lock:
+            self._threads[threading.get_ident()] += 1
+
+    def _remove_thread(self):
+        with self._lock:
+            ident = threading.get_ident()
+            self._threads[ident] -= 1
+            if not self._threads[ident]:
+                del self._threads[ident]
+
+    def _sample(self):
+        names = {}
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            if self.all_threads:
+                threads = [ident for ident in frames if ident != me]
+            else:
+                with self._lock:
+                    threads = list(self._threads)
+            for ident in threads:
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                if ident not in names:
+                    names[ident] = next((t.name for t in threading.enumerate() if t.ident == ident), str(ident))
+                stack.append(names[ident])
+                self.samples[";".join(reversed(stack))] += 1
+                self.sample_count += 1
+
+    @contextmanager
+    def stage(self, name):
+        """Time a stage in the calling thread; stages may nest"""
+        stack = getattr(self._stacks, "stack", None)
+        if stack is None:
+            stack = self._stacks.stack = []
+        # threads doing work for this run (e.g. fetches) are sampled while in a stage
+        self._add_thread()
+        entry = [0.0, 0.0]
+        stack.append(entry)
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.thread_time() - cpu
+            stack.pop()
+            if stack:
+                stack[-1][0] += wall
+                stack[-1][1] += cpu
+            with self._lock:
+                totals = self.stages.setdefault(name, {"calls": 0, "wall": 0.0, "cpu": 0.0, "self_wall": 0.0, "self_cpu": 0.0})
+                totals["calls"] += 1
+                totals["wall"] += wall
+                totals["cpu"] += cpu
+                totals["self_wall"] += wall - entry[0]
+                totals["self_cpu"] += cpu - entry[1]
+            self._remove_thread()
+
+    def collapsed(self):
+        """Stack samples in collapsed format, heaviest first"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def summary(self):
+        return {
+            "name": self.name,
+            "wall": self.wall,
+            "cpu": self.cpu,
+            "stages": dict(sorted(self.stages.items(), key=lambda item: -item[1]["wall"])),
+            "samples": self.sample_count,
+            "sample_interval": self.interval,
+            "allocations": self.top_allocations,
+            "collapsed": self.collapsed(),
+        }
+
+    def report(self):
+        lines = [f"🔬 Profile {self.name}: {self.wall:.2f}s wall, {self.cpu:.2f}s CPU, {self.sample_count} samples",
+                 f"   {'stage':<14} {'calls':>6} {'wall':>8} {'self':>8} {'cpu':>8}"]
+        for name, totals in self.summary()["stages"].items():
+            lines.append(f"   {name:<14} {totals['calls']:>6} {totals['wall']:>7.3f}s {totals['self_wall']:>7.3f}s {totals['cpu']:>7.3f}s")
+        if self.top_allocations:
+            lines.append("   top allocations:")
+            for allocation in self.top_allocations[:5]:
+                lines.append(f"   {allocation['size_kb']:>10.1f} KB {allocation['count']:>7}x  {allocation['site']}")
+        return "\n".join(lines)
+
+    def write(self, directory=PROFILE_DIR):
+        """<name>-<time>.collapsed (stack samples) and .json (everything else)"""
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, f"{self.name}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}")
+        with open(f"{base}.collapsed", "w") as f:
+            f.write(self.collapsed())
+        summary = self.summary()
+        del summary["collapsed"]
+        with open(f"{base}.json", "w") as f:
+            json.dump(summary, f, indent=2)
+        return base
+
+
+@contextmanager
+def profiled(name, enabled=None, directory=PROFILE_DIR):
+    """Profile the enclosed run; yields the Profile, or None when disabled
+
+    enabled defaults to BEDROCK_CHAT_PROFILE. The profile is written to
+    directory (None: not written) when the run ends.
+    """
+    if enabled is None:
+        enabled = ENABLED
+    if not enabled or _active.get() is not None:
+        yield None
+        return
+    profile = Profile(name)
+    token = _active.set(profile)
+    profile.start()
+    try:
+        yield profile
+    finally:
+        profile.stop()
+        _active.reset(token)
+        if directory:
+            try:
+                logger.info(f"Profile written to {profile.write(directory)}.*")
+            except OSError as e:
+                logger.warning(f"Could not write profile: {e}")
+
+
+@contextmanager
+def stage(name):
+    """Time a pipeline stage of the active profile; free when there is none
+
+    The profile follows the context, so stages in asyncio.to_thread workers
+    count for the run that started them.
+    """
+    profile = _active.get() or _process_profile
+    if profile is None:
+        yield
+        return
+    with profile.stage(name):
+        yield
+
+
+def current():
+    return _active.get() or _process_profile
+
+
+def profile_process(name, enabled=None, directory=PROFILE_DIR):
+    """Profile the rest of this process (a CLI run); the report is printed
+    and written at exit. Returns the Profile, or None when disabled."""
+    global _process_profile
+    if enabled is None:
+        enabled = ENABLED
+    if not enabled or _process_profile is not None:
+        return None
+    profile = _process_profile = Profile(name, all_threads=True)
+    profile.start()
+
+    def finish():
+        profile.stop()
+        print(profile.report())
+        if directory:
+            print(f"📄 Profile written to {profile.write(directory)}.collapsed/.json")
+    atexit.register(finish)
+    return profile
+
+
+def add_argument(parser):
+    """--profile for the CLI tools"""
+    parser.add_argument("--profile", action="store_true", default=ENABLED,
+                        help=f"profile the run, written to {PROFILE_DIR}/ (see profiling.py)")
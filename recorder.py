@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+"""
+Record/replay of YouTube transcript, video metadata and bedrock-runtime
+traffic, for repeatable performance runs without live services
+
+Interactions are recorded once, with their timings, to a gzip JSON-lines
+fixture and replayed deterministically with the original latencies scaled
+by --latency-scale (0 = as fast as possible).
+
+Usage:
+    python3 recorder.py record <fixture> --urls <file_with_urls> [--summaries]
+    python3 recorder.py replay <fixture> --urls <file_with_urls> [--summaries] [--latency-scale 1.0]
+
+Examples:
+    python3 recorder.py record fixtures/sample.jsonl.gz --urls sample_test_urls.txt --summaries
+    python3 recorder.py replay fixtures/sample.jsonl.gz --urls sample_test_urls.txt --summaries --runs 3
+
+The app and the other tools replay the same way when these are set:
+    BEDROCK_CHAT_CASSETTE=<fixture>
+    BEDROCK_CHAT_CASSETTE_MODE=record|replay
+    BEDROCK_CHAT_REPLAY_LATENCY_SCALE=1.0
+"""
+
+import os
+import gzip
+import json
+import time
+import atexit
+import hashlib
+import argparse
+import threading
+from types import SimpleNamespace
+
+import youtube_transcript_api
+from youtube_transcript_api import (
+    FetchedTranscript, FetchedTranscriptSnippet, TranscriptList, Transcript, YouTubeTranscriptApi,
+)
+
+CASSETTE = os.environ.get("BEDROCK_CHAT_CASSETTE")
+MODE = os.environ.get("BEDROCK_CHAT_CASSETTE_MODE", "replay")
+LATENCY_SCALE = float(os.environ.get("BEDROCK_CHAT_REPLAY_LATENCY_SCALE", "1.0"))
+
+
+class CassetteMiss(Exception):
+    """A replayed call has no recorded interaction"""
+
+
+def request_key(kind, request):
+    payload = json.dumps([kind, request], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+class Cassette:
+    """Recorded interactions, keyed by a hash of the request
+
+    Repeated identical requests replay their recordings in order and then
+    keep returning the last one.
+    """
+
+    def __init__(self, path, mode, latency_scale=1.0):
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.entries = {}
+        self._positions = {}
+        self._lock = threading.Lock()
+        self._file = None
+
+        if mode == "replay":
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self.entries.setdefault(entry["key"], []).append(entry)
+        elif mode == "record":
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            # gzip members can be appended, so several record runs build one fixture
+            self._file = gzip.open(path, "at", encoding="utf-8")
+            atexit.register(self.close)
+        else:
+            raise ValueError(f"Unknown cassette mode: {mode}")
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def write(self, entry):
+        with self._lock:
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def next_entry(self, kind, request):
+        key = request_key(kind, request)
+        with self._lock:
+            entries = self.entries.get(key)
+            if not entries:
+                raise CassetteMiss(f"No recording for {kind} {json.dumps(request)[:200]}")
+            position = self._positions.get(key, 0)
+            self._positions[key] = position + 1
+            return entries[min(position, len(entries) - 1)]
+
+    def sleep(self, seconds):
+        if self.latency_scale > 0 and seconds > 0:
+            time.sleep(seconds * self.latency_scale)
+
+    def call(self, kind, request, fn, encode, decode):
+        """Record fn()'s outcome, or replay it, for one request"""
+        if self.mode == "replay":
+            entry = self.next_entry(kind, request)
+            self.sleep(entry["latency"])
+            if "error" in entry:
+                raise rebuild_error(entry["error"], request)
+            return decode(entry["response"], request)
+
+        start = time.perf_counter()
+        entry = {"kind": kind, "key": request_key(kind, request), "request": request}
+        try:
+            result = fn()
+        except Exception as e:
+            entry["latency"] = time.perf_counter() - start
+            entry["error"] = {"type": type(e).__name__, "message": str(e)}
+            self.write(entry)
+            raise
+        entry["latency"] = time.perf_counter() - start
+        entry["response"] = encode(result)
+        self.write(entry)
+        return result
+
+
+def rebuild_error(error, request):
+    """Re-create a recorded exception well enough for our except clauses"""
+    cls = getattr(youtube_transcript_api, error["type"], None)
+    video_id = request[0] if isinstance(request, list) and request else ""
+    if cls is youtube_transcript_api.NoTranscriptFound:
+        return cls(video_id, request[1], TranscriptList(video_id, {}, {}, []))
+    if cls is not None:
+        try:
+            return cls(video_id)
+        except TypeError:
+            pass
+    if error["type"] == "ClientError":
+        from botocore.exceptions import ClientError
+        return ClientError({"Error": {"Code": "Replayed", "Message": error["message"]}}, "Replay")
+    return RuntimeError(f"{error['type']}: {error['message']}")
+
+
+# --- YouTube transcript API ---
+
+def _encode_fetched(transcript):
+    return {
+        "video_id": transcript.video_id,
+        "language": transcript.language,
+        "language_code": transcript.language_code,
+        "is_generated": transcript.is_generated,
+        # columns instead of one dict per snippet keeps fixtures compact
+        "text": [snippet.text for snippet in transcript.snippets],
+        "start": [snippet.start for snippet in transcript.snippets],
+        "duration": [snippet.duration for snippet in transcript.snippets],
+    }
+
+
+def _decode_fetched(data, request):
+    snippets = [
+        FetchedTranscriptSnippet(text=text, start=start, duration=duration)
+        for text, start, duration in zip(data["text"], data["start"], data["duration"])
+    ]
+    return FetchedTranscript(
+        snippets=snippets,
+        video_id=data["video_id"],
+        language=data["language"],
+        language_code=data["language_code"],
+        is_generated=data["is_generated"],
+    )
+
+
+def _encode_list(transcript_list):
+    return [
+        {"language": t.language, "language_code": t.language_code, "is_generated": t.is_generated}
+        for t in transcript_list
+    ]
+
+
+class _ReplayTranscript(Transcript):
+    """Transcript whose fetch() comes from the cassette"""
+
+    def __init__(self, cassette, video_id, track):
+        super().__init__(None, video_id, "", track["language"], track["language_code"], track["is_generated"], [])
+        self._cassette = cassette
+
+    def fetch(self, preserve_formatting=False):
+        return self._cassette.call(
+            "transcript.fetch", [self.video_id, [self.language_code]], None, _encode_fetched, _decode_fetched
+        )
+
+
+def _recording_fetch(cassette, transcript):
+    original = transcript.fetch
+
+    def fetch(preserve_formatting=False):
+        return cassette.call(
+            "transcript.fetch", [transcript.video_id, [transcript.language_code]],
+            lambda: original(preserve_formatting), _encode_fetched, _decode_fetched,
+        )
+    return fetch
+
+
+def _cassette_list(cassette, original_list):
+    """list_transcripts through the cassette, for any original list function"""
+    def decode_list(tracks, request):
+        video_id = request[0]
+        manual = {t["language_code"]: _ReplayTranscript(cassette, video_id, t) for t in tracks if not t["is_generated"]}
+        generated = {t["language_code"]: _ReplayTranscript(cassette, video_id, t) for t in tracks if t["is_generated"]}
+        return TranscriptList(video_id, manual, generated, [])
+
+    def record_list(video_id, *args, **kwargs):
+        transcript_list = original_list(video_id, *args, **kwargs)
+        # tracks fetched from the list are recorded under the same key their replay uses
+        for transcript in transcript_list:
+            transcript.fetch = _recording_fetch(cassette, transcript)
+        return transcript_list
+
+    def list_transcripts(video_id, *args, **kwargs):
+        return cassette.call(
+            "transcript.list", [video_id], lambda: record_list(video_id, *args, **kwargs), _encode_list, decode_list,
+        )
+    return list_transcripts
+
+
+def install_transcripts(cassette, fetcher):
+    """Route a TranscriptFetcher's requests through the cassette"""
+    original_fetch = fetcher.fetch_transcript
+
+    def fetch_transcript(video_id, languages):
+        return cassette.call(
+            "transcript.fetch", [video_id, list(languages)],
+            lambda: original_fetch(video_id, languages), _encode_fetched, _decode_fetched,
+        )
+
+    fetcher.fetch_transcript = fetch_transcript
+    fetcher.list_transcripts = _cassette_list(cassette, fetcher.list_transcripts)
+
+
+def install_transcript_api(cassette):
+    """Route the class-level YouTubeTranscriptApi.list_transcripts (used by
+    utility_fixed.py) through the cassette; it shares the fetcher's recordings"""
+    YouTubeTranscriptApi.list_transcripts = staticmethod(_cassette_list(cassette, YouTubeTranscriptApi.list_transcripts))
+
+
+def install_metadata(cassette):
+    import ingest
+    original = ingest.download_video_metadata
+    ingest.download_video_metadata = lambda video_id: cassette.call(
+        "metadata", [video_id], lambda: original(video_id), lambda m: m, lambda m, request: m,
+    )
+
+
+# --- bedrock-runtime ---
+
+def _bedrock_request(kwargs):
+    request = {key: value for key, value in kwargs.items() if key != "body"}
+    body = kwargs.get("body")
+    request["body"] = json.loads(body) if isinstance(body, (str, bytes)) else body
+    return request
+
+
+class RecordingRuntime:
+    """bedrock-runtime client proxy that records model invocations"""
+
+    def __init__(self, client, cassette):
+        self._client = client
+        self._cassette = cassette
+
+    def invoke_model(self, **kwargs):
+        def encode(response):
+            # the body stream can only be read once: read it, keep a copy
+            body = response["body"].read()
+            response["body"] = _Body(body)
+            return {"body": body.decode(), "headers": response.get("ResponseMetadata", {}).get("HTTPHeaders", {})}
+
+        return self._cassette.call(
+            "bedrock.invoke_model", _bedrock_request(kwargs),
+            lambda: self._client.invoke_model(**kwargs), encode, None,
+        )
+
+    def invoke_model_with_response_stream(self, **kwargs):
+        request = _bedrock_request(kwargs)
+        start = time.perf_counter()
+        try:
+            response = self._client.invoke_model_with_response_stream(**kwargs)
+        except Exception as e:
+            self._cassette.write({
+                "kind": "bedrock.stream", "key": request_key("bedrock.stream", request), "request": request,
+                "latency": time.perf_counter() - start, "error": {"type": type(e).__name__, "message": str(e)},
+            })
+            raise
+        first_event = time.perf_counter() - start
+        response["body"] = self._record_events(response["body"], request, start, first_event)
+        return response
+
+    def _record_events(self, stream, request, start, first_event):
+        events = []
+        previous = time.perf_counter()
+        try:
+            for event in stream:
+                now = time.perf_counter()
+                events.append([now - previous, event["chunk"]["bytes"].decode() if "chunk" in event else None])
+                previous = now
+                yield event
+        finally:
+            # also written when the consumer stops early, so replays of a
+            # cancelled stream stop at the same point
+            self._cassette.write({
+                "kind": "bedrock.stream", "key": request_key("bedrock.stream", request), "request": request,
+                "latency": first_event, "response": {"events": events},
+            })
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class _Body:
+    """Minimal StreamingBody replacement"""
+
+    def __init__(self, data):
+        self._data = data
+
+    def read(self, *args):
+        data, self._data = self._data, b""
+        return data
+
+    def close(self):
+        pass
+
+
+class ReplayRuntime:
+    """bedrock-runtime stand-in answering from the cassette"""
+
+    def __init__(self, cassette, region_name="us-east-1"):
+        self._cassette = cassette
+        # ChatBedrock reads the region from client.meta
+        self.meta = SimpleNamespace(region_name=region_name)
+
+    def invoke_model(self, **kwargs):
+        def decode(data, request):
+            return {"body": _Body(data["body"].encode()), "ResponseMetadata": {"HTTPHeaders": data["headers"]}}
+
+        return self._cassette.call("bedrock.invoke_model", _bedrock_request(kwargs), None, None, decode)
+
+    def invoke_model_with_response_stream(self, **kwargs):
+        def decode(data, request):
+            return {"body": self._replay_events(data["events"])}
+
+        return self._cassette.call("bedrock.stream", _bedrock_request(kwargs), None, None, decode)
+
+    def _replay_events(self, events):
+        for delay, chunk in events:
+            self._cassette.sleep(delay)
+            yield {"chunk": {"bytes": chunk.encode()}} if chunk is not None else {}
+
+
+# --- activation ---
+
+_active = None
+
+
+def install(path, mode, latency_scale=LATENCY_SCALE):
+    """Record or replay all transcript, metadata and Bedrock traffic"""
+    global _active
+    from transcript_fetcher import fetcher
+    _active = Cassette(path, mode, latency_scale)
+    install_transcripts(_active, fetcher)
+    install_transcript_api(_active)
+    install_metadata(_active)
+    return _active
+
+
+def runtime_client(make_client):
+    """bedrock-runtime client for the active cassette mode
+
+    make_client is only called when real calls are needed, so replays run
+    without AWS credentials.
+    """
+    if _active and _active.mode == "replay":
+        return ReplayRuntime(_active)
+    client = make_client()
+    if _active and _active.mode == "record":
+        return RecordingRuntime(client, _active)
+    return client
+
+
+def active():
+    return _active
+
+
+def call(kind, request, fn):
+    """fn() through the active cassette, for JSON-serializable results of
+    other traffic (e.g. a plain HTTP check); just fn() without a cassette"""
+    if not _active:
+        return fn()
+    return _active.call(kind, request, fn, lambda result: result, lambda result, request: result)
+
+
+# --- regression runs ---
+
+def run_pipeline(video_ids, summaries):
+    """Ingest (and optionally summarize) every video, timing each stage"""
+    import bedrock
+    import ingest
+
+    model = bedrock.bedrock_model() if summaries else None
+    rows = []
+    for video_id in video_ids:
+        row = {"video_id": video_id}
+        start = time.perf_counter()
+        video = ingest.ingest(video_id, use_cache=False)
+        row["ingest"] = time.perf_counter() - start
+        row["transcript_chars"] = len(video.transcript.text) if video.transcript else 0
+        if summaries and video.transcript:
+            start = time.perf_counter()
+            try:
+                bedrock.summarize(video.prompt(), model=model)
+                row["summary"] = time.perf_counter() - start
+            except Exception as e:
+                row["error"] = str(e)
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Record or replay transcript and Bedrock traffic",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("fixture", help="gzip JSON-lines fixture file")
+    parser.add_argument("--urls", required=True, help="file with YouTube URLs, one per line")
+    parser.add_argument("--summaries", action="store_true", help="also summarize with Bedrock")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="replay latency multiplier")
+    parser.add_argument("--runs", type=int, default=1, help="replay runs")
+    parser.add_argument("--report", help="write per-run timings as JSON")
+    args = parser.parse_args()
+
+    # bedrock.py reads the cassette of the imported module, not of __main__;
+    # the command line, not the environment, picks it
+    os.environ.pop("BEDROCK_CHAT_CASSETTE", None)
+    import recorder
+    recorder.install(args.fixture, args.mode, args.latency_scale)
+    import utility
+
+    with open(args.urls, 'r') as f:
+        urls = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    video_ids = [utility.validate_url(url)[0] for url in urls]
+
+    runs = []
+    for run in range(args.runs if args.mode == "replay" else 1):
+        start = time.perf_counter()
+        rows = run_pipeline(video_ids, args.summaries)
+        total = time.perf_counter() - start
+        runs.append({"total": total, "videos": rows})
+
+        print(f"\n🧪 {args.mode} run {run + 1}: {total:.2f}s")
+        print(f"{'video':<13} {'ingest':>8} {'summary':>8} {'chars':>8}")
+        for row in rows:
+            summary = f"{row['summary']:.2f}s" if "summary" in row else "-"
+            print(f"{row['video_id']:<13} {row['ingest']:>7.2f}s {summary:>8} {row['transcript_chars']:>8}")
+            if "error" in row:
+                print(f"   ❌ {row['error']}")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"mode": args.mode, "latency_scale": args.latency_scale, "runs": runs}, f, indent=2)
+        print(f"\n📄 Report written to: {args.report}")
+
+
+if CASSETTE and __name__ != "__main__":
+    install(CASSETTE, MODE, LATENCY_SCALE)
+
+
+if __name__ == "__main__":
+    main()
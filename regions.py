@@ -0,0 +1,201 @@
+import os
+import time
+import random
+import logging
+import threading
+from types import SimpleNamespace
+
+from botocore.exceptions import ConnectionError, ReadTimeoutError
+
+import throttle
+
+logger = logging.getLogger()
+
+# comma separated regions to spread Bedrock calls over, first one preferred
+# until there are measurements; "region=model_id" uses another model id
+# (e.g. a cross-region inference profile) in that region instead of the
+# chat model (bedrock.MODEL_ID)
+REGIONS = os.environ.get("BEDROCK_REGIONS", "us-east-1")
+# weight of the newest sample in the latency and throttle-rate averages
+EWMA_ALPHA = 0.2
+# a region throttling every call scores (1 + THROTTLE_PENALTY) times worse
+THROTTLE_PENALTY = 4.0
+# after a throttle or connection error a region is only used as a fallback
+COOLDOWN = 5.0
+# share of calls sent to a random healthy region, to keep its average fresh
+EXPLORE_RATE = 0.05
+
+
+def parse_regions(spec):
+    """{region: model_id or None} from "us-east-1,us-west-2=us.anthropic..." """
+    regions = {}
+    for entry in spec.split(","):
+        region, _, model_id = entry.strip().partition("=")
+        if region:
+            regions[region] = model_id or None
+    return regions
+
+
+def is_failover_error(error):
+    """Errors another region may not have: throttling, unreachable endpoint"""
+    return throttle.is_throttling_error(error) or isinstance(error, (ConnectionError, ReadTimeoutError))
+
+
+class RegionStats:
+    """Latency and throttle-rate averages plus counters of one region"""
+
+    def __init__(self, region):
+        self.region = region
+        self.latency = None
+        self.throttle_rate = 0.0
+        self.cooldown_until = 0.0
+        self.in_flight = 0
+        self.calls = 0
+        self.throttled = 0
+        self.errors = 0
+        self.failovers = 0
+
+    def score(self):
+        """Expected cost of a call; lower is better, unmeasured regions first"""
+        latency = self.latency if self.latency is not None else 0.0
+        return latency * (1 + THROTTLE_PENALTY * self.throttle_rate)
+
+    def available(self, now):
+        return now >= self.cooldown_until
+
+    def record(self, latency=None, throttled=False, failed=False):
+        self.calls += 1
+        self.throttle_rate += EWMA_ALPHA * ((1.0 if throttled else 0.0) - self.throttle_rate)
+        if throttled:
+            self.throttled += 1
+        if failed:
+            self.errors += 1
+        if throttled or failed:
+            self.cooldown_until = time.monotonic() + COOLDOWN
+        elif latency is not None:
+            self.latency = latency if self.latency is None else self.latency + EWMA_ALPHA * (latency - self.latency)
+
+    def snapshot(self):
+        return {
+            "latency": round(self.latency, 3) if self.latency is not None else None,
+            "throttle_rate": round(self.throttle_rate, 3),
+            "cooling_down": not self.available(time.monotonic()),
+            "in_flight": self.in_flight,
+            "calls": self.calls,
+            "throttled": self.throttled,
+            "errors": self.errors,
+            "failovers": self.failovers,
+        }
+
+
+class RegionPool:
+    """bedrock-runtime client spreading calls over several regions
+
+    Every call goes to the region with the best score (latency average
+    weighted by recent throttling). A throttled or unreachable region is
+    skipped for COOLDOWN seconds and the call fails over to the next one;
+    only when every region fails is the error raised, so throttle.controller
+    backs off only when there is no capacity left anywhere.
+    """
+
+    def __init__(self, clients, model_ids=None, default_model_id=None, explore_rate=EXPLORE_RATE, seed=None):
+        self.clients = clients
+        # region -> model id replacing default_model_id in that region
+        self.model_ids = model_ids or {}
+        self.default_model_id = default_model_id
+        self.explore_rate = explore_rate
+        self.stats_by_region = {region: RegionStats(region) for region in clients}
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        # ChatBedrock reads the region from client.meta
+        self.meta = SimpleNamespace(region_name=next(iter(clients)))
+
+    def ranked(self):
+        """Regions in the order a call should try them"""
+        now = time.monotonic()
+        with self._lock:
+            stats = list(self.stats_by_region.values())
+            order = sorted(stats, key=lambda s: (not s.available(now), s.score()))
+            healthy = [s for s in order if s.available(now)]
+            if len(healthy) > 1 and self._random.random() < self.explore_rate:
+                explore = self._random.choice(healthy[1:])
+                order.remove(explore)
+                order.insert(0, explore)
+        return [s.region for s in order]
+
+    def _call(self, operation, kwargs, measure_latency):
+        last_error = None
+        for attempt, region in enumerate(self.ranked()):
+            stats = self.stats_by_region[region]
+            call_kwargs = dict(kwargs)
+            if self.model_ids.get(region) and call_kwargs.get("modelId") == self.default_model_id:
+                call_kwargs["modelId"] = self.model_ids[region]
+            with self._lock:
+                stats.in_flight += 1
+                if attempt:
+                    stats.failovers += 1
+            start = time.monotonic()
+            try:
+                response = getattr(self.clients[region], operation)(**call_kwargs)
+            except Exception as e:
+                failover = is_failover_error(e)
+                throttled = throttle.is_throttling_error(e)
+                with self._lock:
+                    stats.in_flight -= 1
+                    # a broken request says nothing about the region
+                    if failover:
+                        stats.record(throttled=throttled, failed=not throttled)
+                if not failover:
+                    raise
+                logger.info(f"Bedrock {operation} failed in {region}, trying next region: {e}")
+                last_error = e
+                continue
+            with self._lock:
+                stats.in_flight -= 1
+                # only chat model calls are comparable with each other
+                chat_call = self.default_model_id is None or kwargs.get("modelId") == self.default_model_id
+                stats.record(latency=time.monotonic() - start if measure_latency and chat_call else None)
+            return response
+        raise last_error
+
+    def invoke_model(self, **kwargs):
+        return self._call("invoke_model", kwargs, measure_latency=True)
+
+    def converse(self, **kwargs):
+        return self._call("converse", kwargs, measure_latency=True)
+
+    # streams fail over only if the call itself fails; their latency is time
+    # to first byte, not comparable with whole invocations, so it is not recorded
+    def invoke_model_with_response_stream(self, **kwargs):
+        return self._call("invoke_model_with_response_stream", kwargs, measure_latency=False)
+
+    def converse_stream(self, **kwargs):
+        return self._call("converse_stream", kwargs, measure_latency=False)
+
+    def stats(self):
+        with self._lock:
+            return {region: s.snapshot() for region, s in self.stats_by_region.items()}
+
+    def __getattr__(self, name):
+        return getattr(self.clients[self.meta.region_name], name)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def shared_pool(make_client, default_model_id=None, spec=REGIONS):
+    """Process-wide pool, so routing learns from every session's calls
+
+    make_client(region) creates the bedrock-runtime client of one region.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            regions = parse_regions(spec)
+            _pool = RegionPool(
+                {region: make_client(region) for region in regions},
+                {region: model_id for region, model_id in regions.items() if model_id},
+                default_model_id,
+            )
+        return _pool
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Rolling summaries of live streams and other videos whose captions keep growing
+
+Re-summarizing the whole transcript on every update costs more the longer
+the stream runs. Instead, per video, the offset of the last summarized
+segment is kept: an update summarizes only the segments added since into
+window summaries, then folds those into the rolling summary. An update costs
+the new captions plus the (bounded) rolling summary, however long the stream
+has been running.
+
+The rolling summary is also written to the summary cache, and the grown
+transcript to the transcript cache, so the app shows the latest state to
+the next visitor.
+
+Usage:
+    python3 rolling.py update <youtube_url> [--watch SECONDS]
+    python3 rolling.py simulate [--minutes 240] [--interval 10]
+
+Examples:
+    python3 rolling.py update "https://www.youtube.com/live/..." --watch 300
+    python3 rolling.py simulate --minutes 480 --interval 15
+"""
+
+import sys
+import time
+import random
+import logging
+import argparse
+import tempfile
+
+import bedrock
+import cache
+import profiling
+import scheduler
+import segments
+import state
+import throttle
+import utility
+
+logger = logging.getLogger()
+
+# new captions are summarized in windows of at most this many characters
+WINDOW_CHARS = 12000
+# window summaries folded into the rolling summary per request
+FOLD_GROUP_SIZE = 8
+# window summaries kept per video, oldest dropped first
+MAX_WINDOWS = 200
+
+WINDOW_SYSTEM_PROMPT = "You are given the next part of the transcript of a live stream or a long video. The transcript contains [t=SECONDS] time markers. Summarize what is said in this part in a few bullet points, citing the nearest preceding marker exactly as written, e.g. [t=120]."
+ROLLING_SYSTEM_PROMPT = "You are given the current summary of a live stream or a long video, followed by summaries of the parts that came after it. Rewrite the summary so it covers everything so far: a comprehensive summary, the key points, and a short conclusion about what the video is about. Keep the [t=SECONDS] citations exactly as written."
+
+rolling_cache = cache.open_cache("rolling")
+
+
+def estimate_tokens(*texts):
+    return sum(scheduler.estimate_cost(text) for text in texts)
+
+
+def _summarize(prompt, system_prompt, model, user, usage):
+    summary = bedrock.summarize(prompt, model=model, system_prompt=system_prompt, user=user)
+    usage["requests"] += 1
+    usage["tokens"] += estimate_tokens(system_prompt, prompt, summary)
+    return summary
+
+
+def fold(summary, window_summaries, model=None, user="batch", usage=None):
+    """Rolling summary updated with window summaries, a group at a time"""
+    usage = usage if usage is not None else {"requests": 0, "tokens": 0}
+    for first in range(0, len(window_summaries), FOLD_GROUP_SIZE):
+        parts = "\n\n".join(window_summaries[first:first + FOLD_GROUP_SIZE])
+        prompt = f"Current summary:\n{summary or '(nothing yet, this is the beginning)'}\n\nWhat came after it:\n{parts}"
+        summary = _summarize(prompt, ROLLING_SYSTEM_PROMPT, model, user, usage)
+    return summary
+
+
+def initial_state(video_id):
+    """Rolling state for a video summarized the usual way, if it was
+
+    The cached summary covers exactly the cached transcript, so that is
+    where the rolling summary picks up.
+    """
+    summary = cache.summary_cache.get(cache.summary_key(video_id, bedrock.PROMPT_VERSION))
+    cached = cache.transcript_cache.get(video_id)
+    if not summary or not isinstance(cached, dict):
+        return {"segments": 0, "seconds": 0.0, "summary": None, "windows": [], "updates": []}
+    transcript = segments.TranscriptSegments.from_dict(cached)
+    return {"segments": len(transcript), "seconds": _end(transcript), "summary": summary, "windows": [], "updates": []}
+
+
+def _end(transcript):
+    return float(transcript.starts[-1] + transcript.durations[-1]) if len(transcript) else 0.0
+
+
+def update_from(video_id, transcript, model=None, user="batch"):
+    """Bring a video's rolling summary up to date with a (grown) transcript
+
+    Returns the rolling state; state["updates"][-1] describes this update,
+    with "new_segments" 0 when there was nothing new.
+    """
+    key = cache.summary_key(video_id, bedrock.PROMPT_VERSION)
+    # one update per video at a time, also across replicas
+    with state.lock(f"rolling:{key}"):
+        rolling = rolling_cache.get(key) or initial_state(video_id)
+        start = time.perf_counter()
+        usage = {"requests": 0, "tokens": 0}
+        new = transcript.slice(rolling["segments"], len(transcript))
+        update = {"time": time.time(), "new_segments": len(new), "until": _end(transcript)}
+        if len(new):
+            windows = []
+            for window in new.chunks(WINDOW_CHARS):
+                prompt = f"Part from {segments.format_timestamp(window.starts[0])}:\n{window.with_time_markers()}"
+                windows.append(_summarize(prompt, WINDOW_SYSTEM_PROMPT, model, user, usage))
+            rolling["summary"] = fold(rolling["summary"], windows, model, user, usage)
+            rolling["windows"] = (rolling["windows"] + [
+                {"start": float(window.starts[0]), "summary": summary}
+                for window, summary in zip(new.chunks(WINDOW_CHARS), windows)
+            ])[-MAX_WINDOWS:]
+            rolling["segments"] = len(transcript)
+            rolling["seconds"] = _end(transcript)
+            cache.transcript_cache.set(video_id, transcript.to_dict())
+            cache.summary_cache.set(key, rolling["summary"])
+        update.update(usage, seconds=time.perf_counter() - start)
+        rolling["updates"] = (rolling["updates"] + [update])[-MAX_WINDOWS:]
+        rolling_cache.set(key, rolling)
+    logger.info(f"Rolling summary of {video_id}: {update['new_segments']} new segments, "
+                f"{update['requests']} requests, ~{update['tokens']} tokens")
+    return rolling
+
+
+def update(video_id, model=None, user="batch"):
+    """Fetch the current captions of a video and update its rolling summary
+
+    None when the video has no transcript (yet).
+    """
+    transcript = utility.get_segments(video_id, use_cache=False)
+    if not transcript:
+        return None
+    return update_from(video_id, transcript, model, user)
+
+
+def growing_transcript(minutes, words_per_minute=150, seed=1):
+    """Synthetic live captions: one 5 second segment after another"""
+    rng = random.Random(seed)
+    vocabulary = ["".join(rng.choice("etaoinshrdlucmfwypvbgk") for _ in range(rng.randint(2, 8))) for _ in range(3000)]
+    builder = segments.SegmentBuilder()
+    for i in range(int(minutes * 12)):
+        builder.add(" ".join(rng.choices(vocabulary, k=words_per_minute // 12)), i * 5.0, 5.0)
+    return builder.build()
+
+
+def run_simulation(args):
+    """Rolling updates vs full re-summaries of a growing stream, on stand-ins"""
+    from standins import FakeBedrockRuntime
+
+    logging.getLogger("langchain_aws").setLevel(logging.CRITICAL)
+    directory = tempfile.mkdtemp(prefix="rolling-sim-")
+    global rolling_cache
+    rolling_cache = cache.FileCache("rolling", directory)
+    cache.transcript_cache = cache.FileCache("transcripts", directory)
+    cache.summary_cache = cache.FileCache("summaries", directory)
+    runtime = FakeBedrockRuntime(latency=0.0, response_text="- a point of this part [t=0]. " * 40)
+    bedrock.bedrock_runtime_client = lambda: throttle.ControlledClient(runtime, throttle.controller)
+    model = bedrock.bedrock_model()
+
+    stream = growing_transcript(args.minutes)
+    print(f"{'minute':>7} {'new segs':>9} {'rolling tokens':>15} {'full re-summary tokens':>23}")
+    total_rolling = total_full = 0
+    for minute in range(args.interval, args.minutes + 1, args.interval):
+        transcript = stream.slice(0, minute * 12)
+        rolling = update_from("simulated", transcript, model)
+        tokens = rolling["updates"][-1]["tokens"]
+        full = estimate_tokens(bedrock.SYSTEM_PROMPT, utility.generate_prompt_from_transcript(transcript), rolling["summary"])
+        total_rolling += tokens
+        total_full += full
+        print(f"{minute:>7} {rolling['updates'][-1]['new_segments']:>9} {tokens:>15} {full:>23}")
+    print(f"\n📊 {args.minutes} minutes, an update every {args.interval}: ~{total_rolling} tokens rolling, "
+          f"~{total_full} tokens re-summarizing ({total_full / max(1, total_rolling):.1f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Keep rolling summaries of growing transcripts up to date",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument("command", choices=["update", "simulate"])
+    parser.add_argument("url", nargs="?", help="YouTube video or live stream URL (update)")
+    parser.add_argument("--watch", type=float, help="keep updating every this many seconds (update)")
+    parser.add_argument("--minutes", type=int, default=240, help="simulated stream length (simulate)")
+    parser.add_argument("--interval", type=int, default=10, help="minutes between simulated updates (simulate)")
+    profiling.add_argument(parser)
+    args = parser.parse_args()
+    profiling.profile_process(f"rolling-{args.command}", args.profile)
+
+    if args.command == "simulate":
+        run_simulation(args)
+        return
+    if not args.url:
+        parser.print_help()
+        sys.exit(1)
+
+    video_id, _ = utility.validate_url(args.url)
+    while True:
+        rolling = update(video_id)
+        if rolling is None:
+            print(f"❌ No transcript for {video_id} (yet)")
+        else:
+            last = rolling["updates"][-1]
+            print(f"🔄 {video_id}: {last['new_segments']} new segments up to "
+                  f"{segments.format_timestamp(rolling['seconds'])}, ~{last['tokens']} tokens")
+            if last["new_segments"]:
+                print(rolling["summary"])
+        if not args.watch:
+            break
+        time.sleep(args.watch)
+
+
+if __name__ == "__main__":
+    main()
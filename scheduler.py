@@ -0,0 +1,236 @@
+import os
+import time
+import heapq
+import logging
+import itertools
+import threading
+from collections import deque, Counter
+from contextlib import contextmanager
+
+import inflight
+import profiling
+import throttle
+
+logger = logging.getLogger()
+
+# share of Bedrock capacity per request class: a follow-up of the same cost
+# goes ahead of a summary, and both ahead of background work (precomputed
+# answers, cache warming)
+WEIGHTS = {
+    "followup": 4.0,
+    "summary": 1.0,
+    "background": 0.25,
+}
+# requests waiting for Bedrock; beyond this the least urgent one is shed
+MAX_QUEUE = int(os.environ.get("SCHEDULER_MAX_QUEUE", "64"))
+# requests one user may have queued or running at the same time; a playlist
+# summarizes playlist.MAX_WORKERS videos at once
+USER_MAX_PENDING = int(os.environ.get("SCHEDULER_USER_MAX_PENDING", "4"))
+# queue position updates for waiting users at most this often (seconds)
+POLL_INTERVAL = 0.5
+# recent waits kept per class for the statistics
+WAIT_SAMPLES = 1000
+
+
+class SchedulerRejected(throttle.BedrockUnavailable):
+    """The request was not queued (or dropped from the queue)"""
+
+
+class QuotaExceeded(SchedulerRejected):
+    def __init__(self, pending):
+        super().__init__(
+            f"You already have {pending} requests waiting for Bedrock. Please wait for them to finish."
+        )
+
+
+class Overloaded(SchedulerRejected):
+    def __init__(self):
+        super().__init__("Too many requests are waiting for Bedrock right now. Please try again in a minute.")
+
+
+def estimate_cost(text):
+    """Request cost in (roughly) tokens: ~4 characters per token"""
+    return max(1, len(text) // 4)
+
+
+class _Request:
+    __slots__ = ("user", "kind", "finish", "seq", "enqueued", "admitted", "error")
+
+    def __init__(self, user, kind, finish, seq):
+        self.user = user
+        self.kind = kind
+        self.finish = finish
+        self.seq = seq
+        self.enqueued = time.monotonic()
+        self.admitted = False
+        self.error = None
+
+    def key(self):
+        return (self.finish, self.seq)
+
+
+class FairScheduler:
+    """Weighted fair queue in front of Bedrock (self-clocked fair queueing)
+
+    Every user is a flow. A request's finish tag is
+        max(virtual time, the user's previous finish tag) + cost / weight
+    and the queued request with the smallest tag runs next. A user sending
+    long summaries back to back pushes their own tags ahead and so waits
+    behind other users, and a short follow-up (small cost, large weight)
+    overtakes queued summaries. Requests run while fewer than capacity()
+    are running; by default that follows the adaptive limit of
+    throttle.controller.
+    """
+
+    def __init__(self, capacity=None, weights=WEIGHTS, max_queue=MAX_QUEUE, user_max_pending=USER_MAX_PENDING):
+        self.capacity = capacity or (lambda: max(1, int(throttle.controller.limiter.limit)))
+        self.weights = weights
+        self.max_queue = max_queue
+        self.user_max_pending = user_max_pending
+        self.running = 0
+        self._queue = []
+        self._virtual_time = 0.0
+        self._last_finish = {}
+        self._pending = Counter()
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self.waits = {kind: deque(maxlen=WAIT_SAMPLES) for kind in weights}
+        self.counters = Counter()
+
+    @contextmanager
+    def slot(self, user, kind, cost, on_wait=None):
+        """Wait for this request's turn; on_wait(position) is called while queued
+
+        Raises QuotaExceeded or Overloaded instead of queueing,
+        throttle.DeadlineExceeded when the request budget runs out in the
+        queue and inflight.Cancelled when the user cancels meanwhile.
+        """
+        request = self._enqueue(user, kind, cost)
+        try:
+            with profiling.stage("queue"):
+                self._wait(request, on_wait)
+        except BaseException:
+            self._finish(request, ran=False)
+            raise
+        try:
+            yield
+        finally:
+            self._finish(request, ran=True)
+
+    def _enqueue(self, user, kind, cost):
+        with self._cond:
+            if self._pending[user] >= self.user_max_pending:
+                self.counters["quota_rejected"] += 1
+                raise QuotaExceeded(self._pending[user])
+            start = max(self._virtual_time, self._last_finish.get(user, 0.0))
+            request = _Request(user, kind, start + cost / self.weights[kind], next(self._seq))
+
+            if len(self._queue) >= self.max_queue:
+                # shed whichever is least urgent: the newcomer or the last in line
+                worst = max(self._queue)
+                if request.key() >= worst[:2]:
+                    self.counters["shed"] += 1
+                    raise Overloaded()
+                self._queue.remove(worst)
+                heapq.heapify(self._queue)
+                worst[2].error = Overloaded()
+                self.counters["shed"] += 1
+                self._cond.notify_all()
+
+            self._last_finish[user] = request.finish
+            self._pending[user] += 1
+            heapq.heappush(self._queue, (request.finish, request.seq, request))
+            self._dispatch()
+            return request
+
+    def _dispatch(self):
+        """Admit queued requests in tag order while there is capacity"""
+        capacity = self.capacity()
+        admitted = False
+        while self._queue and self.running < capacity:
+            _, _, request = heapq.heappop(self._queue)
+            request.admitted = True
+            self.running += 1
+            self._virtual_time = max(self._virtual_time, request.finish)
+            self.waits[request.kind].append(time.monotonic() - request.enqueued)
+            self.counters[f"{request.kind}_admitted"] += 1
+            admitted = True
+        if admitted:
+            self._cond.notify_all()
+
+    def position(self, request):
+        """1-based place in the queue, 0 once admitted"""
+        if request.admitted:
+            return 0
+        return 1 + sum(1 for entry in self._queue if entry[:2] < request.key())
+
+    def _wait(self, request, on_wait):
+        deadline, _ = throttle._current_budget()
+        last_position = None
+        with self._cond:
+            while True:
+                if request.error:
+                    raise request.error
+                if inflight.cancelled():
+                    raise inflight.Cancelled()
+                # capacity() may have grown since the last release
+                self._dispatch()
+                if request.admitted:
+                    return
+                if deadline is not None and time.monotonic() >= deadline:
+                    self.counters["deadline_exceeded"] += 1
+                    raise throttle.DeadlineExceeded()
+                position = self.position(request)
+                if on_wait and position != last_position:
+                    last_position = position
+                    # the callback may touch the UI, don't hold the lock meanwhile
+                    self._cond.release()
+                    try:
+                        on_wait(position)
+                    finally:
+                        self._cond.acquire()
+                    continue
+                timeout = POLL_INTERVAL
+                if deadline is not None:
+                    timeout = min(timeout, max(0.0, deadline - time.monotonic()))
+                self._cond.wait(timeout)
+
+    def _finish(self, request, ran):
+        with self._cond:
+            if ran or request.admitted:
+                self.running -= 1
+            elif not request.error:
+                entry = (request.finish, request.seq, request)
+                if entry in self._queue:
+                    self._queue.remove(entry)
+                    heapq.heapify(self._queue)
+            self._pending[request.user] -= 1
+            if not self._pending[request.user]:
+                del self._pending[request.user]
+                # an idle user's old tag only matters while it is ahead of virtual time
+                if self._last_finish.get(request.user, 0.0) <= self._virtual_time:
+                    self._last_finish.pop(request.user, None)
+            self._dispatch()
+
+    def stats(self):
+        """Queue state and per-class wait times (seconds) of recent requests"""
+        with self._cond:
+            stats = {
+                "running": self.running,
+                "queued": len(self._queue),
+                "capacity": self.capacity(),
+                "counters": dict(self.counters),
+            }
+            for kind, waits in self.waits.items():
+                values = sorted(waits)
+                stats[kind] = {
+                    "requests": len(values),
+                    "wait_p50": values[len(values) // 2] if values else 0.0,
+                    "wait_p95": values[min(len(values) - 1, int(len(values) * 0.95))] if values else 0.0,
+                    "wait_max": values[-1] if values else 0.0,
+                }
+            return stats
+
+
+# one scheduler per process, shared by all Streamlit sessions
+scheduler = FairScheduler()
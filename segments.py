@@ -0,0 +1,180 @@
+import re
+import base64
+from array import array
+from bisect import bisect_right
+
+# segment start offsets into the text buffer, and float32 start/duration seconds
+OFFSET_TYPECODE = 'I'
+TIME_TYPECODE = 'f'
+# interval (seconds) between [t=...] markers in prompts
+MARKER_INTERVAL = 30
+TIME_MARKER_PATTERN = re.compile(r'\[t=(\d+)\]')
+
+
+class TranscriptSegments:
+    """Transcript kept as columns instead of a list of dicts
+
+    text holds all segments joined by a single space; segment i starts at
+    offsets[i] and ends one character before offsets[i + 1]. starts and
+    durations are float32 arrays, so a long transcript costs a few bytes per
+    segment on top of its text, and offset/time lookups are binary searches.
+    """
+
+    __slots__ = ("text", "offsets", "starts", "durations")
+
+    def __init__(self, text="", offsets=None, starts=None, durations=None):
+        self.text = text
+        self.offsets = offsets if offsets is not None else array(OFFSET_TYPECODE)
+        self.starts = starts if starts is not None else array(TIME_TYPECODE)
+        self.durations = durations if durations is not None else array(TIME_TYPECODE)
+
+    @classmethod
+    def from_raw_data(cls, transcript_data):
+        """Build from FetchedTranscript.to_raw_data() style dicts"""
+        builder = SegmentBuilder()
+        for entry in transcript_data:
+            builder.add(entry['text'], entry['start'], entry['duration'])
+        return builder.build()
+
+    def __len__(self):
+        return len(self.starts)
+
+    def segment_text(self, index):
+        end = self.offsets[index + 1] - 1 if index + 1 < len(self) else len(self.text)
+        return self.text[self.offsets[index]:end]
+
+    def segment_at_offset(self, char_offset):
+        """Index of the segment containing a character offset of text"""
+        return max(0, bisect_right(self.offsets, char_offset) - 1)
+
+    def time_at_offset(self, char_offset):
+        """Start time (seconds) of the segment containing a character offset"""
+        if not len(self):
+            return 0.0
+        return self.starts[self.segment_at_offset(char_offset)]
+
+    def segment_at_time(self, seconds):
+        """Index of the segment being spoken at a point in time"""
+        return max(0, bisect_right(self.starts, seconds) - 1)
+
+    def slice(self, first, last):
+        """Segments first..last-1 as a new TranscriptSegments"""
+        last = min(last, len(self))
+        if first >= last:
+            return TranscriptSegments()
+        base = self.offsets[first]
+        end = self.offsets[last] - 1 if last < len(self) else len(self.text)
+        offsets = array(OFFSET_TYPECODE, (offset - base for offset in self.offsets[first:last]))
+        return TranscriptSegments(
+            self.text[base:end], offsets, self.starts[first:last], self.durations[first:last]
+        )
+
+    def slice_time(self, start_seconds, end_seconds):
+        """Segments starting in [start_seconds, end_seconds)"""
+        first = bisect_right(self.starts, start_seconds - 1e-3)
+        last = bisect_right(self.starts, end_seconds - 1e-3)
+        return self.slice(first, last)
+
+    def chunks(self, max_chars):
+        """Split on segment boundaries into slices of at most ~max_chars"""
+        first = 0
+        while first < len(self):
+            base = self.offsets[first]
+            if len(self.text) - base <= max_chars:
+                last = len(self)
+            else:
+                # a chunk ends one character before the next segment's offset;
+                # a single oversized segment still makes a chunk of its own
+                last = bisect_right(self.offsets, base + max_chars + 1, lo=first + 1) - 1
+                last = max(first + 1, last)
+            yield self.slice(first, last)
+            first = last
+
+    def with_time_markers(self, interval=MARKER_INTERVAL):
+        """Text with a [t=SECONDS] marker at least every interval seconds"""
+        parts = []
+        next_marker = 0.0
+        for i in range(len(self)):
+            start = self.starts[i]
+            if start >= next_marker:
+                parts.append(f"[t={int(start)}]")
+                next_marker = start + interval
+            parts.append(self.segment_text(i))
+        return ' '.join(parts)
+
+    def to_dict(self):
+        """JSON friendly form, arrays stored as base64 of their raw bytes"""
+        return {
+            "text": self.text,
+            "offsets": base64.b64encode(self.offsets.tobytes()).decode(),
+            "starts": base64.b64encode(self.starts.tobytes()).decode(),
+            "durations": base64.b64encode(self.durations.tobytes()).decode(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        columns = []
+        for key, typecode in (("offsets", OFFSET_TYPECODE), ("starts", TIME_TYPECODE), ("durations", TIME_TYPECODE)):
+            column = array(typecode)
+            column.frombytes(base64.b64decode(data[key]))
+            columns.append(column)
+        return cls(data["text"], *columns)
+
+
+class SegmentBuilder:
+    """Appends segments one at a time without keeping per-segment objects
+
+    Texts are joined into a chunk every CHUNK_SEGMENTS segments, so even
+    millions of segments (a long subtitle file) cost little more than their
+    text.
+    """
+
+    CHUNK_SEGMENTS = 4096
+
+    def __init__(self):
+        self._chunks = []
+        self._parts = []
+        self._length = 0
+        self._offsets = array(OFFSET_TYPECODE)
+        self._starts = array(TIME_TYPECODE)
+        self._durations = array(TIME_TYPECODE)
+
+    def add(self, text, start, duration):
+        if len(self._starts):
+            self._parts.append(' ')
+            self._length += 1
+        self._offsets.append(self._length)
+        self._parts.append(text)
+        self._length += len(text)
+        self._starts.append(start)
+        self._durations.append(duration)
+        if len(self._parts) >= 2 * self.CHUNK_SEGMENTS:
+            self._chunks.append(''.join(self._parts))
+            self._parts = []
+
+    def __len__(self):
+        return len(self._starts)
+
+    def build(self):
+        return TranscriptSegments(''.join(self._chunks + self._parts), self._offsets, self._starts, self._durations)
+
+
+def format_timestamp(seconds):
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+def link_timestamps(text, video_id):
+    """Turn [t=SECONDS] citations into clickable links to that point of the video"""
+    return TIME_MARKER_PATTERN.sub(
+        lambda m: f"[{format_timestamp(int(m.group(1)))}](https://youtu.be/{video_id}?t={m.group(1)})",
+        text,
+    )
+
+
+def strip_time_markers(text):
+    return TIME_MARKER_PATTERN.sub('', text)
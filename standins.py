@@ -0,0 +1,280 @@
+"""
+Local stand-ins for AWS services, used by the simulation and benchmark tools
+
+They mimic just enough of the boto3 client interfaces for ChatBedrock and
+our own code to run against them, with configurable latency and failures.
+"""
+
+import io
+import re
+import json
+import zlib
+import time
+import random
+import threading
+from types import SimpleNamespace
+
+from botocore.exceptions import ClientError
+
+
+def throttling_error(operation):
+    return ClientError(
+        {"Error": {"Code": "ThrottlingException", "Message": "Too many requests, please wait before trying again."}},
+        operation,
+    )
+
+
+class _FakeEventStream:
+    """Anthropic streaming events of a stand-in response
+
+    Half of the latency passes before the first token, the rest is spread
+    over the text. Like a botocore EventStream it can be closed from another
+    thread, which ends the iteration early.
+    """
+
+    def __init__(self, runtime, words, delay, input_tokens, output_tokens):
+        self._runtime = runtime
+        self._words = words
+        self._delay = delay
+        self._input_tokens = input_tokens
+        self._output_tokens = output_tokens
+        self._closed = threading.Event()
+        self._finished = False
+        self._lock = threading.Lock()
+
+    def _finish(self):
+        with self._lock:
+            finished, self._finished = self._finished, True
+        if not finished:
+            self._runtime._exit()
+
+    def close(self):
+        self._closed.set()
+        # a stream closed before it was read never reaches the finally below
+        self._finish()
+
+    def __iter__(self):
+        def chunk(event):
+            return {"chunk": {"bytes": json.dumps(event).encode()}}
+
+        words = self._words
+        try:
+            if self._closed.wait(self._delay / 2):
+                return
+            yield chunk({"type": "message_start", "message": {
+                "role": "assistant", "content": [],
+                "usage": {"input_tokens": self._input_tokens, "output_tokens": 0},
+            }})
+            yield chunk({"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+            for i, word in enumerate(words):
+                if self._closed.wait(self._delay / 2 / len(words)):
+                    return
+                text = word if i == 0 else " " + word
+                yield chunk({"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": text}})
+            yield chunk({"type": "content_block_stop", "index": 0})
+            yield chunk({"type": "message_delta", "delta": {"stop_reason": "end_turn"},
+                         "usage": {"output_tokens": self._output_tokens}})
+            yield chunk({"type": "message_stop", "amazon-bedrock-invocationMetrics": {
+                "inputTokenCount": self._input_tokens, "outputTokenCount": self._output_tokens,
+            }})
+        finally:
+            self._finish()
+
+
+class FakeBedrockRuntime:
+    """Stand-in for the bedrock-runtime client
+
+    latency:       seconds per call (plus up to jitter seconds of noise)
+    input_latency: extra seconds per 1000 input tokens, so long prompts
+                   (summaries) take longer than short ones (follow-ups)
+    throttle_rate: probability that a call fails with ThrottlingException
+    capacity:      concurrent calls served before every further call is
+                   throttled, like a per-account quota; None for unlimited
+    """
+
+    def __init__(self, latency=0.2, jitter=0.0, throttle_rate=0.0, capacity=None,
+                 response_text="This is a summary from the local Bedrock stand-in.",
+                 region_name="us-east-1", seed=None, input_latency=0.0):
+        self.latency = latency
+        self.input_latency = input_latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.capacity = capacity
+        self.response_text = response_text
+        self.region_name = region_name
+        # ChatBedrock reads the region from client.meta
+        self.meta = SimpleNamespace(region_name=region_name)
+        self.in_flight = 0
+        self.calls = 0
+        self.throttled = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def set_profile(self, latency=None, throttle_rate=None, capacity=None):
+        if latency is not None:
+            self.latency = latency
+        if throttle_rate is not None:
+            self.throttle_rate = throttle_rate
+        if capacity is not None:
+            self.capacity = capacity
+
+    def _enter(self, operation):
+        with self._lock:
+            self.calls += 1
+            over_capacity = self.capacity is not None and self.in_flight >= self.capacity
+            if over_capacity or self._random.random() < self.throttle_rate:
+                self.throttled += 1
+                raise throttling_error(operation)
+            self.in_flight += 1
+            delay = self.latency + self._random.random() * self.jitter
+        return delay
+
+    def _exit(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def _usage(self, body):
+        request = json.loads(body) if body else {}
+        input_chars = sum(len(json.dumps(m)) for m in request.get("messages", []))
+        input_chars += len(request.get("system", ""))
+        return max(1, input_chars // 4), max(1, len(self.response_text) // 4)
+
+    def invoke_model(self, body=None, modelId=None, **kwargs):
+        delay = self._enter("InvokeModel")
+        delay += self.input_latency * self._usage(body)[0] / 1000
+        try:
+            time.sleep(delay)
+        finally:
+            self._exit()
+        if modelId and modelId.startswith("amazon.titan-embed"):
+            return self._embedding(body)
+        input_tokens, output_tokens = self._usage(body)
+        payload = {
+            "id": "msg_standin",
+            "type": "message",
+            "role": "assistant",
+            "model": modelId,
+            "content": [{"type": "text", "text": self.response_text}],
+            "stop_reason": "end_turn",
+            "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens},
+        }
+        return {
+            "body": io.BytesIO(json.dumps(payload).encode()),
+            "contentType": "application/json",
+            "ResponseMetadata": {"HTTPHeaders": {
+                "x-amzn-bedrock-input-token-count": str(input_tokens),
+                "x-amzn-bedrock-output-token-count": str(output_tokens),
+            }},
+        }
+
+    def _embedding(self, body):
+        """Titan-style embedding: hashed bag of words, so questions sharing
+        words are similar, which is enough to exercise similarity search"""
+        request = json.loads(body)
+        dimensions = request.get("dimensions", 256)
+        vector = [0.0] * dimensions
+        words = re.findall(r"\w+", request["inputText"].lower())
+        for word in words:
+            vector[zlib.crc32(word.encode()) % dimensions] += 1.0
+        norm = sum(v * v for v in vector) ** 0.5 or 1.0
+        payload = {"embedding": [v / norm for v in vector], "inputTextTokenCount": len(words)}
+        return {"body": io.BytesIO(json.dumps(payload).encode()), "contentType": "application/json"}
+
+    def invoke_model_with_response_stream(self, body=None, modelId=None, **kwargs):
+        delay = self._enter("InvokeModelWithResponseStream")
+        input_tokens, output_tokens = self._usage(body)
+        delay += self.input_latency * input_tokens / 1000
+        return {"body": _FakeEventStream(self, self.response_text.split(" "), delay, input_tokens, output_tokens)}
+
+
+class FakeS3:
+    """In-memory stand-in for the S3 calls used by the batch tools"""
+
+    def __init__(self):
+        self.objects = {}
+        self.content_types = {}
+
+    def put_object(self, Bucket, Key, Body, ContentType="binary/octet-stream", **kwargs):
+        if isinstance(Body, str):
+            Body = Body.encode()
+        self.objects[(Bucket, Key)] = bytes(Body)
+        self.content_types[(Bucket, Key)] = ContentType
+        return {}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({"Error": {"Code": "NoSuchKey", "Message": Key}}, "GetObject")
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)]), "ContentType": self.content_types[(Bucket, Key)]}
+
+    def list_objects_v2(self, Bucket, Prefix="", **kwargs):
+        keys = sorted(key for bucket, key in self.objects if bucket == Bucket and key.startswith(Prefix))
+        return {"KeyCount": len(keys), "Contents": [
+            {"Key": key, "Size": len(self.objects[(Bucket, key)])} for key in keys
+        ]}
+
+
+def split_s3_uri(uri):
+    bucket, _, key = uri[len("s3://"):].partition("/")
+    return bucket, key
+
+
+class FakeBedrockControl:
+    """Stand-in for the bedrock control plane's batch inference API
+
+    A job moves Submitted -> InProgress -> Completed over polls_to_complete
+    calls to get_model_invocation_job, then its output is written to the
+    FakeS3 in the layout Bedrock uses: <output prefix>/<job id>/<input>.out
+    failure_rate makes a share of the records come back with an error.
+    """
+
+    def __init__(self, s3, runtime=None, polls_to_complete=2, failure_rate=0.0, seed=None):
+        self.s3 = s3
+        self.runtime = runtime or FakeBedrockRuntime(latency=0)
+        self.polls_to_complete = polls_to_complete
+        self.failure_rate = failure_rate
+        self.jobs = {}
+        self._random = random.Random(seed)
+
+    def create_model_invocation_job(self, jobName, roleArn, modelId, inputDataConfig, outputDataConfig, **kwargs):
+        job_id = f"job{len(self.jobs) + 1:04d}"
+        job_arn = f"arn:aws:bedrock:us-east-1:000000000000:model-invocation-job/{job_id}"
+        self.jobs[job_arn] = {
+            "jobArn": job_arn,
+            "jobName": jobName,
+            "modelId": modelId,
+            "roleArn": roleArn,
+            "status": "Submitted",
+            "inputDataConfig": inputDataConfig,
+            "outputDataConfig": outputDataConfig,
+            "polls": 0,
+        }
+        return {"jobArn": job_arn}
+
+    def get_model_invocation_job(self, jobIdentifier):
+        job = self.jobs[jobIdentifier]
+        job["polls"] += 1
+        if job["status"] not in ("Completed", "Failed") and job["polls"] >= self.polls_to_complete:
+            self._run(job)
+        elif job["status"] == "Submitted":
+            job["status"] = "InProgress"
+        return {key: value for key, value in job.items() if key != "polls"}
+
+    def _run(self, job):
+        input_bucket, input_key = split_s3_uri(job["inputDataConfig"]["s3InputDataConfig"]["s3Uri"])
+        output_bucket, output_prefix = split_s3_uri(job["outputDataConfig"]["s3OutputDataConfig"]["s3Uri"])
+        job_id = job["jobArn"].rsplit("/", 1)[-1]
+
+        lines = []
+        data = self.s3.get_object(Bucket=input_bucket, Key=input_key)["Body"].read().decode()
+        for line in data.splitlines():
+            record = json.loads(line)
+            if self._random.random() < self.failure_rate:
+                record["error"] = {"errorCode": 400, "errorMessage": "Stand-in record failure"}
+            else:
+                response = self.runtime.invoke_model(body=json.dumps(record["modelInput"]), modelId=job["modelId"])
+                record["modelOutput"] = json.loads(response["body"].read())
+            lines.append(json.dumps(record))
+
+        output_key = f"{output_prefix.rstrip('/')}/{job_id}/{input_key.rsplit('/', 1)[-1]}.out"
+        self.s3.put_object(Bucket=output_bucket, Key=output_key, Body="\n".join(lines))
+        job["status"] = "Completed"
@@ -0,0 +1,101 @@
+import os
+import json
+import logging
+import threading
+from contextlib import contextmanager
+
+from langchain_community.chat_message_histories import ChatMessageHistory, RedisChatMessageHistory
+
+logger = logging.getLogger()
+
+# Redis shared by all app replicas (redis://host:port/db). Unset, chat
+# histories live in st.session_state, caches in .cache/ and locks in this
+# process, which is fine for a single replica.
+REDIS_URL = os.environ.get("BEDROCK_CHAT_REDIS_URL")
+KEY_PREFIX = os.environ.get("BEDROCK_CHAT_REDIS_PREFIX", "video-chat")
+# conversations untouched for this long are dropped from Redis
+SESSION_TTL = 7 * 24 * 3600
+# a lock outlives a crashed holder by at most LOCK_TIMEOUT seconds; waiters
+# give up after LOCK_WAIT and do the work themselves
+LOCK_TIMEOUT = 300
+LOCK_WAIT = 120
+
+_client = None
+_client_lock = threading.Lock()
+_local_locks = {}
+
+
+def enabled():
+    return bool(REDIS_URL)
+
+
+def redis_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            import redis
+            _client = redis.Redis.from_url(REDIS_URL)
+        return _client
+
+
+def key(*parts):
+    return ":".join((KEY_PREFIX,) + tuple(str(part) for part in parts))
+
+
+def chat_history(session_id):
+    """Message history of a conversation, in Redis when it is configured"""
+    if enabled():
+        return RedisChatMessageHistory(session_id, url=REDIS_URL, key_prefix=key("history") + ":", ttl=SESSION_TTL)
+    return ChatMessageHistory()
+
+
+def load_session(session_id):
+    """What the app shows of a conversation (questions, answers, video),
+    as saved by save_session(); None without Redis or if unknown"""
+    if not enabled():
+        return None
+    data = redis_client().get(key("session", session_id))
+    return json.loads(data) if data else None
+
+
+def save_session(session_id, data):
+    if enabled():
+        redis_client().set(key("session", session_id), json.dumps(data), ex=SESSION_TTL)
+
+
+@contextmanager
+def lock(name, wait=LOCK_WAIT):
+    """Named lock held across all replicas (or threads, without Redis)
+
+    Used around work that should happen once, e.g. summarizing a video two
+    users submitted at the same time. Yields whether the lock was acquired;
+    after wait seconds the caller goes ahead without it.
+    """
+    if enabled():
+        import redis
+        held = redis_client().lock(key("lock", name), timeout=LOCK_TIMEOUT, blocking_timeout=wait)
+        acquired = held.acquire()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                try:
+                    held.release()
+                except redis.exceptions.LockError:
+                    logger.warning(f"Lock {name} expired before it was released")
+    else:
+        with _client_lock:
+            # [lock, holders and waiters]; dropped when the last one leaves
+            entry = _local_locks.setdefault(name, [threading.Lock(), 0])
+            entry[1] += 1
+        held = entry[0]
+        acquired = held.acquire(timeout=wait)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                held.release()
+            with _client_lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del _local_locks[name]
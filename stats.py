@@ -0,0 +1,6 @@
+def percentile(values, p):
+    """p-th percentile (0-100) of values, nearest rank; 0.0 if empty"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Streaming parser for SRT and WebVTT subtitle files
+
+Recordings that are not on YouTube often come with .srt or .vtt captions.
+They are parsed line by line into the same TranscriptSegments a YouTube
+transcript becomes (utility.get_youtube_segments), so prompts, [t=...]
+citations and the caches work the same. Nothing but the current cue is kept
+besides the output, and the output itself is the text plus 12 bytes per
+cue, so files of hundreds of MB parse in bounded memory; no pass over the
+whole file with a regular expression. (The app's uploads are the exception:
+Streamlit keeps the whole upload in memory before the parser sees it.)
+
+Both formats are handled by one state machine: a cue is an optional
+identifier line, a timing line ("start --> end", SRT or VTT timestamps,
+VTT cue settings after it) and text lines up to a blank line. Blocks
+without a timing line (the WEBVTT header, NOTE, STYLE, REGION) are skipped,
+tags such as <v Speaker> or <00:00:01.000> are removed and entities are
+decoded. A cue repeating the previous one (rolling captions) is dropped.
+
+Usage:
+    python3 subtitles.py parse <file> [<file> ...]
+    python3 subtitles.py bench [--mb 200] [--formats srt,vtt]
+
+Examples:
+    python3 subtitles.py parse talk.vtt --show 5
+    python3 subtitles.py bench --mb 500 --report subtitles.json
+"""
+
+import io
+import os
+import re
+import sys
+import html
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+from segments import SegmentBuilder, format_timestamp
+
+EXTENSIONS = (".srt", ".vtt")
+# inline markup of a cue line: <i>, <v Speaker>, <c.color>, <00:00:01.000>
+TAG_PATTERN = re.compile(r"<[^>]*>")
+
+
+class SubtitleError(Exception):
+    """The file is not a readable SRT or WebVTT file"""
+
+
+def is_subtitle_file(name):
+    return os.path.splitext(name or "")[1].lower() in EXTENSIONS
+
+
+def parse_timestamp(value):
+    """Seconds of "01:02:03,500" (SRT), "01:02:03.500" or "02:03.500" (VTT)"""
+    fields = value.strip().replace(",", ".").split(":")
+    if not 2 <= len(fields) <= 3:
+        raise ValueError(f"not a timestamp: {value!r}")
+    seconds = 0.0
+    for field in fields:
+        seconds = seconds * 60 + float(field)
+    return seconds
+
+
+def _timing(line):
+    """(start, end) of a timing line, None for any other line"""
+    start, arrow, rest = line.partition("-->")
+    if not arrow:
+        return None
+    try:
+        # VTT cue settings (align:start position:0%) follow the end time
+        return parse_timestamp(start), parse_timestamp(rest.split(None, 1)[0])
+    except (ValueError, IndexError):
+        return None
+
+
+def _clean(line):
+    if "<" in line:
+        line = TAG_PATTERN.sub("", line)
+    if "&" in line:
+        line = html.unescape(line)
+    return line.strip()
+
+
+def parse_lines(lines):
+    """TranscriptSegments of the cues in an iterable of text lines"""
+    builder = SegmentBuilder()
+    timing = None
+    text = []
+    previous = None
+    timed_lines = 0
+
+    def finish():
+        nonlocal previous
+        if timing is None:
+            return
+        cue = "\n".join(text)
+        if cue and cue != previous:
+            builder.add(cue, timing[0], max(0.0, timing[1] - timing[0]))
+            previous = cue
+
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if not line.strip():
+            finish()
+            timing, text = None, []
+            continue
+        if timing is None:
+            # identifier lines and header blocks are skipped until a timing line
+            timing = _timing(line)
+            if timing is not None:
+                timed_lines += 1
+            continue
+        cleaned = _clean(line)
+        if cleaned:
+            text.append(cleaned)
+    finish()
+
+    if not timed_lines:
+        raise SubtitleError("no cues found, is this an SRT or WebVTT file?")
+    return builder.build()
+
+
+class _DigestingReader(io.RawIOBase):
+    """Binary file that feeds every byte read through it to a hash"""
+
+    def __init__(self, binary_file, digest):
+        self._file = binary_file
+        self._digest = digest
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        count = self._file.readinto(buffer)
+        self._digest.update(memoryview(buffer)[:count])
+        return count
+
+
+def read_subtitles(binary_file, digest=None):
+    """Parse an SRT/VTT file opened in binary mode (e.g. a Streamlit upload)
+
+    The file is decoded as UTF-8 (with or without BOM, bad bytes replaced)
+    while it is read; it is left open. digest (e.g. hashlib.sha256()) is
+    updated with the file's bytes in the same pass.
+    """
+    if digest is not None:
+        binary_file = io.BufferedReader(_DigestingReader(binary_file, digest))
+    text = io.TextIOWrapper(binary_file, encoding="utf-8-sig", errors="replace", newline=None)
+    try:
+        return parse_lines(text)
+    finally:
+        # keep the wrapper from closing the caller's file
+        text.detach()
+
+
+def parse_file(path):
+    with open(path, "rb") as f:
+        return read_subtitles(f)
+
+
+# --- benchmark ---
+
+def write_synthetic(path, kind, megabytes):
+    """Write a subtitle file of about megabytes MB with 3-second cues"""
+    target = megabytes * 1024 * 1024
+    separator = "," if kind == "srt" else "."
+    with open(path, "w", encoding="utf-8") as f:
+        if kind == "vtt":
+            f.write("WEBVTT\nKind: captions\nLanguage: en\n\n")
+        number = 0
+        while f.tell() < target:
+            start, end = _stamp(number * 3.0, separator), _stamp(number * 3.0 + 2.9, separator)
+            number += 1
+            text = f"Cue {number} of the recording, where somebody explains one more thing\n<i>and a second line</i> &amp; more"
+            if kind == "vtt":
+                f.write(f"{start} --> {end} align:start position:0%\n{text}\n\n")
+            else:
+                f.write(f"{number}\n{start} --> {end}\n{text}\n\n")
+    return number
+
+
+def _stamp(seconds, separator):
+    hours, rest = divmod(seconds, 3600)
+    minutes, rest = divmod(rest, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{int(rest):02d}{separator}{int(round(rest % 1 * 1000)):03d}"
+
+
+def memory_mb():
+    """Current and peak resident memory of this process in MB"""
+    values = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "VmHWM"):
+                values[key] = int(value.split()[0]) / 1024
+    return values.get("VmRSS", 0.0), values.get("VmHWM", 0.0)
+
+
+def bench_worker(method, path):
+    """One parse in a fresh process: time and peak memory growth"""
+    rss_before, _ = memory_mb()
+    start = time.perf_counter()
+    if method == "streaming":
+        transcript = parse_file(path)
+    else:
+        # what this module avoids: the whole file in memory, one regex pass
+        with open(path, encoding="utf-8-sig") as f:
+            content = f.read()
+        builder = SegmentBuilder()
+        for match in re.finditer(r"([\d:.,]+) --> ([\d:.,]+)[^\n]*\n((?:.+\n?)+)", content):
+            start_time, end_time = parse_timestamp(match.group(1)), parse_timestamp(match.group(2))
+            builder.add(_clean(" ".join(match.group(3).split("\n"))), start_time, end_time - start_time)
+        transcript = builder.build()
+    seconds = time.perf_counter() - start
+    _, peak = memory_mb()
+    return {
+        "seconds": seconds,
+        "segments": len(transcript),
+        "text_mb": len(transcript.text) / 1e6,
+        "peak_growth_mb": peak - rss_before,
+    }
+
+
+def run_bench(args):
+    directory = tempfile.mkdtemp(prefix="subtitles-bench-")
+    results = []
+    print(f"{'format':>7} {'method':>10} {'file MB':>8} {'cues':>9} {'seconds':>8} {'MB/s':>7} "
+          f"{'cues/s':>9} {'peak MB':>8} {'text MB':>8}")
+    try:
+        for kind in args.formats.split(","):
+            path = os.path.join(directory, f"bench.{kind}")
+            write_synthetic(path, kind, args.mb)
+            size = os.path.getsize(path) / 1e6
+            for method in ("streaming", "full-file"):
+                # a fresh process each, so peaks do not hide each other
+                output = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "bench-worker", method, path],
+                    capture_output=True, text=True, check=True,
+                ).stdout
+                result = {"format": kind, "method": method, "file_mb": size, **json.loads(output.splitlines()[-1])}
+                results.append(result)
+                print(f"{kind:>7} {method:>10} {size:>8.1f} {result['segments']:>9} {result['seconds']:>8.2f} "
+                      f"{size / result['seconds']:>7.1f} {result['segments'] / result['seconds']:>9.0f} "
+                      f"{result['peak_growth_mb']:>8.1f} {result['text_mb']:>8.1f}")
+            os.remove(path)
+    finally:
+        os.rmdir(directory)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n📄 Report written to {args.report}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Parse SRT/WebVTT subtitle files into transcripts, or benchmark the parser",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument("command", choices=["parse", "bench", "bench-worker"])
+    parser.add_argument("files", nargs="*", help="subtitle files")
+    parser.add_argument("--show", type=int, default=0, help="print the first N segments")
+    parser.add_argument("--mb", type=int, default=200, help="size of the benchmark files in MB")
+    parser.add_argument("--formats", default="srt,vtt", help="benchmark formats, comma separated")
+    parser.add_argument("--report", help="write the benchmark results as JSON")
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        run_bench(args)
+        return
+    if not args.files:
+        parser.print_help()
+        sys.exit(1)
+    if args.command == "bench-worker":
+        print(json.dumps(bench_worker(args.files[0], args.files[1])))
+        return
+
+    for path in args.files:
+        start = time.perf_counter()
+        try:
+            transcript = parse_file(path)
+        except (OSError, SubtitleError) as e:
+            print(f"❌ {path}: {e}")
+            continue
+        end = transcript.starts[-1] + transcript.durations[-1] if len(transcript) else 0
+        print(f"✅ {path}: {len(transcript)} segments, {len(transcript.text)} characters, "
+              f"{format_timestamp(end)} in {time.perf_counter() - start:.2f}s")
+        for index in range(min(args.show, len(transcript))):
+            print(f"   [{format_timestamp(transcript.starts[index])}] {transcript.segment_text(index)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Command-line load test of one app instance
+Drives N concurrent simulated Streamlit sessions through app.py (Streamlit
+AppTest, the same script runs a browser session triggers) against local
+YouTube and Bedrock stand-ins, and ramps N up. Every simulated visitor
+loads the page, submits a video URL (some popular ones are summary cache
+hits) and asks a few follow-ups with some think time in between, then the
+next visitor comes.
+
+Every step runs in a fresh process with a fresh cache, restricted to the
+given number of CPUs (the instance size), and reports request throughput,
+latency percentiles per request class, CPU use and memory. The saturation
+point is the number of users beyond which throughput grows by less than
+10% or the p95 latency exceeds --slo times that of the first step.
+
+AppTest skips the websocket and browser rendering of a real server, so the
+absolute numbers are a lower bound; the shape of the curve is what counts.
+
+Usage:
+    python3 test_load.py
+    python3 test_load.py --users 1,2,4,8,16,32 --cpus 1,2,4
+    python3 test_load.py --latency 2.0 --youtube-latency 1.0 --duration 60
+
+Examples:
+    python3 test_load.py --users 1,4,16 --duration 20 --report load.json
+    python3 test_load.py --followups 5 --think-time 10 --popular 0.5
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+
+from stats import percentile
+
+RESULT_PREFIX = "RESULT "
+CLASSES = ["page_load", "summary", "cached_summary", "followup"]
+QUESTIONS = ["What is the conclusion?", "Who is the speaker?", "What are the key points?",
+             "Which examples are given?", "What should I do next?"]
+
+
+def memory():
+    """Current and peak resident memory of this process in MB"""
+    values = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "VmHWM"):
+                values[key] = int(value.split()[0]) / 1024
+    return values.get("VmRSS", 0.0), values.get("VmHWM", 0.0)
+
+
+def run_instance(args):
+    """One step in this process: args.users sessions for args.duration seconds"""
+    import logging
+    from streamlit.testing.v1 import AppTest
+
+    import bedrock
+    import ingest
+    import segments
+    import throttle
+    import utility
+    from standins import FakeBedrockRuntime
+
+    logging.getLogger("langchain_aws").setLevel(logging.CRITICAL)
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    runtime = FakeBedrockRuntime(latency=args.latency, jitter=args.latency / 3,
+                                 input_latency=args.input_latency, seed=1,
+                                 response_text="A point of the video [t=0]. " * 30)
+    bedrock.bedrock_runtime_client = lambda: throttle.ControlledClient(runtime, throttle.controller)
+
+    def fake_segments(video_id):
+        time.sleep(args.youtube_latency)
+        return segments.TranscriptSegments.from_raw_data([
+            {"text": f"Sentence {i} of the video {video_id} about one thing or another.", "start": 5.0 * i, "duration": 5.0}
+            for i in range(args.segments)
+        ])
+
+    def fake_metadata(video_id):
+        time.sleep(args.youtube_latency / 2)
+        return {"title": video_id, "channel": "Channel", "duration": 5 * args.segments, "chapters": []}
+
+    utility.get_youtube_segments = fake_segments
+    ingest.download_video_metadata = fake_metadata
+    app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+    latencies = {kind: [] for kind in CLASSES}
+    errors = []
+    summarized = set()
+    lock = threading.Lock()
+    stop_at = time.monotonic() + args.duration
+
+    def timed(kind, action):
+        start = time.perf_counter()
+        at = action()
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies[kind].append(elapsed)
+            errors.extend(str(e.value) for e in list(at.exception) + list(at.error))
+
+    def session(number):
+        rng = random.Random(number)
+        visit = 0
+        while time.monotonic() < stop_at:
+            visit += 1
+            if rng.random() < args.popular:
+                video_id = f"popular{rng.randrange(10):04d}"
+            else:
+                video_id = f"u{number:03d}v{visit:05d}"
+            with lock:
+                kind = "cached_summary" if video_id in summarized else "summary"
+                summarized.add(video_id)
+            at = AppTest.from_file(app_path, default_timeout=600)
+            at.secrets["ACCESS_KEY"] = "local"
+            at.secrets["SECRET_KEY"] = "local"
+            timed("page_load", at.run)
+            timed(kind, lambda: at.text_input[0].input(f"https://www.youtube.com/watch?v={video_id}").run())
+            for _ in range(args.followups):
+                question = rng.choice(QUESTIONS)
+                time.sleep(rng.random() * args.think_time)
+                if time.monotonic() >= stop_at:
+                    break
+                timed("followup", lambda: at.text_input[0].input(question).run())
+
+    threads = [threading.Thread(target=session, args=(i,), daemon=True) for i in range(args.users)]
+    wall, cpu = time.perf_counter(), time.process_time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    rss, peak = memory()
+
+    requests = sum(len(values) for kind, values in latencies.items() if kind != "page_load")
+    print(RESULT_PREFIX + json.dumps({
+        "users": args.users,
+        "cpus": len(os.sched_getaffinity(0)),
+        "seconds": wall,
+        "requests": requests,
+        "throughput": requests / wall,
+        "latency": {kind: {"count": len(values), "p50": percentile(values, 50), "p95": percentile(values, 95),
+                           "p99": percentile(values, 99)} for kind, values in latencies.items()},
+        "handle_input_p95": percentile([v for kind, values in latencies.items() if kind != "page_load" for v in values], 95),
+        "cpu_cores": cpu / wall,
+        "rss_mb": rss,
+        "peak_rss_mb": peak,
+        "bedrock_calls": runtime.calls,
+        "errors": errors[:5],
+        "error_count": len(errors),
+    }), flush=True)
+
+
+def run_step(args, cpus, users):
+    """Run one step in a fresh process limited to the first `cpus` CPUs"""
+    command = [sys.executable, os.path.abspath(__file__), "--instance", "--users", str(users)]
+    for name in ("duration", "latency", "input_latency", "youtube_latency", "segments",
+                 "followups", "think_time", "popular"):
+        command += [f"--{name.replace('_', '-')}", str(getattr(args, name))]
+    env = dict(os.environ, BEDROCK_CHAT_CACHE_DIR=tempfile.mkdtemp(prefix="load-test-"),
+               BEDROCK_CHAT_PROFILE="0")
+    available = sorted(os.sched_getaffinity(0))
+    process = subprocess.Popen(
+        command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, env=env,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        preexec_fn=lambda: os.sched_setaffinity(0, available[:cpus]),
+    )
+    result = None
+    for line in process.stdout:
+        if line.startswith(RESULT_PREFIX):
+            result = json.loads(line[len(RESULT_PREFIX):])
+    process.wait()
+    if result is None:
+        raise RuntimeError(f"Load test step with {users} users on {cpus} CPUs failed")
+    return result
+
+
+def _cell(latency, *percentiles):
+    if not latency["count"]:
+        return "-"
+    return "/".join(f"{latency[p]:.2f}" for p in percentiles) + "s"
+
+
+def saturation(steps, slo):
+    """Users at the saturation point of a ramp, and why; None if not reached"""
+    baseline = steps[0]["handle_input_p95"]
+    for previous, step in zip(steps, steps[1:]):
+        if step["throughput"] < previous["throughput"] * 1.1:
+            return previous, f"throughput grew {step['throughput'] / max(previous['throughput'], 1e-9) - 1:.0%} from {previous['users']} to {step['users']} users"
+        if step["handle_input_p95"] > baseline * slo:
+            return previous, f"p95 at {step['users']} users is {step['handle_input_p95'] / baseline:.1f}x that at {steps[0]['users']}"
+    return None, "not reached, ramp further"
+
+
+def run_test(args):
+    users = [int(n) for n in args.users.split(",")]
+    available = len(os.sched_getaffinity(0))
+    report = {}
+    for cpus in [int(n) for n in args.cpus.split(",")]:
+        if cpus > available:
+            print(f"⚠️  Skipping {cpus} CPUs, only {available} available")
+            continue
+        print(f"\n🖥️  Instance with {cpus} CPU(s)")
+        print(f"{'users':>6} {'req/s':>7} {'summary p50/p95':>16} {'cached p95':>11} {'follow-up p50/p95':>18} "
+              f"{'page p95':>9} {'CPU':>6} {'RSS MB':>7} {'errors':>7}")
+        steps = []
+        for n in users:
+            step = run_step(args, cpus, n)
+            steps.append(step)
+            latency = step["latency"]
+            print(f"{n:>6} {step['throughput']:>7.2f} {_cell(latency['summary'], 'p50', 'p95'):>16} "
+                  f"{_cell(latency['cached_summary'], 'p95'):>11} {_cell(latency['followup'], 'p50', 'p95'):>18} "
+                  f"{_cell(latency['page_load'], 'p95'):>9} {step['cpu_cores'] / cpus:>6.0%} "
+                  f"{step['peak_rss_mb']:>7.0f} {step['error_count']:>7}")
+            for error in step["errors"]:
+                print(f"       ❌ {error[:150]}")
+        point, reason = saturation(steps, args.slo)
+        if point:
+            print(f"📈 Saturates at ~{point['users']} users, {point['throughput']:.2f} req/s ({reason})")
+        else:
+            print(f"📈 Saturation point {reason}")
+        report[cpus] = {"steps": steps, "saturation_users": point and point["users"], "reason": reason}
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n📄 Report written to {args.report}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load test one app instance with a growing number of simulated sessions",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument("--users", default="1,2,4,8,16,32", help="concurrent sessions per step, comma separated")
+    parser.add_argument("--cpus", default="1", help="instance sizes in CPUs, comma separated")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per step")
+    parser.add_argument("--latency", type=float, default=1.0, help="stand-in Bedrock latency per call")
+    parser.add_argument("--input-latency", type=float, default=0.2, help="stand-in seconds per 1000 input tokens")
+    parser.add_argument("--youtube-latency", type=float, default=0.5, help="stand-in transcript fetch latency")
+    parser.add_argument("--segments", type=int, default=1500, help="transcript segments per video")
+    parser.add_argument("--followups", type=int, default=3, help="follow-ups per visitor")
+    parser.add_argument("--think-time", type=float, default=5.0, help="max seconds before each follow-up")
+    parser.add_argument("--popular", type=float, default=0.3, help="share of visitors submitting one of 10 popular videos")
+    parser.add_argument("--slo", type=float, default=2.0, help="p95 latency growth over the first step that counts as saturated")
+    parser.add_argument("--report", help="write all steps as JSON")
+    parser.add_argument("--instance", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.instance:
+        args.users = int(args.users)
+        run_instance(args)
+        return
+    try:
+        run_test(args)
+    except KeyboardInterrupt:
+        print("\n👋 Interrupted")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
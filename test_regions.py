@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Command-line simulation of multi-region routing against local stand-ins
+Every region is a FakeBedrockRuntime with its own latency and capacity; in
+the middle third of the run the first region degrades (slower and throttling)
+and the table shows how calls move away from it and back
+
+Usage:
+    python3 test_regions.py
+    python3 test_regions.py --regions us-east-1:0.3:8,us-west-2:0.5:8,eu-central-1:0.8:8
+    python3 test_regions.py --mode pinned
+
+Examples:
+    python3 test_regions.py --sessions 24 --degraded-latency 2.0 --degraded-capacity 2
+    python3 test_regions.py --duration 30 --explore-rate 0.1
+"""
+
+import sys
+import time
+import random
+import logging
+import argparse
+import threading
+
+from langchain_aws import ChatBedrock
+
+import bedrock
+import regions
+import throttle
+from standins import FakeBedrockRuntime
+from stats import percentile
+
+
+def parse_profiles(spec):
+    """[(region, latency, capacity)] from "region:latency:capacity,..." """
+    profiles = []
+    for entry in spec.split(","):
+        region, latency, capacity = entry.strip().split(":")
+        profiles.append((region, float(latency), int(capacity)))
+    return profiles
+
+
+def run_simulation(args):
+    logging.getLogger("langchain_aws").setLevel(logging.CRITICAL)
+    profiles = parse_profiles(args.regions)
+    if args.mode == "pinned":
+        profiles = profiles[:1]
+    runtimes = {
+        region: FakeBedrockRuntime(latency=latency, jitter=latency / 3, capacity=capacity,
+                                   region_name=region, seed=i)
+        for i, (region, latency, capacity) in enumerate(profiles)
+    }
+    pool = regions.RegionPool(runtimes, explore_rate=args.explore_rate, seed=1)
+    controller = throttle.BedrockController(
+        limiter=throttle.AIMDLimiter(initial_limit=sum(c for _, _, c in profiles), max_limit=64),
+        breaker=throttle.CircuitBreaker(reset_timeout=2.0),
+    )
+    model = ChatBedrock(
+        client=throttle.ControlledClient(pool, controller),
+        model_id=bedrock.MODEL_ID,
+        model_kwargs=bedrock.MODEL_KWARGS,
+    )
+
+    phases = ("before", "degraded", "after")
+    latencies = {phase: [] for phase in phases}
+    outcomes = {"ok": 0, "failed": 0}
+    lock = threading.Lock()
+    started = time.monotonic()
+    stop_at = started + args.duration
+
+    def phase_at(t):
+        return phases[min(2, int(3 * (t - started) / args.duration))]
+
+    def session():
+        while time.monotonic() < stop_at:
+            start = time.monotonic()
+            try:
+                with throttle.request_budget(args.deadline):
+                    model.invoke("What is the conclusion?")
+                outcome = "ok"
+            except Exception:
+                outcome = "failed"
+            with lock:
+                outcomes[outcome] += 1
+                if outcome == "ok":
+                    latencies[phase_at(start)].append(time.monotonic() - start)
+            time.sleep(random.random() * 0.3)
+
+    threads = [threading.Thread(target=session, daemon=True) for _ in range(args.sessions)]
+    for t in threads:
+        t.start()
+
+    first_region, latency, capacity = profiles[0]
+    names = list(runtimes)
+    previous = {region: 0 for region in names}
+    print(f"{'t(s)':>6} {'phase':>9}  " + "  ".join(f"{region:>14}" for region in names) + "   (calls/s, EWMA latency)")
+    while any(t.is_alive() for t in threads):
+        elapsed = time.monotonic() - started
+        phase = phase_at(time.monotonic())
+        if phase == "degraded":
+            runtimes[first_region].set_profile(latency=args.degraded_latency, capacity=args.degraded_capacity)
+        else:
+            runtimes[first_region].set_profile(latency=latency, capacity=capacity)
+        stats = pool.stats()
+        cells = []
+        for region in names:
+            calls = runtimes[region].calls
+            ewma = stats[region]["latency"]
+            cells.append(f"{calls - previous[region]:>5} {ewma if ewma is not None else '-':>8}")
+            previous[region] = calls
+        print(f"{elapsed:6.1f} {phase:>9}  " + "  ".join(f"{cell:>14}" for cell in cells))
+        time.sleep(1)
+
+    total = sum(outcomes.values())
+    print(f"\n{'='*60}")
+    print(f"📊 SIMULATION SUMMARY ({args.mode})")
+    print(f"{'='*60}")
+    print(f"✅ Answered: {outcomes['ok']}/{total}")
+    print(f"❌ Failed: {outcomes['failed']}")
+    for phase in phases:
+        values = latencies[phase]
+        print(f"⏱️  {phase:>9}: p50 {percentile(values, 50):.2f}s  p99 {percentile(values, 99):.2f}s  ({len(values)} answers)")
+    print("🌍 Regions:")
+    for region, snapshot in pool.stats().items():
+        print(f"   {region}: {snapshot}")
+    print(f"🎛️  Controller: {controller.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Simulate latency-based routing over several Bedrock regions",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument("--mode", choices=["routed", "pinned"], default="routed",
+                        help="route over all regions or pin to the first one")
+    parser.add_argument("--regions", default="us-east-1:0.3:8,us-west-2:0.5:8,eu-central-1:0.8:8",
+                        help="region:latency:capacity stand-ins, first one degrades")
+    parser.add_argument("--sessions", type=int, default=16, help="concurrent simulated users")
+    parser.add_argument("--duration", type=float, default=15, help="seconds to run")
+    parser.add_argument("--degraded-latency", type=float, default=2.0, help="first region's latency while degraded")
+    parser.add_argument("--degraded-capacity", type=int, default=2, help="first region's capacity while degraded")
+    parser.add_argument("--explore-rate", type=float, default=regions.EXPLORE_RATE, help="share of exploring calls")
+    parser.add_argument("--deadline", type=float, default=10, help="deadline budget per request")
+    args = parser.parse_args()
+
+    try:
+        run_simulation(args)
+    except KeyboardInterrupt:
+        print("\n👋 Interrupted")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
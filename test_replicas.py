@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Command-line test of several app replicas sharing state through Redis
+Starts a local fake Redis server and a few replica processes, each running
+app.py (Streamlit AppTest) against local YouTube/Bedrock stand-ins, then
+sends page loads of the same conversations to different replicas
+
+Checks that:
+  - a video summarized on one replica is a cache hit on the others
+  - a conversation continues on another replica (history and answers)
+  - a video submitted on two replicas at once is summarized only once
+
+Usage:
+    python3 test_replicas.py
+    python3 test_replicas.py --replicas 3 --latency 1.0
+    python3 test_replicas.py --redis-url redis://localhost:6379/15
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import threading
+import subprocess
+
+RESULT_PREFIX = "RESULT "
+VIDEO_URL = "https://www.youtube.com/watch?v={video_id}"
+
+
+def run_replica(latency):
+    """Replica process: one page load per stdin command, result on stdout"""
+    from collections import Counter
+    from streamlit.testing.v1 import AppTest
+
+    import bedrock
+    import followups
+    import ingest
+    import segments
+    import throttle
+    import utility
+    from standins import FakeBedrockRuntime
+
+    counts = Counter()
+    runtime = FakeBedrockRuntime(latency=latency, response_text="Summary of the video [t=0].")
+    invoke_model = runtime.invoke_model
+    invoke_model_with_response_stream = runtime.invoke_model_with_response_stream
+
+    def counting_invoke_model(**kwargs):
+        counts["embeddings" if kwargs["modelId"] == bedrock.EMBEDDING_MODEL_ID else "bedrock"] += 1
+        return invoke_model(**kwargs)
+
+    def counting_invoke_model_with_response_stream(**kwargs):
+        # summaries and follow-ups are streamed, so they can be cancelled
+        counts["bedrock"] += 1
+        return invoke_model_with_response_stream(**kwargs)
+
+    def fake_segments(video_id):
+        counts["transcripts"] += 1
+        return segments.TranscriptSegments.from_raw_data(
+            [{"text": f"Transcript of {video_id}.", "start": 0.0, "duration": 5.0}]
+        )
+
+    runtime.invoke_model = counting_invoke_model
+    runtime.invoke_model_with_response_stream = counting_invoke_model_with_response_stream
+    # suggested follow-ups would add Bedrock calls of their own to the counts
+    followups.suggest_questions = lambda summary, model=None, **kwargs: []
+    bedrock.bedrock_runtime_client = lambda: throttle.ControlledClient(runtime, throttle.controller)
+    utility.get_youtube_segments = fake_segments
+    ingest.download_video_metadata = lambda video_id: {"title": video_id, "channel": "C", "duration": 5, "chapters": []}
+    app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+    for line in sys.stdin:
+        command = json.loads(line)
+        at = AppTest.from_file(app_path, default_timeout=60)
+        at.secrets["ACCESS_KEY"] = "local"
+        at.secrets["SECRET_KEY"] = "local"
+        if command.get("session"):
+            at.query_params["session"] = command["session"]
+        at.run()
+        restored = len(at.session_state["questions"])
+        at.text_input[0].input(command["input"]).run()
+        session = at.session_state["user_id"]
+        history = at.session_state[f"chat_history_{session}"].messages
+        print(RESULT_PREFIX + json.dumps({
+            "session": session,
+            "restored_questions": restored,
+            "questions": [q["question"] for q in at.session_state["questions"]],
+            "history_messages": len(history),
+            "errors": [str(e.value) for e in at.error] + [str(e.value) for e in at.exception],
+            "counts": dict(counts),
+        }), flush=True)
+
+
+class Replica:
+    def __init__(self, name, redis_url, latency):
+        self.name = name
+        env = dict(os.environ, BEDROCK_CHAT_REDIS_URL=redis_url)
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--replica", "--latency", str(latency)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            text=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+
+    def send(self, input, session=None):
+        self.process.stdin.write(json.dumps({"input": input, "session": session}) + "\n")
+        self.process.stdin.flush()
+
+    def receive(self):
+        for line in self.process.stdout:
+            if line.startswith(RESULT_PREFIX):
+                return json.loads(line[len(RESULT_PREFIX):])
+        raise RuntimeError(f"Replica {self.name} exited")
+
+    def request(self, input, session=None):
+        self.send(input, session)
+        return self.receive()
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait(timeout=10)
+
+
+def start_fake_redis():
+    import redis
+    from fakeredis import TcpFakeServer
+
+    server = TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+
+    class RequestHandler(server.RequestHandlerClass):
+        # the fake server hangs up after any error reply, and LangChain's
+        # Redis history starts with an INFO cluster probe it does not know
+        def setup(self):
+            super().setup()
+            read_response = self.current_client.read_response
+
+            def reply(*args, **kwargs):
+                try:
+                    return read_response(*args, **kwargs)
+                except redis.ResponseError as e:
+                    return e
+
+            self.current_client.read_response = reply
+
+    server.RequestHandlerClass = RequestHandler
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return server, f"redis://{host}:{port}/0"
+
+
+def run_test(args):
+    server = None
+    redis_url = args.redis_url
+    if not redis_url:
+        server, redis_url = start_fake_redis()
+    print(f"🗄️  Shared state: {redis_url}")
+
+    # keys of this run only, so a real Redis can be reused
+    os.environ["BEDROCK_CHAT_REDIS_PREFIX"] = f"replica-test-{uuid.uuid4().hex[:8]}"
+    replicas = [Replica(chr(ord("A") + i), redis_url, args.latency) for i in range(args.replicas)]
+    first, second = replicas[0], replicas[1]
+    checks = []
+
+    def check(name, ok, detail=""):
+        checks.append(ok)
+        print(f"{'✅' if ok else '❌'} {name}{f' ({detail})' if detail else ''}")
+
+    try:
+        video = VIDEO_URL.format(video_id="aaaaaaaaaaa")
+        start = time.perf_counter()
+        a1 = first.request(video)
+        cold = time.perf_counter() - start
+        check("Replica A summarizes the video", not a1["errors"] and a1["counts"].get("bedrock") == 1, a1["errors"])
+
+        start = time.perf_counter()
+        b1 = second.request(video)
+        warm = time.perf_counter() - start
+        check("Replica B gets transcript and summary from the shared cache",
+              not b1["counts"].get("bedrock") and not b1["counts"].get("transcripts"),
+              f"{cold:.2f}s cold on A, {warm:.2f}s on B")
+
+        b2 = second.request("What is the conclusion?", session=a1["session"])
+        check("Replica B continues replica A's conversation",
+              b2["restored_questions"] == 1 and b2["history_messages"] == 4 and not b2["errors"],
+              f"{b2['restored_questions']} question(s) restored, {b2['history_messages']} messages in history")
+
+        a2 = first.request("Who is the speaker?", session=a1["session"])
+        check("Replica A sees the answer given by replica B",
+              a2["restored_questions"] == 2 and a2["history_messages"] == 6,
+              f"{a2['restored_questions']} question(s) restored, {a2['history_messages']} messages in history")
+
+        video = VIDEO_URL.format(video_id="bbbbbbbbbbb")
+        before = sum(r["counts"].get("bedrock", 0) for r in (a2, b2))
+        for replica in replicas:
+            replica.send(video)
+        results = [replica.receive() for replica in replicas]
+        after = sum(r["counts"].get("bedrock", 0) for r in results)
+        check(f"A video submitted on {len(replicas)} replicas at once is summarized once",
+              after - before == 1, f"{after - before} summary call(s)")
+    finally:
+        for replica in replicas:
+            replica.close()
+        if server:
+            server.shutdown()
+
+    print(f"\n📊 {sum(checks)}/{len(checks)} checks passed")
+    return all(checks)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Test app replicas sharing conversations and caches through Redis",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument("--replicas", type=int, default=2, help="replica processes (at least 2)")
+    parser.add_argument("--latency", type=float, default=0.5, help="stand-in Bedrock latency")
+    parser.add_argument("--redis-url", help="use this Redis instead of a local fake one")
+    parser.add_argument("--replica", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.replica:
+        run_replica(args.latency)
+        return
+    sys.exit(0 if run_test(args) else 1)
+
+
+if __name__ == "__main__":
+    main()
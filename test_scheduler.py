@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Command-line simulation of the fair scheduler (scheduler.py) against a local
+Bedrock stand-in
+Simulated users each ask for a long summary and then a few short follow-ups,
+while background work (precomputed answers, cache warming) keeps the queue
+full. Compares how long each request class waits with and without the
+scheduler in front of Bedrock
+
+Usage:
+    python3 test_scheduler.py
+    python3 test_scheduler.py --mode direct
+    python3 test_scheduler.py --users 24 --capacity 4 --max-queue 16
+
+Examples:
+    python3 test_scheduler.py --duration 30 --background 4
+    python3 test_scheduler.py --summary-chars 60000 --input-latency 0.1
+"""
+
+import sys
+import time
+import random
+import logging
+import argparse
+import threading
+from contextlib import nullcontext
+
+from langchain_aws import ChatBedrock
+
+import bedrock
+import profiling
+import scheduler
+import throttle
+from standins import FakeBedrockRuntime
+from stats import percentile
+
+
+def run_simulation(args):
+    logging.getLogger("langchain_aws").setLevel(logging.CRITICAL)
+    runtime = FakeBedrockRuntime(latency=args.latency, jitter=args.latency / 3,
+                                 input_latency=args.input_latency, seed=1)
+    # fixed capacity, so both modes get the same Bedrock throughput
+    controller = throttle.BedrockController(
+        limiter=throttle.AIMDLimiter(initial_limit=args.capacity, max_limit=args.capacity),
+    )
+    model = ChatBedrock(
+        client=throttle.ControlledClient(runtime, controller),
+        model_id=bedrock.MODEL_ID,
+        model_kwargs=bedrock.MODEL_KWARGS,
+    )
+    fair = scheduler.FairScheduler(capacity=lambda: args.capacity, max_queue=args.max_queue)
+
+    latencies = {kind: [] for kind in scheduler.WEIGHTS}
+    outcomes = {"ok": 0, "rejected": 0, "failed": 0}
+    lock = threading.Lock()
+    stop_at = time.monotonic() + args.duration
+    summary_prompt = "word " * (args.summary_chars // 5)
+
+    def request(user, kind, prompt):
+        start = time.monotonic()
+        slot = fair.slot(user, kind, scheduler.estimate_cost(prompt)) if args.mode == "fair" else nullcontext()
+        try:
+            with throttle.request_budget(args.deadline):
+                with slot:
+                    model.invoke(prompt)
+            outcome = "ok"
+        except scheduler.SchedulerRejected:
+            outcome = "rejected"
+        except Exception:
+            outcome = "failed"
+        with lock:
+            outcomes[outcome] += 1
+            if outcome == "ok":
+                latencies[kind].append(time.monotonic() - start)
+
+    def user_session(user):
+        rng = random.Random(user)
+        time.sleep(rng.random() * 2)
+        while time.monotonic() < stop_at:
+            request(user, "summary", summary_prompt)
+            for _ in range(args.followups):
+                time.sleep(rng.random() * args.think_time)
+                request(user, "followup", "What does the speaker conclude?")
+            time.sleep(rng.random() * args.think_time)
+
+    def background_worker(worker):
+        while time.monotonic() < stop_at:
+            request("background", "background", summary_prompt)
+
+    threads = [threading.Thread(target=user_session, args=(f"user-{i}",), daemon=True) for i in range(args.users)]
+    threads += [threading.Thread(target=background_worker, args=(i,), daemon=True) for i in range(args.background)]
+    for t in threads:
+        t.start()
+    while any(t.is_alive() for t in threads):
+        time.sleep(0.5)
+
+    total = sum(outcomes.values())
+    print(f"\n{'='*60}")
+    print(f"📊 SIMULATION SUMMARY ({args.mode})")
+    print(f"{'='*60}")
+    print(f"✅ Answered: {outcomes['ok']}/{total}")
+    print(f"🚫 Rejected by the scheduler: {outcomes['rejected']}")
+    print(f"❌ Failed: {outcomes['failed']}")
+    print("⏱️  Latency per class:")
+    for kind, values in latencies.items():
+        print(f"   {kind:>10}: p50 {percentile(values, 50):.2f}s  p95 {percentile(values, 95):.2f}s  ({len(values)} answers)")
+    if args.mode == "fair":
+        stats = fair.stats()
+        print("⏳ Queue wait per class:")
+        for kind in scheduler.WEIGHTS:
+            wait = stats[kind]
+            print(f"   {kind:>10}: p50 {wait['wait_p50']:.2f}s  p95 {wait['wait_p95']:.2f}s  "
+                  f"max {wait['wait_max']:.2f}s  ({wait['requests']} admitted)")
+        print(f"🎛️  Scheduler: {stats['counters']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Simulate the fair scheduler in front of Bedrock",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument("--mode", choices=["fair", "direct"], default="fair",
+                        help="queue through the fair scheduler or go straight to the limiter")
+    parser.add_argument("--users", type=int, default=16, help="concurrent simulated users")
+    parser.add_argument("--background", type=int, default=2, help="background workers")
+    parser.add_argument("--followups", type=int, default=3, help="follow-ups per summary")
+    parser.add_argument("--capacity", type=int, default=4, help="concurrent Bedrock calls")
+    parser.add_argument("--max-queue", type=int, default=scheduler.MAX_QUEUE, help="scheduler queue depth")
+    parser.add_argument("--duration", type=float, default=20, help="seconds to run")
+    parser.add_argument("--latency", type=float, default=0.3, help="stand-in latency per call")
+    parser.add_argument("--input-latency", type=float, default=0.2, help="stand-in seconds per 1000 input tokens")
+    parser.add_argument("--summary-chars", type=int, default=20000, help="length of a summary prompt")
+    parser.add_argument("--think-time", type=float, default=2.0, help="max seconds between a user's requests")
+    parser.add_argument("--deadline", type=float, default=30, help="deadline budget per request")
+    profiling.add_argument(parser)
+    args = parser.parse_args()
+    profiling.profile_process(f"test_scheduler-{args.mode}", args.profile)
+
+    try:
+        run_simulation(args)
+    except KeyboardInterrupt:
+        print("\n👋 Interrupted")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Command-line simulation of Bedrock throttling against a local stand-in
+Shows how the adaptive controller (throttle.py) behaves under a throttling
+storm compared to blind per-call retries, without calling AWS
+
+Usage:
+    python3 test_throttling.py
+    python3 test_throttling.py --sessions 32 --capacity 8 --storm-capacity 2
+    python3 test_throttling.py --mode blind
+
+Examples:
+    python3 test_throttling.py --duration 20 --latency 0.3
+    python3 test_throttling.py --throttle-rate 0.2 --hedge
+"""
+
+import sys
+import time
+import random
+import logging
+import argparse
+import threading
+
+from langchain_aws import ChatBedrock
+
+import bedrock
+import throttle
+from standins import FakeBedrockRuntime
+from stats import percentile
+
+
+def blind_retry_call(fn, max_attempts=10):
+    """What botocore's 'standard' retry mode does: each call retries on its own"""
+    for attempt in range(max_attempts):
+        try:
+            return fn()
+        except Exception as e:
+            if not throttle.is_throttling_error(e) or attempt == max_attempts - 1:
+                raise
+            time.sleep(min(20, random.random() * 2 ** attempt))
+
+
+def run_simulation(args):
+    # every throttled call is logged with a traceback by langchain_aws
+    logging.getLogger("langchain_aws").setLevel(logging.CRITICAL)
+    runtime = FakeBedrockRuntime(
+        latency=args.latency,
+        jitter=args.latency / 2,
+        throttle_rate=args.throttle_rate,
+        capacity=args.capacity,
+        seed=1,
+    )
+    controller = throttle.BedrockController(
+        limiter=throttle.AIMDLimiter(initial_limit=args.capacity),
+        breaker=throttle.CircuitBreaker(reset_timeout=2.0),
+        hedge_after=args.latency * 2,
+    )
+    if args.mode == "adaptive":
+        client = throttle.ControlledClient(runtime, controller)
+    else:
+        client = runtime
+    model = ChatBedrock(client=client, model_id=bedrock.MODEL_ID, model_kwargs=bedrock.MODEL_KWARGS)
+
+    latencies = []
+    outcomes = {"ok": 0, "failed": 0, "fast_failed": 0}
+    lock = threading.Lock()
+    stop_at = time.monotonic() + args.duration
+
+    def session():
+        while time.monotonic() < stop_at:
+            start = time.monotonic()
+            try:
+                with throttle.request_budget(args.deadline, hedge=args.hedge):
+                    if args.mode == "adaptive":
+                        model.invoke("What is the conclusion?")
+                    else:
+                        blind_retry_call(lambda: model.invoke("What is the conclusion?"))
+                outcome = "ok"
+            except throttle.CircuitOpenError as e:
+                outcome = "fast_failed"
+                # a real user reads the message and tries again later
+                time.sleep(min(e.retry_after, 2.0))
+            except throttle.BedrockUnavailable:
+                outcome = "fast_failed"
+            except Exception:
+                outcome = "failed"
+            with lock:
+                outcomes[outcome] += 1
+                if outcome == "ok":
+                    latencies.append(time.monotonic() - start)
+            # think time between questions
+            time.sleep(random.random() * args.latency)
+
+    threads = [threading.Thread(target=session, daemon=True) for _ in range(args.sessions)]
+    for t in threads:
+        t.start()
+
+    storm_start = args.duration / 3
+    storm_end = 2 * args.duration / 3
+    started = time.monotonic()
+    print(f"{'t(s)':>6} {'capacity':>9} {'limit':>7} {'in flight':>10} {'circuit':>10} {'throttled':>10}")
+    while any(t.is_alive() for t in threads):
+        elapsed = time.monotonic() - started
+        capacity = args.storm_capacity if storm_start <= elapsed < storm_end else args.capacity
+        runtime.set_profile(capacity=capacity)
+        stats = controller.stats()
+        limit = stats["limit"] if args.mode == "adaptive" else "-"
+        circuit = stats["circuit"] if args.mode == "adaptive" else "-"
+        print(f"{elapsed:6.1f} {capacity:>9} {limit:>7} {runtime.in_flight:>10} {circuit:>10} {runtime.throttled:>10}")
+        time.sleep(1)
+
+    total = sum(outcomes.values())
+    print(f"\n{'='*60}")
+    print(f"📊 SIMULATION SUMMARY ({args.mode})")
+    print(f"{'='*60}")
+    print(f"✅ Answered: {outcomes['ok']}/{total}")
+    print(f"⚡ Failed fast (circuit/deadline): {outcomes['fast_failed']}")
+    print(f"❌ Failed: {outcomes['failed']}")
+    print(f"🧮 Calls sent to stand-in: {runtime.calls} ({runtime.throttled} throttled)")
+    print(f"⏱️  Latency p50: {percentile(latencies, 50):.2f}s  p95: {percentile(latencies, 95):.2f}s  p99: {percentile(latencies, 99):.2f}s")
+    if args.mode == "adaptive":
+        print(f"🎛️  Controller: {controller.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Simulate Bedrock throttling storms against a local stand-in",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument("--mode", choices=["adaptive", "blind"], default="adaptive",
+                        help="adaptive controller or blind per-call retries")
+    parser.add_argument("--sessions", type=int, default=24, help="concurrent simulated users")
+    parser.add_argument("--duration", type=float, default=15, help="seconds to run")
+    parser.add_argument("--latency", type=float, default=0.3, help="stand-in latency per call")
+    parser.add_argument("--capacity", type=int, default=8, help="concurrent calls before throttling")
+    parser.add_argument("--storm-capacity", type=int, default=2, help="capacity during the storm (middle third)")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="random throttling probability")
+    parser.add_argument("--deadline", type=float, default=10, help="deadline budget per request")
+    parser.add_argument("--hedge", action="store_true", help="hedge slow requests")
+    args = parser.parse_args()
+
+    try:
+        run_simulation(args)
+    except KeyboardInterrupt:
+        print("\n👋 Interrupted")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
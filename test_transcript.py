@@ -7,6 +7,8 @@ Usage:
     python3 test_transcript.py <youtube_url>
     python3 test_transcript.py --batch <file_with_urls>
     python3 test_transcript.py --interactive
+    python3 test_transcript.py --batch <file_with_urls> --record <fixture>
+    python3 test_transcript.py --batch <file_with_urls> --replay <fixture>
 
 Examples:
     python3 test_transcript.py "https://www.youtube.com/watch?v=-zF1mkBpyf4"
@@ -18,8 +20,11 @@ import sys
 import argparse
 import time
 from datetime import datetime
+import profiling
+import recorder
 import utility
-from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound
+from youtube_transcript_api import TranscriptsDisabled, NoTranscriptFound
+from transcript_fetcher import fetcher
 
 
 class TranscriptTester:
@@ -62,7 +67,7 @@ class TranscriptTester:
             
             # Step 2: Check available transcripts
             print("\n📋 Step 2: Checking available transcripts...")
-            transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
+            transcript_list = fetcher.list_transcripts(video_id)
             
             available_languages = []
             for transcript in transcript_list:
@@ -90,7 +95,7 @@ class TranscriptTester:
             # Step 3: Test transcript download using app's method
             print(f"\n📋 Step 3: Testing transcript download (using app's method)...")
             try:
-                transcript_content = utility.get_content(video_id, "youtube")
+                transcript_content = utility.get_content(video_id, "youtube", use_cache=False)
                 
                 if transcript_content:
                     result['transcript_length'] = len(transcript_content)
@@ -214,6 +219,8 @@ class TranscriptTester:
             print(f"✅ Successful: {successful}")
             print(f"❌ Failed: {failed}")
             print(f"📊 Success rate: {(successful/len(urls)*100):.1f}%")
+            for line in fetcher.format_stats():
+                print(f"🌐 {line}")
             
         except FileNotFoundError:
             print(f"❌ File not found: {file_path}")
@@ -305,6 +312,8 @@ Examples:
   %(prog)s --batch test_urls.txt
   %(prog)s --interactive
   %(prog)s "https://youtu.be/dQw4w9WgXcQ" --verbose --report results.txt
+  %(prog)s --batch test_urls.txt --replay fixtures/sample.jsonl.gz
+  %(prog)s --batch test_urls.txt --profile
         """
     )
     
@@ -313,8 +322,17 @@ Examples:
     parser.add_argument('--interactive', '-i', action='store_true', help='Interactive mode')
     parser.add_argument('--verbose', '-v', action='store_true', help='Verbose output with content preview')
     parser.add_argument('--report', '-r', help='Save detailed report to file')
+    parser.add_argument('--record', metavar='FIXTURE', help='Record YouTube traffic to a fixture file')
+    parser.add_argument('--replay', metavar='FIXTURE', help='Replay YouTube traffic from a fixture file')
+    profiling.add_argument(parser)
     
     args = parser.parse_args()
+    profiling.profile_process("test_transcript", args.profile)
+    
+    if args.record:
+        recorder.install(args.record, "record")
+    elif args.replay:
+        recorder.install(args.replay, "replay")
     
     # Show help if no arguments provided
     if not any([args.url, args.batch, args.interactive]):
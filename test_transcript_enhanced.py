@@ -7,15 +7,19 @@ Usage:
     python3 test_transcript_enhanced.py <youtube_url>
     python3 test_transcript_enhanced.py --batch <file_with_urls>
     python3 test_transcript_enhanced.py --interactive
+    python3 test_transcript_enhanced.py --batch <file_with_urls> --record <fixture>
+    python3 test_transcript_enhanced.py --batch <file_with_urls> --replay <fixture>
 """
 
 import sys
 import argparse
 import time
 from datetime import datetime
+import recorder
 import utility
 import utility_fixed
-from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound
+from youtube_transcript_api import TranscriptsDisabled, NoTranscriptFound
+from transcript_fetcher import fetcher
 
 
 class EnhancedTranscriptTester:
@@ -57,7 +61,7 @@ class EnhancedTranscriptTester:
             
             # Step 2: Check available transcripts
             print("\n📋 Step 2: Checking available transcripts...")
-            transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
+            transcript_list = fetcher.list_transcripts(video_id)
             
             available_languages = []
             for transcript in transcript_list:
@@ -84,7 +88,7 @@ class EnhancedTranscriptTester:
             # Step 3: Test original utility method
             print(f"\n📋 Step 3: Testing original utility.py method...")
             try:
-                transcript_content = utility.get_content(video_id, "youtube")
+                transcript_content = utility.get_content(video_id, "youtube", use_cache=False)
                 if transcript_content:
                     result['original_utility']['success'] = True
                     result['original_utility']['length'] = len(transcript_content)
@@ -293,6 +297,7 @@ Examples:
   %(prog)s --batch sample_test_urls.txt
   %(prog)s --interactive
   %(prog)s "https://youtu.be/dQw4w9WgXcQ" --verbose
+  %(prog)s --batch sample_test_urls.txt --replay fixtures/sample.jsonl.gz
         """
     )
     
@@ -300,9 +305,16 @@ Examples:
     parser.add_argument('--batch', '-b', help='File containing URLs to test (one per line)')
     parser.add_argument('--interactive', '-i', action='store_true', help='Interactive mode')
     parser.add_argument('--verbose', '-v', action='store_true', help='Verbose output with content preview')
+    parser.add_argument('--record', metavar='FIXTURE', help='Record YouTube traffic to a fixture file')
+    parser.add_argument('--replay', metavar='FIXTURE', help='Replay YouTube traffic from a fixture file')
     
     args = parser.parse_args()
     
+    if args.record:
+        recorder.install(args.record, "record")
+    elif args.replay:
+        recorder.install(args.replay, "replay")
+    
     # Show help if no arguments provided
     if not any([args.url, args.batch, args.interactive]):
         parser.print_help()
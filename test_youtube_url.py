@@ -7,14 +7,18 @@ Usage:
     python3 test_youtube_url.py <youtube_url>
     python3 test_youtube_url.py --batch <file_with_urls>
     python3 test_youtube_url.py --interactive
+    python3 test_youtube_url.py --batch <file_with_urls> --record <fixture>
+    python3 test_youtube_url.py --batch <file_with_urls> --replay <fixture>
 """
 
 import sys
 import argparse
 import time
 from datetime import datetime
+import recorder
 import utility
-from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound
+from youtube_transcript_api import TranscriptsDisabled, NoTranscriptFound
+from transcript_fetcher import fetcher
 import requests
 
 
@@ -28,8 +32,8 @@ class YouTubeURLTester:
     def test_url_accessibility(self, url):
         """Test if the YouTube URL is accessible"""
         try:
-            response = requests.head(url, timeout=10)
-            return response.status_code == 200
+            status = recorder.call("url.head", [url], lambda: requests.head(url, timeout=10).status_code)
+            return status == 200
         except:
             return False
     
@@ -92,7 +96,7 @@ class YouTubeURLTester:
         # Step 3: Check transcript availability
         print(f"\n📋 Step 3: Checking transcript availability...")
         try:
-            transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
+            transcript_list = fetcher.list_transcripts(video_id)
             transcripts = list(transcript_list)
             
             result['transcripts_available'] = len(transcripts) > 0
@@ -153,7 +157,7 @@ class YouTubeURLTester:
         if result['app_compatible']:
             print(f"\n📋 Step 4: Testing app integration...")
             try:
-                transcript_content = utility.get_content(video_id, "youtube")
+                transcript_content = utility.get_content(video_id, "youtube", use_cache=False)
                 if transcript_content:
                     word_count = len(transcript_content.split())
                     char_count = len(transcript_content)
@@ -242,6 +246,8 @@ class YouTubeURLTester:
             print(f"✅ App-compatible URLs: {compatible_count}")
             print(f"❌ Incompatible URLs: {len(urls) - compatible_count}")
             print(f"📊 Compatibility rate: {(compatible_count/len(urls)*100):.1f}%")
+            for line in fetcher.format_stats():
+                print(f"🌐 {line}")
             
             if compatible_count > 0:
                 print(f"\n🎉 You have {compatible_count} URL(s) ready for the Video Chatter app!")
@@ -293,6 +299,7 @@ Examples:
   %(prog)s --batch sample_test_urls.txt
   %(prog)s --interactive
   %(prog)s "https://youtu.be/dQw4w9WgXcQ" --verbose
+  %(prog)s --batch sample_test_urls.txt --replay fixtures/sample.jsonl.gz
         """
     )
     
@@ -300,9 +307,16 @@ Examples:
     parser.add_argument('--batch', '-b', help='File containing URLs to test (one per line)')
     parser.add_argument('--interactive', '-i', action='store_true', help='Interactive mode')
     parser.add_argument('--verbose', '-v', action='store_true', help='Verbose output with content preview')
+    parser.add_argument('--record', metavar='FIXTURE', help='Record YouTube traffic to a fixture file')
+    parser.add_argument('--replay', metavar='FIXTURE', help='Replay YouTube traffic from a fixture file')
     
     args = parser.parse_args()
     
+    if args.record:
+        recorder.install(args.record, "record")
+    elif args.replay:
+        recorder.install(args.replay, "replay")
+    
     # Show help if no arguments provided
     if not any([args.url, args.batch, args.interactive]):
         parser.print_help()
@@ -0,0 +1,416 @@
+import os
+import time
+import random
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from botocore.exceptions import ClientError
+
+import inflight
+import profiling
+
+logger = logging.getLogger()
+
+# error codes that mean "back off", as opposed to a broken request
+THROTTLING_CODES = (
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+)
+
+INITIAL_LIMIT = int(os.environ.get("BEDROCK_INITIAL_CONCURRENCY", "4"))
+MAX_LIMIT = int(os.environ.get("BEDROCK_MAX_CONCURRENCY", "32"))
+# a call slower than this (seconds) counts as a congestion signal; unset means
+# only throttling errors shrink the limit
+LATENCY_TARGET = float(os.environ["BEDROCK_LATENCY_TARGET"]) if os.environ.get("BEDROCK_LATENCY_TARGET") else None
+# total time one user request may spend waiting for and running Bedrock calls
+REQUEST_DEADLINE = float(os.environ.get("BEDROCK_REQUEST_DEADLINE", "120"))
+# throttled calls are retried by the controller (not botocore) with jittered
+# exponential backoff, as long as the deadline budget allows
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8.0
+# hedge a short follow-up if the first attempt has not answered after this long
+HEDGE_AFTER = float(os.environ.get("BEDROCK_HEDGE_AFTER", "3"))
+
+
+class BedrockUnavailable(Exception):
+    """Raised instead of calling Bedrock when it cannot answer in time"""
+
+
+class CircuitOpenError(BedrockUnavailable):
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        super().__init__(
+            f"Bedrock is overloaded right now. Please try again in {int(retry_after) + 1} seconds."
+        )
+
+
+class DeadlineExceeded(BedrockUnavailable):
+    def __init__(self):
+        super().__init__("The request took too long waiting for Bedrock capacity. Please try again.")
+
+
+def is_throttling_error(error):
+    if isinstance(error, ClientError):
+        return error.response.get("Error", {}).get("Code") in THROTTLING_CODES
+    return False
+
+
+class AIMDLimiter:
+    """Concurrency limit with additive increase / multiplicative decrease
+
+    Every successful call grows the limit by increase/limit (so roughly +1 per
+    "round" of calls), every throttled or too-slow call cuts it by the
+    decrease factor. Cuts are applied at most once per cooldown so a burst of
+    throttles caused by one overload only halves the limit once.
+    """
+
+    def __init__(self, initial_limit=INITIAL_LIMIT, min_limit=1, max_limit=MAX_LIMIT,
+                 increase=1.0, decrease=0.5, cooldown=1.0, latency_target=LATENCY_TARGET):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout=None):
+        """Wait for a free slot; returns False if none frees up within timeout"""
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                remaining = None if end is None else end - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    def try_acquire(self):
+        return self.acquire(timeout=0)
+
+    def release(self, throttled=False, latency=None):
+        with self._cond:
+            self.in_flight -= 1
+            too_slow = (
+                self.latency_target is not None
+                and latency is not None
+                and latency > self.latency_target
+            )
+            if throttled or too_slow:
+                now = time.monotonic()
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.min_limit, self.limit * self.decrease)
+                    self._last_decrease = now
+            elif latency is not None:
+                self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+            self._cond.notify_all()
+
+
+class CircuitBreaker:
+    """Fail fast after repeated throttling instead of queueing more work
+
+    Opens after failure_threshold consecutive failures, rejects calls for
+    reset_timeout seconds, then lets a single probe through (half open). The
+    probe's outcome closes the circuit again or re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def retry_after(self):
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self.retry_after() <= 0:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.state = self.CLOSED
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning("Bedrock circuit breaker opened")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def record_ignored(self):
+        """The call failed for a reason unrelated to load; free the probe"""
+        with self._lock:
+            self._probe_in_flight = False
+
+
+_request = threading.local()
+
+
+@contextmanager
+def request_budget(seconds=REQUEST_DEADLINE, hedge=False):
+    """Give every Bedrock call made by this thread a shared deadline
+
+    hedge=True allows hedged requests for the calls in this block; only use it
+    for short requests, a hedge can double the tokens spent.
+    """
+    previous = getattr(_request, "budget", None)
+    _request.budget = (time.monotonic() + seconds, hedge)
+    try:
+        yield
+    finally:
+        _request.budget = previous
+
+
+def _current_budget():
+    return getattr(_request, "budget", None) or (None, False)
+
+
+class BedrockController:
+    """Admission control shared by every Bedrock call of this process"""
+
+    def __init__(self, limiter=None, breaker=None, hedge_after=HEDGE_AFTER, max_retries=MAX_RETRIES):
+        self.limiter = limiter or AIMDLimiter()
+        self.breaker = breaker or CircuitBreaker()
+        self.hedge_after = hedge_after
+        self.max_retries = max_retries
+        self.counters = {
+            "calls": 0,
+            "throttled": 0,
+            "retried": 0,
+            "fast_failed": 0,
+            "deadline_exceeded": 0,
+            "hedged": 0,
+            "hedge_wins": 0,
+        }
+        self._lock = threading.Lock()
+        self._hedge_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="bedrock-hedge")
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats["limit"] = round(self.limiter.limit, 2)
+        stats["in_flight"] = self.limiter.in_flight
+        stats["circuit"] = self.breaker.state
+        return stats
+
+    def _admit(self):
+        # a cancelled request takes no more capacity
+        inflight.check()
+        if not self.breaker.allow():
+            self._count("fast_failed")
+            raise CircuitOpenError(self.breaker.retry_after())
+        deadline, _ = _current_budget()
+        timeout = None if deadline is None else deadline - time.monotonic()
+        if (timeout is not None and timeout <= 0) or not self.limiter.acquire(timeout):
+            self.breaker.record_ignored()
+            self._count("deadline_exceeded")
+            raise DeadlineExceeded()
+
+    def _finish(self, start, error=None):
+        """Release the slot taken by _admit and feed the outcome back"""
+        latency = time.monotonic() - start
+        if error is None:
+            self.breaker.record_success()
+            self.limiter.release(latency=latency)
+        elif is_throttling_error(error):
+            self._count("throttled")
+            self.breaker.record_failure()
+            self.limiter.release(throttled=True)
+        else:
+            self.breaker.record_ignored()
+            self.limiter.release()
+
+    def _attempt(self, fn, args, kwargs, admitted=False):
+        for retry in range(self.max_retries + 1):
+            if not (admitted and retry == 0):
+                self._admit()
+            self._count("calls")
+            start = time.monotonic()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                self._finish(start, e)
+                if not is_throttling_error(e) or retry == self.max_retries:
+                    raise
+                self._backoff(retry, e)
+                continue
+            self._finish(start)
+            return result
+
+    def _backoff(self, retry, error):
+        """Sleep before retrying a throttled call, within the deadline budget;
+        cancelling the request ends the sleep"""
+        delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** retry))
+        deadline, _ = _current_budget()
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            raise error
+        self._count("retried")
+        inflight.sleep(delay)
+
+    def call(self, fn, *args, **kwargs):
+        """Run fn under the concurrency limit, circuit breaker and deadline"""
+        _, hedge = _current_budget()
+        if not hedge:
+            return self._attempt(fn, args, kwargs)
+        return self._hedged(fn, args, kwargs)
+
+    def _attempt_with_budget(self, budget, fn, args, kwargs, admitted=False):
+        """_attempt on a hedge pool thread, under the caller's deadline"""
+        _request.budget = budget
+        try:
+            return self._attempt(fn, args, kwargs, admitted)
+        finally:
+            _request.budget = None
+
+    def _submit_attempt(self, budget, fn, args, kwargs, admitted=False):
+        # the attempt runs in a copy of the caller's context, so cancelling
+        # the request reaches it like a call on the caller's thread
+        return self._hedge_pool.submit(contextvars.copy_context().run, self._attempt_with_budget,
+                                       budget, fn, args, kwargs, admitted)
+
+    def _hedged(self, fn, args, kwargs):
+        budget = _current_budget()
+        primary = self._submit_attempt(budget, fn, args, kwargs)
+        done, _ = wait([primary], timeout=self.hedge_after)
+        # never hedge when we are out of capacity, that only adds load
+        if done or not self.limiter.try_acquire():
+            return primary.result()
+
+        self._count("hedged")
+        backup = self._submit_attempt(budget, fn, args, kwargs, admitted=True)
+        done, _ = wait([primary, backup], return_when=FIRST_COMPLETED)
+        winner = done.pop()
+        if winner is backup and winner.exception() is None:
+            self._count("hedge_wins")
+            return backup.result()
+        if winner.exception() is not None:
+            # the first finisher failed, give the other attempt its chance
+            other = backup if winner is primary else primary
+            return other.result()
+        return winner.result()
+
+    def wrap_stream(self, fn, *args, **kwargs):
+        """Like call() for streaming responses, holding the slot until the
+        response body has been consumed or closed"""
+        self._admit()
+        self._count("calls")
+        start = time.monotonic()
+        try:
+            response = fn(*args, **kwargs)
+        except Exception as e:
+            self._finish(start, e)
+            raise
+        response["body"] = _ReleasingStream(response["body"], lambda: self._finish(start))
+        # cancelling the user request closes the stream: generation stops
+        # and the slot is free for the next call right away
+        inflight.on_cancel(response["body"].close)
+        return response
+
+
+class _ReleasingStream:
+    """Iterates a response event stream and runs on_done exactly once
+
+    close() may come from another thread (a cancelled request) while the
+    stream is being read.
+    """
+
+    def __init__(self, stream, on_done):
+        self._stream = stream
+        self._on_done = on_done
+        self._done = False
+        self._lock = threading.Lock()
+
+    def _release(self):
+        with self._lock:
+            done, self._done = self._done, True
+        if not done:
+            self._on_done()
+
+    def __iter__(self):
+        try:
+            for event in self._stream:
+                yield event
+        finally:
+            self._release()
+
+    def close(self):
+        try:
+            if hasattr(self._stream, "close"):
+                self._stream.close()
+        finally:
+            self._release()
+
+
+class ControlledClient:
+    """bedrock-runtime client proxy routing model invocations via a controller"""
+
+    def __init__(self, client, controller):
+        self._client = client
+        self.controller = controller
+
+    def invoke_model(self, **kwargs):
+        with profiling.stage("bedrock"):
+            return self.controller.call(self._client.invoke_model, **kwargs)
+
+    def converse(self, **kwargs):
+        with profiling.stage("bedrock"):
+            return self.controller.call(self._client.converse, **kwargs)
+
+    def invoke_model_with_response_stream(self, **kwargs):
+        # time to the first event; reading the stream counts for the caller
+        with profiling.stage("bedrock"):
+            return self.controller.wrap_stream(self._client.invoke_model_with_response_stream, **kwargs)
+
+    def converse_stream(self, **kwargs):
+        with profiling.stage("bedrock"):
+            response = self.controller.wrap_stream(
+                lambda **kw: _as_body(self._client.converse_stream(**kw), "stream"), **kwargs
+            )
+        response["stream"] = response.pop("body")
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def _as_body(response, key):
+    response["body"] = response.pop(key)
+    return response
+
+
+# one controller per process, shared by all Streamlit sessions
+controller = BedrockController()
@@ -1,6 +1,12 @@
 import logging
-from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound
+from youtube_transcript_api import TranscriptsDisabled, NoTranscriptFound
 import sys
+from urllib.parse import urlparse, parse_qs
+import cache
+import corpus
+import profiling
+from transcript_fetcher import fetcher
+from segments import TranscriptSegments, format_timestamp
 
 logger = logging.getLogger()
 #logger.setLevel("INFO")
@@ -13,112 +19,142 @@ DEBUG = False
 
 content_type = ""
 
+# transcript languages in order of preference
+LANGUAGES = ['de', 'fr', 'en', 'es']
+
+# first path element of YouTube channel URLs other than "@handle"
+CHANNEL_PATHS = ("channel", "c", "user")
+
 def validate_url(content_url):
     # use "youtu" to capture also "youtu.be" from shared links:
     if "youtu" in content_url:
         return validate_youtube_url(content_url)
+    # PDF, DOCX and HTML documents in S3, see documents.py
+    if content_url.strip().startswith("s3://"):
+        return content_url.strip(), "s3"
 
 def validate_youtube_url(content_url):
+    """Return (id, content_type) for a YouTube video, playlist or channel URL
+
+    content_type is "youtube" for a single video, "youtube_playlist" for a
+    playlist id and "youtube_channel" for a channel path (@handle, channel/UC..).
+    A watch URL that also carries list= is treated as the single video.
+    """
     logger.info("Inside validate_url ..")
 
-    watch_param = 'watch?v='
-    video_id = content_url.split('/')[-1].strip()
-    if video_id == '':
-        video_id = content_url.split('/')[-2].strip()
-    if watch_param in video_id:
-        video_id = video_id[len(watch_param):]
+    url = content_url.strip()
+    if "://" not in url:
+        url = "https://" + url
+    parsed = urlparse(url)
+    query = parse_qs(parsed.query)
+    path_parts = [part for part in parsed.path.split('/') if part]
+
+    if "v" in query:
+        video_id = query["v"][0]
+        content_type = "youtube"
+    elif parsed.netloc.endswith("youtu.be") and path_parts:
+        video_id = path_parts[0]
+        content_type = "youtube"
+    elif "list" in query:
+        video_id = query["list"][0]
+        content_type = "youtube_playlist"
+    elif path_parts and (path_parts[0].startswith('@') or path_parts[0] in CHANNEL_PATHS):
+        # keep "@handle" or "channel/UC..." so the channel page can be rebuilt
+        if path_parts[0].startswith('@'):
+            video_id = path_parts[0]
+        else:
+            video_id = '/'.join(path_parts[:2])
+        content_type = "youtube_channel"
+    elif path_parts:
+        # /shorts/<id>, /embed/<id>, /live/<id> and plain /<id>
+        video_id = path_parts[-1]
+        content_type = "youtube"
+    else:
+        video_id = ''
+        content_type = "youtube"
 
     logger.info("video_id")
     logger.info(video_id)
-    content_type = "youtube"
-    return video_id, content_type
+    return video_id.strip(), content_type
     
-def get_content(id, content_type):
+def get_content(id, content_type, use_cache=True):
     if content_type == "youtube":
-        return get_youtube_transcript(id)
+        segments = get_segments(id, use_cache)
+        return segments.text if segments else None
+
+def get_segments(video_id, use_cache=True):
+    """Timestamped transcript of a video, through the transcript cache"""
+    if use_cache:
+        # bulk collections are served from the memory-mapped corpus if there is one
+        shared_corpus = corpus.shared()
+        segments = shared_corpus.get(video_id) if shared_corpus else None
+        if segments is not None:
+            logger.info(f"Transcript corpus hit for {video_id}")
+            return segments
+        with profiling.stage("cache"):
+            cached = cache.transcript_cache.get(video_id)
+        # entries from before segments were cached are plain strings
+        if isinstance(cached, dict):
+            logger.info(f"Transcript cache hit for {video_id}")
+            return TranscriptSegments.from_dict(cached)
+    with profiling.stage("transcript"):
+        segments = get_youtube_segments(video_id)
+    if segments and use_cache:
+        with profiling.stage("cache"):
+            cache.transcript_cache.set(video_id, segments.to_dict())
+    return segments
 
 def get_youtube_transcript(video_id):
-    try:
-        transcript = YouTubeTranscriptApi.list_transcripts(video_id)
-        #print("transcript:{}".format(transcript))
-        # Check for German transcript
-        try:
-            transcript_data=transcript.find_transcript(['de']).fetch()
-            transcript_data=transcript_data.to_raw_data() # see https://pypi.org/project/youtube-transcript-api/ v.1.0.1
-            # Extract just the text from each transcript segment
-            transcript_text = [entry['text'] for entry in transcript_data]
-            # Join all text segments into a single string
-            full_transcript = ' '.join(transcript_text)
-            return full_transcript
-        except NoTranscriptFound:
-            pass
-        # Check for French transcript
-        try:
-            transcript_data=transcript.find_transcript(['fr']).fetch()
-            transcript_data=transcript_data.to_raw_data() # see https://pypi.org/project/youtube-transcript-api/ v.1.0.1
-            # Extract just the text from each transcript segment
-            transcript_text = [entry['text'] for entry in transcript_data]
-            # Join all text segments into a single string
-            full_transcript = ' '.join(transcript_text)
-            return full_transcript
-        except NoTranscriptFound:
-            pass
-        # Check for English transcript
-        try:
-            transcript_data=transcript.find_transcript(['en']).fetch()
-            transcript_data=transcript_data.to_raw_data() # see https://pypi.org/project/youtube-transcript-api/ v.1.0.1
-            # Extract just the text from each transcript segment
-            transcript_text = [entry['text'] for entry in transcript_data]
-            # Join all text segments into a single string
-            full_transcript = ' '.join(transcript_text)
-            return full_transcript
-        except NoTranscriptFound:
-            pass
-        # Check for Spanish transcript
-        try:
-            transcript_data=transcript.find_transcript(['es']).fetch()
-            transcript_data=transcript_data.to_raw_data() # see https://pypi.org/project/youtube-transcript-api/ v.1.0.1
-            # Extract just the text from each transcript segment
-            transcript_text = [entry['text'] for entry in transcript_data]
-            # Join all text segments into a single string
-            full_transcript = ' '.join(transcript_text)
-            return full_transcript
-        except NoTranscriptFound:
-            print("No German, English, or Spanish transcript found.")
-            return None
+    segments = get_youtube_segments(video_id)
+    return segments.text if segments else None
 
+def get_youtube_segments(video_id):
+    try:
+        # German, French, English, Spanish in this order of preference; goes
+        # through the shared fetcher so requests are paced and retried
+        transcript_data = fetcher.fetch_transcript(video_id, LANGUAGES)
+        transcript_data = transcript_data.to_raw_data() # see https://pypi.org/project/youtube-transcript-api/ v.1.0.1
+        # keep text, start and duration of every segment in columnar form
+        segments = TranscriptSegments.from_raw_data(transcript_data)
+        return segments if len(segments) else None
+
+    except NoTranscriptFound:
+        print("No German, French, English, or Spanish transcript found.")
+        return None
     except TranscriptsDisabled:
         print("Transcripts are disabled for this video.")
         return None
     except Exception as e:
         print(f"An error occurred: {str(e)}")
-        return None
-
-    except Exception as e:
-        transcript = transcript_list.find_transcript(['en'])
-        print("en transcript:{}".format("transcript"))
-
-        # Fetch the actual transcript data
-        transcript_data = transcript.fetch()
-
-        # Extract just the text from each transcript segment
-        transcript_text = [entry['text'] for entry in transcript_data]
-
-        # Join all text segments into a single string
-        full_transcript = ' '.join(transcript_text)
-
-        return full_transcript
-
-    except Exception as e:
         logger.exception(e)
         return None
 
-def generate_prompt_from_transcript(transcript):
+@profiling.stage("prompt")
+def generate_prompt_from_transcript(transcript, metadata=None, kind="video"):
+    """Build the summary prompt from transcript text or TranscriptSegments
+
+    Segments are rendered with [t=SECONDS] markers so the model can cite
+    where in the video something was said. metadata (title, channel,
+    duration, chapters) is added when available. kind="document" builds
+    the same prompt for the text of a document.
+    """
     logger.info("Inside generate_prompt_from_transcript ..")
 
-    prompt = "Summarize the following video:\n"
-    #for trans in transcript:
-        #prompt += " " + trans.get('text', '')
+    prompt = f"Summarize the following {kind}:\n"
+    if metadata:
+        if metadata.get("title"):
+            prompt += f"Title: {metadata['title']}\n"
+        if metadata.get("channel"):
+            prompt += f"Channel: {metadata['channel']}\n"
+        if metadata.get("duration"):
+            prompt += f"Duration: {format_timestamp(metadata['duration'])}\n"
+        if metadata.get("chapters"):
+            prompt += "Chapters:\n"
+            for chapter in metadata["chapters"]:
+                prompt += f"[t={chapter['start']}] {chapter['title']}\n"
+        prompt += "Transcript:\n" if kind == "video" else "Text:\n"
+    if isinstance(transcript, TranscriptSegments):
+        transcript = transcript.with_time_markers()
     prompt += " " + transcript
 
     if DEBUG:
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Cache warmer: fetch transcripts and summaries of videos that are about to be
+shared, so the first visitor gets them from the cache instead of waiting for
+YouTube and Bedrock
+
+Fills the same transcript, metadata and summary caches the app and the
+playlist mode read. Entries younger than --max-age hours are left alone.
+
+Usage:
+    python3 warm_cache.py <youtube_url> [<youtube_url> ...]
+    python3 warm_cache.py --urls <file_with_urls> [--window 22:00-06:00] [--workers 2]
+
+Examples:
+    python3 warm_cache.py --urls sample_test_urls.txt
+    python3 warm_cache.py "https://www.youtube.com/playlist?list=PL..." --window 01:00-05:00
+    python3 warm_cache.py --urls sample_test_urls.txt --transcripts-only --report warm.json
+    python3 warm_cache.py --urls sample_test_urls.txt --profile
+"""
+
+import sys
+import json
+import time
+import argparse
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import bedrock
+import cache
+import ingest
+import library
+import playlist
+import profiling
+
+DEFAULT_MAX_AGE_HOURS = 24 * 7
+
+
+def parse_window(window):
+    """"HH:MM-HH:MM" as (start, end) datetime.time; may wrap past midnight"""
+    start, end = window.split("-")
+    return (datetime.strptime(start.strip(), "%H:%M").time(),
+            datetime.strptime(end.strip(), "%H:%M").time())
+
+
+def in_window(window, now=None):
+    if window is None:
+        return True
+    now = (now or datetime.now()).time()
+    start, end = window
+    if start <= end:
+        return start <= now < end
+    return now >= start or now < end
+
+
+def seconds_until_window(window, now=None):
+    now = now or datetime.now()
+    if in_window(window, now):
+        return 0
+    start = datetime.combine(now.date(), window[0])
+    if start <= now:
+        start += timedelta(days=1)
+    return (start - now).total_seconds()
+
+
+def is_fresh(file_cache, key, max_age):
+    age = file_cache.age(key)
+    return age is not None and age <= max_age
+
+
+def warm_video(video_id, max_age, model=None, summaries=True):
+    """Make sure one video's transcript (and summary) are cached and fresh
+
+    seconds is what a first visitor would have waited for the parts warmed
+    now: the ingest time for a transcript, plus the summary time.
+    """
+    result = {"video_id": video_id, "transcript": "fresh", "summary": None, "seconds": 0.0, "error": None}
+    summary_key = cache.summary_key(video_id, bedrock.PROMPT_VERSION)
+    transcript_fresh = is_fresh(cache.transcript_cache, video_id, max_age)
+    summary_fresh = is_fresh(cache.summary_cache, summary_key, max_age)
+    if summaries:
+        result["summary"] = "fresh"
+    if transcript_fresh and (summary_fresh or not summaries):
+        return result
+
+    # a stale transcript is re-fetched and stored in normalized (segment) form
+    video = ingest.ingest(video_id, use_cache=transcript_fresh)
+    if not transcript_fresh:
+        if not video.transcript:
+            result["transcript"] = "missing"
+            result["summary"] = None
+            return result
+        cache.transcript_cache.set(video_id, video.transcript.to_dict())
+        if video.metadata:
+            ingest.metadata_cache.set(video_id, video.metadata)
+        result["transcript"] = "warmed"
+        result["seconds"] += video.timings["total"]
+
+    if summaries and not summary_fresh:
+        start = time.perf_counter()
+        try:
+            summary = bedrock.summarize(video.prompt(), model=model, user="warm_cache", kind="background")
+        except Exception as e:
+            result["summary"] = "failed"
+            result["error"] = str(e)
+            return result
+        cache.summary_cache.set(summary_key, summary)
+        library.index_video_async(video_id, video.transcript, summary, video.metadata)
+        result["summary"] = "warmed"
+        result["seconds"] += time.perf_counter() - start
+    return result
+
+
+def warm(video_ids, max_age, workers=playlist.MAX_WORKERS, summaries=True, window=None, progress=None):
+    """Warm every video with a bounded pool; stops starting work outside window
+
+    Videos not started because the window closed are reported as deferred.
+    """
+    model = bedrock.bedrock_model() if summaries else None
+    results = {}
+
+    def task(video_id):
+        if not in_window(window):
+            return {"video_id": video_id, "transcript": "deferred", "summary": None, "seconds": 0.0, "error": None}
+        return warm_video(video_id, max_age, model, summaries)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(task, video_id) for video_id in video_ids]
+        for future in as_completed(futures):
+            result = future.result()
+            results[result["video_id"]] = result
+            if progress:
+                progress(len(results), len(video_ids), result)
+    return [results[video_id] for video_id in video_ids]
+
+
+def coverage(video_ids, max_age, summaries=True):
+    """Share of videos whose transcript (and summary) are fresh in the cache"""
+    if not video_ids:
+        return 0.0
+    warm_count = 0
+    for video_id in video_ids:
+        fresh = is_fresh(cache.transcript_cache, video_id, max_age)
+        if summaries:
+            fresh = fresh and is_fresh(cache.summary_cache, cache.summary_key(video_id, bedrock.PROMPT_VERSION), max_age)
+        warm_count += fresh
+    return warm_count / len(video_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Precompute transcripts and summaries into the app's caches",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument("url", nargs="*", help="YouTube video/playlist/channel URLs")
+    parser.add_argument("--urls", help="file with YouTube URLs, one per line")
+    parser.add_argument("--max-age", type=float, default=DEFAULT_MAX_AGE_HOURS,
+                        help="hours a cache entry stays fresh (default: one week)")
+    parser.add_argument("--workers", type=int, default=playlist.MAX_WORKERS, help="concurrent videos")
+    parser.add_argument("--window", help="only work between HH:MM-HH:MM local time, e.g. 22:00-06:00")
+    parser.add_argument("--transcripts-only", action="store_true", help="do not precompute summaries")
+    parser.add_argument("--report", help="write per-video results as JSON")
+    profiling.add_argument(parser)
+    args = parser.parse_args()
+    profiling.profile_process("warm_cache", args.profile)
+
+    if not (args.url or args.urls):
+        parser.print_help()
+        sys.exit(1)
+
+    window = parse_window(args.window) if args.window else None
+    max_age = args.max_age * 3600
+    summaries = not args.transcripts_only
+
+    video_ids = playlist.expand_urls(args.url)
+    if args.urls:
+        video_ids += [v for v in playlist.read_video_ids(args.urls) if v not in video_ids]
+    print(f"🎯 {len(video_ids)} video(s) to keep warm")
+
+    wait = seconds_until_window(window)
+    if wait:
+        print(f"⏳ Waiting {wait / 3600:.1f}h for the off-peak window {args.window}")
+        time.sleep(wait)
+
+    before = coverage(video_ids, max_age, summaries)
+
+    def progress(done, total, result):
+        icon = {"fresh": "⏭️ ", "warmed": "🔥", "missing": "❌", "deferred": "🌙"}[result["transcript"]]
+        summary = f" summary {result['summary']}" if result["summary"] else ""
+        error = f" ({result['error']})" if result["error"] else ""
+        print(f"   [{done}/{total}] {icon} {result['video_id']}: transcript {result['transcript']}{summary}{error}")
+
+    start = time.perf_counter()
+    results = warm(video_ids, max_age, args.workers, summaries, window, progress)
+    elapsed = time.perf_counter() - start
+    after = coverage(video_ids, max_age, summaries)
+
+    warmed = [r for r in results if r["seconds"]]
+    saved = sum(r["seconds"] for r in warmed)
+    counts = {}
+    for r in results:
+        for part in ("transcript", "summary"):
+            if r[part]:
+                counts[f"{part} {r[part]}"] = counts.get(f"{part} {r[part]}", 0) + 1
+
+    print(f"\n{'='*60}")
+    print("📊 CACHE WARMING SUMMARY")
+    print(f"{'='*60}")
+    for label, count in sorted(counts.items()):
+        print(f"   {label}: {count}")
+    print(f"🌡️  Warm coverage: {before:.0%} → {after:.0%}")
+    print(f"⏱️  Warming took {elapsed:.1f}s")
+    if warmed:
+        print(f"🚀 Estimated first-visit latency saved: {saved:.1f}s in total, "
+              f"{saved / len(warmed):.1f}s per newly warmed video")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({
+                "timestamp": datetime.now().isoformat(),
+                "coverage_before": before,
+                "coverage_after": after,
+                "latency_saved_seconds": saved,
+                "elapsed_seconds": elapsed,
+                "videos": results,
+            }, f, indent=2)
+        print(f"📄 Report written to: {args.report}")
+
+
+if __name__ == "__main__":
+    main()